@@ -4,7 +4,7 @@ Router principal de la API v1
 
 from fastapi import APIRouter
 
-from app.api.v1.endpoints import categorias
+from app.api.v1.endpoints import cajas, categorias, diagnostico, exportacion, importacion, pedidos, reportes, ventas
 
 api_router = APIRouter()
 
@@ -14,3 +14,45 @@ api_router.include_router(
     prefix="/categorias",
     tags=["Categorías"]
 )
+
+api_router.include_router(
+    importacion.router,
+    prefix="/importacion",
+    tags=["Importación"]
+)
+
+api_router.include_router(
+    reportes.router,
+    prefix="/reportes",
+    tags=["Reportes"]
+)
+
+api_router.include_router(
+    ventas.router,
+    prefix="/ventas",
+    tags=["Ventas"]
+)
+
+api_router.include_router(
+    exportacion.router,
+    prefix="/exportacion",
+    tags=["Exportación"]
+)
+
+api_router.include_router(
+    cajas.router,
+    prefix="/cajas",
+    tags=["Cajas"]
+)
+
+api_router.include_router(
+    pedidos.router,
+    prefix="/pedidos",
+    tags=["Pedidos"]
+)
+
+api_router.include_router(
+    diagnostico.router,
+    prefix="/diagnostico",
+    tags=["Diagnóstico"]
+)
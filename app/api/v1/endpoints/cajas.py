@@ -0,0 +1,127 @@
+"""
+Endpoints API para Cajas (apertura, gastos, cierre y verificación)
+"""
+
+from datetime import date
+from typing import Annotated
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlmodel import Session
+
+from app.core.database import get_session
+from app.crud import caja as caja_crud
+from app.models import GastoCreate
+from app.schemas.caja_schemas import (
+    AperturaCajaRequest, CajaResponse, CierreCajaRequest,
+    GastoCajaRequest, GastoCajaResponse, VerificacionCajaResponse
+)
+
+router = APIRouter()
+
+
+@router.post("/", response_model=CajaResponse, status_code=status.HTTP_201_CREATED)
+def abrir_caja(
+    datos: AperturaCajaRequest,
+    db: Annotated[Session, Depends(get_session)]
+):
+    """
+    Abrir una caja (una sola abierta por usuario)
+    """
+    try:
+        return caja_crud.abrir(
+            db,
+            usuario_id=datos.usuario_id,
+            monto_inicial=datos.monto_inicial,
+            observaciones=datos.observaciones
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+
+@router.get("/abierta", response_model=CajaResponse)
+def get_caja_abierta(
+    db: Annotated[Session, Depends(get_session)],
+    usuario_id: int = Query(..., description="Usuario dueño de la caja")
+):
+    """
+    Obtener la caja abierta de un usuario
+    """
+    caja = caja_crud.get_abierta(db, usuario_id=usuario_id)
+    if caja is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="El usuario no tiene caja abierta")
+    return caja
+
+
+@router.get("/{caja_id}", response_model=CajaResponse)
+def get_caja(caja_id: int, db: Annotated[Session, Depends(get_session)]):
+    """
+    Obtener una caja con sus totales acumulados
+    """
+    caja = caja_crud.get_caja(db, caja_id=caja_id)
+    if caja is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Caja no encontrada")
+    return caja
+
+
+@router.post("/{caja_id}/gastos", response_model=GastoCajaResponse, status_code=status.HTTP_201_CREATED)
+def registrar_gasto(
+    caja_id: int,
+    datos: GastoCajaRequest,
+    db: Annotated[Session, Depends(get_session)]
+):
+    """
+    Registrar un gasto pagado con el efectivo de una caja abierta
+    """
+    gasto_in = GastoCreate(
+        concepto=datos.concepto,
+        monto=datos.monto,
+        categoria=datos.categoria,
+        fecha_gasto=datos.fecha_gasto or date.today(),
+        usuario_id=datos.usuario_id,
+        caja_id=caja_id,
+        observaciones=datos.observaciones
+    )
+    try:
+        return caja_crud.registrar_gasto(db, gasto_in=gasto_in)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.post("/{caja_id}/cerrar", response_model=CajaResponse)
+def cerrar_caja(
+    caja_id: int,
+    datos: CierreCajaRequest,
+    db: Annotated[Session, Depends(get_session)]
+):
+    """
+    Cerrar una caja con el efectivo contado y calcular la diferencia
+    """
+    try:
+        return caja_crud.cerrar(
+            db, caja_id=caja_id, monto_final=datos.monto_final, observaciones=datos.observaciones
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.get("/{caja_id}/verificar", response_model=VerificacionCajaResponse)
+def verificar_caja(caja_id: int, db: Annotated[Session, Depends(get_session)]):
+    """
+    Recalcular los totales desde ventas y gastos y reportar discrepancias
+    (solo lectura; para corregirlas usar POST)
+    """
+    try:
+        return caja_crud.verificar(db, caja_id=caja_id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+
+@router.post("/{caja_id}/verificar", response_model=VerificacionCajaResponse)
+def corregir_caja(caja_id: int, db: Annotated[Session, Depends(get_session)]):
+    """
+    Recalcular los totales desde ventas y gastos y sobrescribir los
+    acumulados si no coinciden
+    """
+    try:
+        return caja_crud.verificar(db, caja_id=caja_id, corregir=True)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
@@ -2,14 +2,22 @@
 Endpoints API para Categorías
 """
 
-from typing import List, Annotated
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Any, Callable, List, Annotated
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlmodel import Session
 
+from app.core.concurrencia import EjecutorThreadpool
 from app.core.database import get_session
+from app.core.serializacion import respuesta_negociada
 from app.crud import categoria as categoria_crud
 from app.models import CategoriaCreate, CategoriaRead, CategoriaUpdate
-from app.schemas.categoria_schemas import ProductosDescendientesResponse, CategoriaHijaSchema
+from app.schemas.categoria_schemas import (
+    CategoriaHijaSchema,
+    CategoriaListado,
+    ProductoListado,
+    ProductosDescendientesListado,
+    ProductosDescendientesResponse,
+)
 from app.models import Producto
 
 router = APIRouter()
@@ -27,13 +35,18 @@ def listar_categorias(
     categorias = categoria_crud.get_multi(db, skip=skip, limit=limit)
     return categorias
 
-@router.get("/raiz_activas")
-async def listar_categorias_raiz_activas(db: Annotated[Session, Depends(get_session)]):
+@router.get("/raiz_activas", response_model=List[CategoriaHijaSchema])
+async def listar_categorias_raiz_activas(
+    request: Request,
+    db: Annotated[Session, Depends(get_session)],
+    bloqueante: Annotated[Callable[..., Any], Depends(EjecutorThreadpool("lectura"))]
+):
     """
-    Obtener solo categorías raíz activas
+    Obtener solo categorías raíz activas (JSON, o MessagePack con
+    Accept: application/msgpack)
     """
-    categorias = categoria_crud.get_root_active(db)
-    return categorias
+    categorias = await bloqueante(categoria_crud.get_root_active, db)
+    return respuesta_negociada(request, [CategoriaListado(**categoria) for categoria in categorias])
 
 @router.get("/activas", response_model=List[CategoriaRead])
 def listar_categorias_activas(db: Session = Depends(get_session)):
@@ -153,6 +166,7 @@ def desactivar_categoria(categoria_id: int, db: Session = Depends(get_session)):
 
 @router.get("/{categoria_id}/productos", response_model=ProductosDescendientesResponse)
 def obtener_productos_descendientes(
+    request: Request,
     categoria_id: int, 
     db: Annotated[Session, Depends(get_session)],
     solo_activos: bool = True
@@ -167,7 +181,10 @@ def obtener_productos_descendientes(
         db: Sesión de base de datos
         
     Returns:
-        Lista de productos de la categoría padre y todas sus subcategorías descendientes activas
+        Lista de productos de la categoría padre y todas sus subcategorías descendientes activas,
+        en JSON o en MessagePack si el cliente envía Accept: application/msgpack.
+        Las filas vienen tipadas de la base: se codifican con msgspec sin
+        pasar por la validación de response_model (que solo documenta).
     """
     # Verificar que la categoría existe
     categoria = categoria_crud.get(db, id=categoria_id)
@@ -191,15 +208,15 @@ def obtener_productos_descendientes(
         solo_activos=solo_activos
     )
     
-    # Convertir a objetos del schema
-    categorias_hijas = [CategoriaHijaSchema(**categoria) for categoria in categorias_hijas_data]
+    # Convertir a las estructuras de respuesta (sin validación)
+    categorias_hijas = [CategoriaListado(**categoria) for categoria in categorias_hijas_data]
     
-    return ProductosDescendientesResponse(
+    return respuesta_negociada(request, ProductosDescendientesListado(
         categoria_padre_id=categoria_id,
-        productos=productos,
+        productos=[ProductoListado(**producto) for producto in productos],
         total_productos=len(productos),
         categorias_hijas=categorias_hijas
-    )
+    ))
 
 
 
@@ -0,0 +1,71 @@
+"""
+Endpoints API de diagnóstico (bloqueos del event loop, threadpool, render de plantillas y micro-caché)
+"""
+
+from typing import Any, Dict
+from fastapi import APIRouter
+
+from app.core.concurrencia import detector_bloqueos, metricas_threadpool
+from app.core.microcache import micro_cache
+from app.core.vuelo_unico import vuelo_unico
+from app.core.templates import metricas_render
+
+router = APIRouter()
+
+
+@router.get("/event-loop")
+async def get_bloqueos_event_loop() -> Dict[str, Any]:
+    """
+    Bloqueos del event loop por ruta, ocupación de cada clase de threadpool
+    y consultas compartidas por single-flight
+    """
+    return {
+        **detector_bloqueos.metricas(),
+        "threadpool": metricas_threadpool(),
+        "vuelo_unico": vuelo_unico.metricas(),
+    }
+
+
+@router.delete("/event-loop")
+async def reiniciar_bloqueos_event_loop() -> Dict[str, Any]:
+    """
+    Poner en cero los contadores de bloqueos y de single-flight
+    """
+    detector_bloqueos.reiniciar()
+    vuelo_unico.reiniciar()
+    return detector_bloqueos.metricas()
+
+
+@router.get("/templates")
+async def get_metricas_templates() -> Dict[str, Any]:
+    """
+    Tiempo de render por plantilla desde el arranque
+    """
+    return metricas_render.resumen()
+
+
+@router.delete("/templates")
+async def reiniciar_metricas_templates() -> Dict[str, Any]:
+    """
+    Poner en cero las métricas de render
+    """
+    metricas_render.reiniciar()
+    return metricas_render.resumen()
+
+
+@router.get("/microcache")
+async def get_metricas_microcache() -> Dict[str, Any]:
+    """
+    Aciertos y fallos de la micro-caché de fragmentos
+    """
+    return micro_cache.metricas()
+
+
+@router.delete("/microcache")
+async def vaciar_microcache() -> Dict[str, Any]:
+    """
+    Vaciar la micro-caché y poner en cero sus contadores
+    """
+    micro_cache.vaciar()
+    micro_cache.reiniciar()
+    return micro_cache.metricas()
@@ -0,0 +1,93 @@
+"""
+Endpoints API para exportaciones de ventas y movimientos (CSV / NDJSON)
+"""
+
+from datetime import date, timedelta
+from typing import Iterator, Optional, Tuple
+from fastapi import APIRouter, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+
+from app.crud import exportacion as exportacion_crud
+
+router = APIRouter()
+
+TIPOS_CONTENIDO = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def _rango_fechas(fecha_inicio: Optional[date], fecha_fin: Optional[date]) -> Tuple[date, date]:
+    """Por defecto: el mes en curso"""
+    hoy = date.today()
+    fecha_inicio = fecha_inicio or hoy.replace(day=1)
+    if fecha_fin is None:
+        siguiente_mes = (fecha_inicio.replace(day=28) + timedelta(days=4)).replace(day=1)
+        fecha_fin = siguiente_mes - timedelta(days=1)
+    if fecha_fin < fecha_inicio:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="fecha_fin debe ser posterior a fecha_inicio"
+        )
+    return fecha_inicio, fecha_fin
+
+
+def _respuesta(
+    contenido: Iterator[bytes],
+    *,
+    nombre: str,
+    fecha_inicio: date,
+    fecha_fin: date,
+    formato: str,
+    comprimir: bool
+) -> StreamingResponse:
+    archivo = f"{nombre}_{fecha_inicio:%Y%m%d}_{fecha_fin:%Y%m%d}.{formato}"
+    if comprimir:
+        archivo += ".gz"
+    return StreamingResponse(
+        contenido,
+        media_type="application/gzip" if comprimir else TIPOS_CONTENIDO[formato],
+        headers={"Content-Disposition": f'attachment; filename="{archivo}"'}
+    )
+
+
+@router.get("/ventas")
+def exportar_ventas(
+    fecha_inicio: Optional[date] = None,
+    fecha_fin: Optional[date] = None,
+    formato: str = Query("csv", pattern="^(csv|ndjson)$"),
+    gzip: bool = False
+):
+    """
+    Exportar ventas con sus líneas (una fila por detalle) en streaming.
+    Por defecto: mes en curso, CSV sin comprimir.
+    """
+    fecha_inicio, fecha_fin = _rango_fechas(fecha_inicio, fecha_fin)
+    contenido = exportacion_crud.exportar_ventas(
+        fecha_inicio=fecha_inicio, fecha_fin=fecha_fin, formato=formato, comprimir=gzip
+    )
+    return _respuesta(
+        contenido, nombre="ventas", fecha_inicio=fecha_inicio, fecha_fin=fecha_fin,
+        formato=formato, comprimir=gzip
+    )
+
+
+@router.get("/movimientos")
+def exportar_movimientos(
+    fecha_inicio: Optional[date] = None,
+    fecha_fin: Optional[date] = None,
+    formato: str = Query("csv", pattern="^(csv|ndjson)$"),
+    gzip: bool = False
+):
+    """
+    Exportar movimientos de inventario en streaming.
+    Por defecto: mes en curso, CSV sin comprimir.
+    """
+    fecha_inicio, fecha_fin = _rango_fechas(fecha_inicio, fecha_fin)
+    contenido = exportacion_crud.exportar_movimientos(
+        fecha_inicio=fecha_inicio, fecha_fin=fecha_fin, formato=formato, comprimir=gzip
+    )
+    return _respuesta(
+        contenido, nombre="movimientos", fecha_inicio=fecha_inicio, fecha_fin=fecha_fin,
+        formato=formato, comprimir=gzip
+    )
@@ -0,0 +1,55 @@
+"""
+Endpoints API para importaciones masivas por CSV
+"""
+
+from typing import Annotated
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile, status
+from sqlmodel import Session
+
+from app.core.database import get_session
+from app.crud import importacion as importacion_crud
+from app.schemas.importacion_schemas import ResultadoImportacionResponse
+
+router = APIRouter()
+
+
+def _validar_csv(archivo: UploadFile) -> None:
+    if archivo.filename and not archivo.filename.lower().endswith(".csv"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El archivo debe ser un CSV"
+        )
+
+
+@router.post("/productos", response_model=ResultadoImportacionResponse)
+def importar_productos(
+    db: Annotated[Session, Depends(get_session)],
+    archivo: UploadFile = File(...),
+    tamano_lote: int = Form(1000, ge=1, le=50000)
+):
+    """
+    Importar catálogo de productos (alta o actualización por codigo_barras)
+    """
+    _validar_csv(archivo)
+    return importacion_crud.importar_productos(db, archivo=archivo.file, tamano_lote=tamano_lote)
+
+
+@router.post("/stock", response_model=ResultadoImportacionResponse)
+def importar_conteo_stock(
+    db: Annotated[Session, Depends(get_session)],
+    archivo: UploadFile = File(...),
+    usuario_id: int = Form(...),
+    referencia: str = Form("CONTEO-FISICO", max_length=100),
+    tamano_lote: int = Form(1000, ge=1, le=50000)
+):
+    """
+    Importar un conteo físico de stock (columnas codigo_barras, stock)
+    """
+    _validar_csv(archivo)
+    return importacion_crud.importar_conteo_stock(
+        db,
+        archivo=archivo.file,
+        usuario_id=usuario_id,
+        referencia=referencia,
+        tamano_lote=tamano_lote
+    )
@@ -0,0 +1,20 @@
+"""
+Endpoints API para la cola de pedidos (pasos posteriores al checkout)
+"""
+
+from typing import Annotated, Any, Dict
+from fastapi import APIRouter, Depends
+from sqlmodel import Session
+
+from app.core.database import get_session
+from app.crud import cola_pedidos as cola_pedidos_crud
+
+router = APIRouter()
+
+
+@router.get("/cola/metricas")
+def get_metricas_cola(db: Annotated[Session, Depends(get_session)]) -> Dict[str, Any]:
+    """
+    Profundidad de la cola, antigüedad de lo pendiente y latencia de la última hora
+    """
+    return cola_pedidos_crud.metricas(db)
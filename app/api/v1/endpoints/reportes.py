@@ -0,0 +1,112 @@
+"""
+Endpoints API para Reportes de ventas
+"""
+
+from datetime import date, timedelta
+from typing import Annotated, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlmodel import Session
+
+from app.core.database import get_session
+from app.crud import analitica as analitica_crud
+from app.crud import reporte as reporte_crud
+from app.crud import venta as venta_crud
+from app.models import EstadoVentaEnum
+from app.schemas.reporte_schemas import (
+    AnaliticaVentasResponse, ResumenVentasResponse, VentaHoraSchema, VentaProductoSchema
+)
+
+router = APIRouter()
+
+
+def _validar_rango(fecha_inicio: date, fecha_fin: date) -> None:
+    if fecha_fin < fecha_inicio:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="fecha_fin debe ser posterior a fecha_inicio"
+        )
+
+
+@router.get("/ventas/resumen", response_model=ResumenVentasResponse)
+def resumen_ventas(
+    db: Annotated[Session, Depends(get_session)],
+    fecha_inicio: Optional[date] = None,
+    fecha_fin: Optional[date] = None,
+    estado: Annotated[Optional[List[EstadoVentaEnum]], Query()] = None
+):
+    """
+    Totales de ventas y desglose por método de pago en un rango de fechas.
+    Por defecto: ventas completadas del día actual.
+    """
+    fecha_inicio = fecha_inicio or date.today()
+    fecha_fin = fecha_fin or fecha_inicio
+    _validar_rango(fecha_inicio, fecha_fin)
+
+    return venta_crud.resumen_ventas(
+        db,
+        fecha_inicio=fecha_inicio,
+        fecha_fin=fecha_fin,
+        estados=estado
+    )
+
+
+@router.get("/ventas/productos", response_model=List[VentaProductoSchema])
+def ventas_por_producto(
+    db: Annotated[Session, Depends(get_session)],
+    fecha_inicio: Optional[date] = None,
+    fecha_fin: Optional[date] = None,
+    limite: int = Query(50, ge=1, le=1000)
+):
+    """
+    Productos más vendidos en un rango de fechas (ventas completadas).
+    Por defecto: día actual.
+    """
+    fecha_inicio = fecha_inicio or date.today()
+    fecha_fin = fecha_fin or fecha_inicio
+    _validar_rango(fecha_inicio, fecha_fin)
+
+    return reporte_crud.ventas_por_producto(
+        db,
+        fecha_inicio=fecha_inicio,
+        fecha_fin=fecha_fin,
+        limite=limite
+    )
+
+
+@router.get("/ventas/horas", response_model=List[VentaHoraSchema])
+def ventas_por_hora(
+    db: Annotated[Session, Depends(get_session)],
+    fecha: Optional[date] = None,
+    producto_id: Optional[int] = None
+):
+    """
+    Ventas completadas por hora de un día, opcionalmente de un solo producto
+    """
+    return reporte_crud.ventas_por_hora(
+        db,
+        fecha=fecha or date.today(),
+        producto_id=producto_id
+    )
+
+
+@router.get("/ventas/analitica", response_model=AnaliticaVentasResponse)
+def analitica_ventas(
+    db: Annotated[Session, Depends(get_session)],
+    fecha_inicio: Optional[date] = None,
+    fecha_fin: Optional[date] = None,
+    top: int = Query(20, ge=1, le=500)
+):
+    """
+    Márgenes por producto y categoría, clasificación ABC y estadísticas de
+    canasta de ventas completadas. Por defecto: últimos 30 días.
+    """
+    fecha_fin = fecha_fin or date.today()
+    fecha_inicio = fecha_inicio or fecha_fin - timedelta(days=29)
+    _validar_rango(fecha_inicio, fecha_fin)
+
+    return analitica_crud.analizar(
+        db,
+        fecha_inicio=fecha_inicio,
+        fecha_fin=fecha_fin,
+        top=top
+    )
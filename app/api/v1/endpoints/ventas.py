@@ -0,0 +1,57 @@
+"""
+Endpoints API para cancelaciones y devoluciones de Ventas
+"""
+
+from typing import Annotated
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlmodel import Session
+
+from app.core.database import get_session
+from app.crud import venta as venta_crud
+from app.schemas.venta_schemas import (
+    AnulacionVentaRequest, AnulacionVentaResponse, DevolucionVentaRequest
+)
+
+router = APIRouter()
+
+
+@router.post("/{venta_id}/cancelar", response_model=AnulacionVentaResponse)
+def cancelar_venta(
+    venta_id: int,
+    datos: AnulacionVentaRequest,
+    db: Annotated[Session, Depends(get_session)]
+):
+    """
+    Cancelar una venta completada y restaurar el stock de sus líneas
+    """
+    try:
+        return venta_crud.cancelar_venta(
+            db, venta_id=venta_id, usuario_id=datos.usuario_id, motivo=datos.motivo
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.post("/{venta_id}/devolucion", response_model=AnulacionVentaResponse)
+def devolver_venta(
+    venta_id: int,
+    datos: DevolucionVentaRequest,
+    db: Annotated[Session, Depends(get_session)]
+):
+    """
+    Devolver una venta completa (sin líneas) o parte de sus líneas
+    """
+    lineas = {}
+    for linea in datos.lineas:
+        lineas[linea.detalle_id] = lineas.get(linea.detalle_id, 0) + linea.cantidad
+
+    try:
+        return venta_crud.devolver_venta(
+            db,
+            venta_id=venta_id,
+            lineas=lineas or None,
+            usuario_id=datos.usuario_id,
+            motivo=datos.motivo
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
@@ -2,22 +2,31 @@
 Endpoints API para Categorías
 """
 import json
-from typing import List, Annotated
-from fastapi import APIRouter, Depends, HTTPException, status, Request, Form
-from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, RedirectResponse
+import secrets
+from datetime import datetime
+from typing import Any, Callable, List, Annotated, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Form, Query
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from sqlmodel import Session, text
 
+from app.core.cache_http import ValidadorCatalogo, condicional_catalogo
+from app.core.concurrencia import EjecutorThreadpool, en_threadpool
 from app.core.database import get_session
+from app.core.paginacion import PaginaKeyset, decodificar_cursor
+from app.core.templates import templates, transmitir
 from app.crud import categoria as categoria_crud
+from app.crud.categoria import PRODUCTOS_POR_PAGINA
+from app.crud import venta as venta_crud
+from app.crud import carrito as carrito_crud
+from app.crud.carrito import COOKIE_CARRITO, COOKIE_CARRITO_MAX_AGE
+from app.crud import idempotencia as idempotencia_crud
+from app.crud.cola_pedidos import TAREA_CONFIRMACION
 from app.models import CategoriaCreate, CategoriaRead, CategoriaUpdate
 from pydantic import BaseModel
 
 class CategoriaProductosRequest(BaseModel):
     padre: int
 
-templates = Jinja2Templates(directory="app/templates")
-
 
 from app.schemas.categoria_schemas import ProductosDescendientesResponse, CategoriaHijaSchema
 
@@ -37,12 +46,21 @@ def listar_categorias(
     return categorias
 
 @router.get("/raiz_activas", response_class=HTMLResponse)
-async def listar_categorias_raiz_activas(db: Annotated[Session, Depends(get_session)], request: Request):
+async def listar_categorias_raiz_activas(
+    db: Annotated[Session, Depends(get_session)],
+    request: Request,
+    bloqueante: Annotated[Callable[..., Any], Depends(EjecutorThreadpool("lectura"))],
+    cache: Annotated[ValidadorCatalogo, Depends(condicional_catalogo)]
+):
     """
     Obtener solo categorías raíz activas
     """
-    categorias = categoria_crud.get_root_active(db)
-    return templates.TemplateResponse(request=request, name="_categorias.html", context = {"categorias": categorias})
+    if cache.no_modificado:
+        return cache.respuesta_304()
+    categorias = await bloqueante(categoria_crud.get_root_active, db)
+    return cache.aplicar(
+        templates.TemplateResponse(request=request, name="_categorias.html", context = {"categorias": categorias})
+    )
 
 @router.get("/activas", response_model=List[CategoriaRead])
 def listar_categorias_activas(db: Session = Depends(get_session)):
@@ -65,85 +83,80 @@ async def mostrar_vista_buscar(request: Request):
     )
 
 
-@router.get("/carrito", response_class=HTMLResponse)
-async def mostrar_carrito_vacio(request: Request):
+def _sesion_carrito(request: Request) -> Tuple[str, bool]:
     """
-    Mostrar la vista del carrito vacío
+    ID de sesión del carrito desde la cookie; (nuevo_id, True) si no hay
     """
-    return templates.TemplateResponse(
-        name="_carrito.html", 
-        request=request, 
+    sesion_id = request.cookies.get(COOKIE_CARRITO)
+    if sesion_id and len(sesion_id) <= 64:
+        return sesion_id, False
+    return secrets.token_urlsafe(24), True
+
+
+def _con_cookie_carrito(response: HTMLResponse, sesion_id: str, nueva: bool) -> HTMLResponse:
+    if nueva:
+        response.set_cookie(
+            COOKIE_CARRITO, sesion_id,
+            max_age=COOKIE_CARRITO_MAX_AGE, httponly=True, samesite="lax"
+        )
+    return response
+
+
+def _render_carrito(request: Request, db: Session, sesion_id: str, nueva: bool) -> HTMLResponse:
+    datos = carrito_crud.lineas(db, sesion_id)
+    response = templates.TemplateResponse(
+        name="_carrito.html",
+        request=request,
         context={
-            "cart_items": [],
-            "total": 0.00,
-            "is_empty": True
+            "cart_items": datos["items"],
+            "total": datos["total"],
+            "is_empty": not datos["items"]
         }
     )
+    return _con_cookie_carrito(response, sesion_id, nueva)
+
+
+def _render_delta_carrito(request: Request, resultado: dict, sesion_id: str, nueva: bool) -> HTMLResponse:
+    response = templates.TemplateResponse(
+        name="_carrito_delta.html",
+        request=request,
+        context=resultado
+    )
+    return _con_cookie_carrito(response, sesion_id, nueva)
+
+
+@router.get("/carrito", response_class=HTMLResponse)
+def mostrar_carrito(
+    request: Request,
+    db: Annotated[Session, Depends(get_session)]
+):
+    """
+    Mostrar el carrito de la sesión con precios actuales
+    """
+    sesion_id, nueva = _sesion_carrito(request)
+    return _render_carrito(request, db, sesion_id, nueva)
 
 
 @router.post("/carrito", response_class=HTMLResponse)
-async def mostrar_carrito_con_datos(
+def mostrar_carrito_con_datos(
     request: Request,
     cart_data: dict,
     db: Annotated[Session, Depends(get_session)]
 ):
     """
-    Mostrar la vista del carrito con los productos enviados desde el frontend
+    Cargar en un carrito de servidor vacío el carrito guardado en el
+    navegador (solo ids y cantidades; los precios salen de la base)
     """
+    sesion_id, nueva = _sesion_carrito(request)
     try:
-        cart_items = cart_data.get("items", [])
-        
-        if not cart_items:
-            return templates.TemplateResponse(
-                name="_carrito.html", 
-                request=request, 
-                context={
-                    "cart_items": [],
-                    "total": 0.00,
-                    "is_empty": True
-                }
-            )
-        
-        # Procesar los items del carrito y calcular el total
-        processed_items = []
-        total = 0.00
-        
-        for item in cart_items:
-            item_total = float(item.get("price", 0)) * int(item.get("quantity", 0))
-            total += item_total
-            
-            processed_item = {
-                "id": item.get("id"),
-                "name": item.get("name", "Producto"),
-                "price": float(item.get("price", 0)),
-                "quantity": int(item.get("quantity", 0)),
-                "imageUrl": item.get("imageUrl") if item.get("imageUrl") and item.get("imageUrl").strip() != '' else None,
-                "item_total": item_total
-            }
-            processed_items.append(processed_item)
-        
-        return templates.TemplateResponse(
-            name="_carrito.html", 
-            request=request, 
-            context={
-                "cart_items": processed_items,
-                "total": total,
-                "is_empty": False
-            }
-        )
-        
-    except Exception as e:
+        items = [
+            (int(item["id"]), int(item.get("quantity", 0)))
+            for item in cart_data.get("items", [])
+        ]
+        carrito_crud.fusionar(db, sesion_id=sesion_id, items=items)
+    except (KeyError, TypeError, ValueError) as e:
         print(f"Error procesando carrito: {e}")
-        return templates.TemplateResponse(
-            name="_carrito.html", 
-            request=request, 
-            context={
-                "cart_items": [],
-                "total": 0.00,
-                "is_empty": True,
-                "error": "Error al cargar el carrito"
-            }
-        )
+    return _render_carrito(request, db, sesion_id, nueva)
 
 
 @router.get("/{categoria_id}", response_model=CategoriaRead)
@@ -262,26 +275,50 @@ def get_data_descendants_products(categoria_id: int, db: Session, solo_activos:
             detail="Categoría no encontrada"
         )
     
-    # Obtener productos de la categoría y sus descendientes
-    productos = categoria_crud.get_productos_descendientes(
-        db, 
-        categoria_id=categoria_id, 
-        solo_activos=solo_activos
-    )
-
     hijas = categoria_crud.get_categorias_hijas(
         db,
         categoria_id=categoria_id,
         solo_activos=solo_activos
     )
 
-    return {"productos": productos, "categorias_hijas": hijas}
+    # Primera página de productos, perezosa (ver _pagina_productos)
+    return {"productos": _pagina_productos(categoria_id, solo_activos), "categorias_hijas": hijas}
+
+
+def _pagina_productos(categoria_id: int, solo_activos: bool, despues_de: Optional[Tuple[str, int]] = None) -> PaginaKeyset:
+    """
+    Página perezosa de productos de la categoría y sus descendientes: la
+    consulta corre recién cuando la plantilla empieza a recorrerla, y las
+    peticiones simultáneas de la misma página la comparten (single-flight)
+    """
+    def filas():
+        yield from categoria_crud.pagina_productos_descendientes(
+            categoria_id=categoria_id,
+            solo_activos=solo_activos,
+            despues_de=despues_de,
+            limite=PRODUCTOS_POR_PAGINA + 1
+        )
+
+    return PaginaKeyset(filas(), PRODUCTOS_POR_PAGINA)
+
+
+def _url_pagina_productos(categoria_id: int, solo_activos: bool) -> str:
+    return f"/api/v2/categorias/{categoria_id}/productos/pagina?solo_activos={str(solo_activos).lower()}"
+
+
+def _transmitir_productos(nombre: str, contexto: dict) -> StreamingResponse:
+    pagina = contexto["productos"]
+    return StreamingResponse(
+        transmitir(nombre, contexto, al_cerrar=pagina.close),
+        media_type="text/html; charset=utf-8"
+    )
 
 @router.get("/{categoria_id}/productos", response_class=HTMLResponse)
 def obtener_productos_descendientes(
     request: Request,
     categoria_id: int, 
     db: Annotated[Session, Depends(get_session)],
+    cache: Annotated[ValidadorCatalogo, Depends(condicional_catalogo)],
     solo_activos: bool = True
 ):
     """
@@ -296,21 +333,52 @@ def obtener_productos_descendientes(
     Returns:
         Lista de productos de la categoría padre y todas sus subcategorías descendientes activas
     """
+    if cache.no_modificado:
+        return cache.respuesta_304()
 
-
-    # Obtener productos de la categoría y sus descendientes
+    # Categorías hijas ya resueltas; los productos se leen mientras se envía la respuesta
     data = get_data_descendants_products(categoria_id=categoria_id, db=db, solo_activos=solo_activos)
 
-    productos = data["productos"]
-    
-    
-    # Obtener categorías hijas directas
-    categorias_hijas_data =  data["categorias_hijas"]
-    
     # Convertir a objetos del schema
-    categorias_hijas = [CategoriaHijaSchema(**categoria) for categoria in categorias_hijas_data]
+    categorias_hijas = [CategoriaHijaSchema(**categoria) for categoria in data["categorias_hijas"]]
 
-    return templates.TemplateResponse(name="_productos.html", request=request, context={"padre": None, "categoria_padre_id": categoria_id, "productos": productos, "total_productos": len(productos), "categorias_hijas": categorias_hijas})
+    return cache.aplicar(_transmitir_productos("_productos.html", {
+        "request": request,
+        "padre": None,
+        "categoria_padre_id": categoria_id,
+        "productos": data["productos"],
+        "categorias_hijas": categorias_hijas,
+        "siguiente_url": _url_pagina_productos(categoria_id, solo_activos),
+    }))
+
+
+@router.get("/{categoria_id}/productos/pagina", response_class=HTMLResponse)
+def obtener_pagina_productos_descendientes(
+    request: Request,
+    categoria_id: int,
+    cache: Annotated[ValidadorCatalogo, Depends(condicional_catalogo)],
+    cursor: str = Query(..., max_length=512),
+    solo_activos: bool = True
+):
+    """
+    Siguiente página del listado de productos de una categoría (scroll
+    infinito): solo las tarjetas y, si quedan productos, el disparador de
+    la página siguiente
+    """
+    despues_de = decodificar_cursor(cursor, (str, int))
+    if despues_de is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor inválido"
+        )
+    if cache.no_modificado:
+        return cache.respuesta_304()
+
+    return cache.aplicar(_transmitir_productos("_productos_pagina.html", {
+        "request": request,
+        "productos": _pagina_productos(categoria_id, solo_activos, despues_de),
+        "siguiente_url": _url_pagina_productos(categoria_id, solo_activos),
+    }))
 
 @router.post("/{categoria_id}/productos", response_class=HTMLResponse)
 def obtener_productos_descendientes_post(
@@ -333,29 +401,34 @@ def obtener_productos_descendientes_post(
         Lista de productos de la categoría padre y todas sus subcategorías descendientes activas
     """
  
-    # Obtener productos de la categoría y sus descendientes
+    # Categorías hijas ya resueltas; los productos se leen mientras se envía la respuesta
     data = get_data_descendants_products(categoria_id=categoria_id, db=db, solo_activos=solo_activos)
 
-    productos = data["productos"]
-    
-    
-    # Obtener categorías hijas directas
-    categorias_hijas_data =  data["categorias_hijas"]
-    
     # Convertir a objetos del schema
-    categorias_hijas = [CategoriaHijaSchema(**categoria) for categoria in categorias_hijas_data]
+    categorias_hijas = [CategoriaHijaSchema(**categoria) for categoria in data["categorias_hijas"]]
 
-    return templates.TemplateResponse(name="_productos.html", request=request, context={"padre": padre,"categoria_padre_id": categoria_id, "productos": productos, "total_productos": len(productos), "categorias_hijas": categorias_hijas})
+    return _transmitir_productos("_productos.html", {
+        "request": request,
+        "padre": padre,
+        "categoria_padre_id": categoria_id,
+        "productos": data["productos"],
+        "categorias_hijas": categorias_hijas,
+        "siguiente_url": _url_pagina_productos(categoria_id, solo_activos),
+    })
 
 @router.get("/productos/{producto_id}/detalle", response_class=HTMLResponse)
 def obtener_detalle_producto(
     request: Request,
     producto_id: int,
-    db: Annotated[Session, Depends(get_session)]
+    db: Annotated[Session, Depends(get_session)],
+    cache: Annotated[ValidadorCatalogo, Depends(condicional_catalogo)]
 ):
     """
     Obtener el detalle de un producto específico (solo vista informativa)
     """
+    if cache.no_modificado:
+        return cache.respuesta_304()
+
     # Usar consulta SQL directa
     statement = text("""
         SELECT p.id, p.nombre, p.descripcion, p.precio_venta, 
@@ -386,22 +459,36 @@ def obtener_detalle_producto(
         "categoria_nombre": result.categoria_nombre or "Sin categoría"
     }
 
-    return templates.TemplateResponse(
+    return cache.aplicar(templates.TemplateResponse(
         name="detalle_producto.html", 
         request=request, 
         context={
             "producto": producto_data,
             "categoria_nombre": producto_data["categoria_nombre"]
         }
-    )
+    ))
 
 
 # ============================================================================
 # ENDPOINTS PARA FORMULARIO DEL CARRITO
 # ============================================================================
 
+@router.post("/carrito/add/{product_id}", response_class=HTMLResponse)
+def agregar_al_carrito(
+    product_id: int,
+    request: Request,
+    db: Annotated[Session, Depends(get_session)]
+):
+    """
+    Agregar una unidad de un producto al carrito (botón añadir)
+    """
+    sesion_id, nueva = _sesion_carrito(request)
+    resultado = carrito_crud.agregar(db, sesion_id=sesion_id, producto_id=product_id, cantidad=1)
+    return _render_delta_carrito(request, resultado, sesion_id, nueva)
+
+
 @router.post("/carrito/increase/{product_id}", response_class=HTMLResponse)
-async def aumentar_cantidad_carrito(
+def aumentar_cantidad_carrito(
     product_id: int,
     request: Request,
     db: Annotated[Session, Depends(get_session)]
@@ -409,21 +496,13 @@ async def aumentar_cantidad_carrito(
     """
     Aumentar cantidad de un producto en el carrito (para botón +)
     """
-    # Obtener carrito de session o cookie temporal
-    # Por ahora vamos a devolver el carrito vacío como placeholder
-    return templates.TemplateResponse(
-        name="_carrito.html", 
-        request=request, 
-        context={
-            "cart_items": [],
-            "total": 0.00,
-            "is_empty": True
-        }
-    )
+    sesion_id, nueva = _sesion_carrito(request)
+    resultado = carrito_crud.agregar(db, sesion_id=sesion_id, producto_id=product_id, cantidad=1)
+    return _render_delta_carrito(request, resultado, sesion_id, nueva)
 
 
 @router.post("/carrito/decrease/{product_id}", response_class=HTMLResponse)
-async def disminuir_cantidad_carrito(
+def disminuir_cantidad_carrito(
     product_id: int,
     request: Request,
     db: Annotated[Session, Depends(get_session)]
@@ -431,45 +510,28 @@ async def disminuir_cantidad_carrito(
     """
     Disminuir cantidad de un producto en el carrito (para botón -)
     """
-    # Obtener carrito de session o cookie temporal
-    # Por ahora vamos a devolver el carrito vacío como placeholder
-    return templates.TemplateResponse(
-        name="_carrito.html", 
-        request=request, 
-        context={
-            "cart_items": [],
-            "total": 0.00,
-            "is_empty": True
-        }
-    )
+    sesion_id, nueva = _sesion_carrito(request)
+    resultado = carrito_crud.agregar(db, sesion_id=sesion_id, producto_id=product_id, cantidad=-1)
+    return _render_delta_carrito(request, resultado, sesion_id, nueva)
 
 
 @router.post("/carrito/update/{product_id}", response_class=HTMLResponse)
-async def actualizar_cantidad_carrito(
+def actualizar_cantidad_carrito(
     product_id: int,
     request: Request,
-    db: Annotated[Session, Depends(get_session)]
+    db: Annotated[Session, Depends(get_session)],
+    cantidad: int = Form(...)
 ):
     """
     Actualizar cantidad específica de un producto en el carrito (input number)
     """
-    # Obtener nueva cantidad del form data
-    form_data = await request.form()
-    # Procesar actualización...
-    # Por ahora vamos a devolver el carrito vacío como placeholder
-    return templates.TemplateResponse(
-        name="_carrito.html", 
-        request=request, 
-        context={
-            "cart_items": [],
-            "total": 0.00,
-            "is_empty": True
-        }
-    )
+    sesion_id, nueva = _sesion_carrito(request)
+    resultado = carrito_crud.establecer(db, sesion_id=sesion_id, producto_id=product_id, cantidad=cantidad)
+    return _render_delta_carrito(request, resultado, sesion_id, nueva)
 
 
 @router.post("/carrito/remove/{product_id}", response_class=HTMLResponse)
-async def eliminar_producto_carrito(
+def eliminar_producto_carrito(
     product_id: int,
     request: Request,
     db: Annotated[Session, Depends(get_session)]
@@ -477,151 +539,100 @@ async def eliminar_producto_carrito(
     """
     Eliminar un producto del carrito
     """
-    # Procesar eliminación...
-    # Por ahora vamos a devolver el carrito vacío como placeholder
-    return templates.TemplateResponse(
-        name="_carrito.html", 
-        request=request, 
-        context={
-            "cart_items": [],
-            "total": 0.00,
-            "is_empty": True
-        }
-    )
+    sesion_id, nueva = _sesion_carrito(request)
+    resultado = carrito_crud.eliminar(db, sesion_id=sesion_id, producto_id=product_id)
+    return _render_delta_carrito(request, resultado, sesion_id, nueva)
 
 
 @router.post("/carrito/checkout", response_class=HTMLResponse)
-async def procesar_checkout(
-    request: Request,
-    db: Annotated[Session, Depends(get_session)]
-):
+async def procesar_checkout(request: Request):
     """
     Procesar la compra final del carrito (submit del formulario)
     """
     try:
-        print("=== INICIANDO CHECKOUT ===")
-        
-        # Obtener datos del formulario
         form_data = await request.form()
-        print(f"Form data recibido: {dict(form_data)}")
-        
-        # Procesar items del carrito desde el formulario
-        cart_items = []
-        item_index = 0
-        
-        while f"items[{item_index}][id]" in form_data:
-            item = {
-                "id": int(form_data[f"items[{item_index}][id]"]),
-                "name": form_data[f"items[{item_index}][name]"],
-                "price": float(form_data[f"items[{item_index}][price]"]),
-                "quantity": int(form_data[f"items[{item_index}][quantity]"])
-            }
-            cart_items.append(item)
-            print(f"Item procesado: {item}")
-            item_index += 1
-        
-        if not cart_items:
-            print("No hay items en el carrito")
-            return templates.TemplateResponse(
-                name="_carrito.html", 
-                request=request, 
+        sesion_id = request.cookies.get(COOKIE_CARRITO)
+        metodo_pago = form_data.get("metodo_pago", "contra_entrega")
+
+        def registrar(db: Session, cart_items: List[Tuple[int, int]]):
+            # Validar todo el carrito en un solo query y registrar la venta
+            # (el commit lo hace idempotencia.ejecutar con la respuesta)
+            try:
+                resultado = venta_crud.checkout(
+                    db,
+                    items=cart_items,
+                    metodo_pago=venta_crud.metodo_pago_checkout(metodo_pago),
+                    tareas=[(TAREA_CONFIRMACION, {})],
+                    confirmar=False
+                )
+            except ValueError as e:
+                response = templates.TemplateResponse(
+                    name="_carrito.html",
+                    request=request,
+                    context={
+                        "cart_items": [],
+                        "total": 0.00,
+                        "is_empty": True,
+                        "error": str(e)
+                    }
+                )
+                return response, None
+
+            total = float(resultado["total"])
+
+            response = templates.TemplateResponse(
+                name="checkout_success.html",
+                request=request,
                 context={
-                    "cart_items": [],
-                    "total": 0.00,
-                    "is_empty": True,
-                    "error": "No hay productos en el carrito"
+                    "success_message": f"¡Compra procesada exitosamente! Total: ${total:.2f}",
+                    "order_total": total,
+                    "items_purchased": len(resultado["items"]),
+                    "numero_venta": resultado["venta"].numero_venta,
+                    "cliente": {},
+                    "direccion": {},
+                    "metodo_pago": metodo_pago,
+                    "items": resultado["items"],
+                    "ajustes": resultado["ajustes"],
+                    "total_items": len(resultado["items"]),
+                    "total": total,
+                    "now": datetime.now()
                 }
             )
-        
-        # Validar productos contra la base de datos y calcular total
-        validated_items = []
-        total = 0.00
-        
-        for item in cart_items:
-            print(f"Validando producto ID: {item['id']}")
-            
-            # Verificar que el producto existe y está activo
-            statement = text("""
-                SELECT id, nombre, precio_venta, stock_actual, activo
-                FROM producto 
-                WHERE id = :producto_id AND activo = true
-            """)
-            
-            result = db.execute(statement, {"producto_id": item['id']}).first()
-            
-            if not result:
-                print(f"Producto ID {item['id']} no encontrado o inactivo")
-                continue
-                
-            # Verificar stock disponible
-            if result.stock_actual < item['quantity']:
-                print(f"Stock insuficiente para {result.nombre}. Disponible: {result.stock_actual}, Solicitado: {item['quantity']}")
-                # Por ahora continuamos, pero en producción podrías manejar esto diferente
-                available_quantity = max(0, int(result.stock_actual))
-                if available_quantity == 0:
-                    continue
-                item['quantity'] = available_quantity
-            
-            # Usar precio actual de la base de datos
-            actual_price = float(result.precio_venta)
-            item_total = actual_price * item['quantity']
-            total += item_total
-            
-            validated_items.append({
-                "id": result.id,
-                "name": result.nombre,
-                "price": actual_price,
-                "quantity": item['quantity'],
-                "item_total": item_total
-            })
-            
-            print(f"Item validado: {result.nombre} - Cantidad: {item['quantity']} - Total: ${item_total:.2f}")
-        
-        if not validated_items:
-            print("No hay items válidos después de la validación")
-            return templates.TemplateResponse(
-                name="_carrito.html", 
-                request=request, 
-                context={
-                    "cart_items": [],
-                    "total": 0.00,
-                    "is_empty": True,
-                    "error": "No hay productos válidos en el carrito"
-                }
+            return response, resultado["venta"].id
+
+        def checkout():
+            # Items del carrito del servidor o, si no hay, del formulario.
+            # Cada paso suelta su conexión antes del siguiente.
+            cart_items = list(carrito_crud.obtener(sesion_id).items()) if sesion_id else []
+            if not cart_items:
+                item_index = 0
+                while f"items[{item_index}][id]" in form_data:
+                    cart_items.append((
+                        int(form_data[f"items[{item_index}][id]"]),
+                        int(form_data[f"items[{item_index}][quantity]"])
+                    ))
+                    item_index += 1
+
+            # Los reenvíos con la misma clave reciben la respuesta guardada
+            # sin volver a validar
+            respuesta, venta_id = idempotencia_crud.ejecutar(
+                alcance="carrito-checkout",
+                clave=clave,
+                procesar=lambda db: registrar(db, cart_items)
             )
-        
-        print(f"=== CHECKOUT EXITOSO ===")
-        print(f"Total de items: {len(validated_items)}")
-        print(f"Total a pagar: ${total:.2f}")
-        
-        # TODO: Aquí implementarías:
-        # - Reducir stock de productos
-        # - Crear registro de pedido
-        # - Procesar pago
-        # - Enviar confirmación por email
-        
-        # Obtener timestamp actual
-        from datetime import datetime
-        now = datetime.now()
-        
-        # Devolver página de éxito completa
-        print("Devolviendo página de éxito completa...")
-        return templates.TemplateResponse(
-            name="checkout_success.html", 
-            request=request, 
-            context={
-                "success_message": f"¡Compra procesada exitosamente! Total: ${total:.2f}",
-                "order_total": total,
-                "items_purchased": len(validated_items),
-                "now": now
-            }
-        )
-        
+            if sesion_id and venta_id is not None:
+                carrito_crud.vaciar(sesion_id=sesion_id)
+            return respuesta
+
+        # En un hilo porque puede esperar al envío en curso con la misma clave
+        clave = form_data.get("idempotency_key") or request.headers.get("Idempotency-Key")
+        return await en_threadpool("escritura", checkout)
+
     except Exception as e:
         print(f"Error en checkout: {str(e)}")
         return templates.TemplateResponse(
-            name="_carrito.html", 
-            request=request, 
+            name="_carrito.html",
+            request=request,
             context={
                 "cart_items": [],
                 "total": 0.00,
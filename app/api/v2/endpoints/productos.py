@@ -2,16 +2,17 @@
 Endpoints API para Productos
 """
 
-from typing import List, Annotated
+from typing import Any, Callable, List, Annotated, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
-from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse
 from sqlmodel import Session
 
+from app.core.cache_http import ValidadorCatalogo, condicional_catalogo
+from app.core.concurrencia import EjecutorThreadpool
 from app.core.database import get_session
+from app.core.templates import templates
 from app.crud import producto as producto_crud
 
-templates = Jinja2Templates(directory="app/templates")
 
 router = APIRouter()
 
@@ -19,14 +20,15 @@ router = APIRouter()
 @router.get("/test", response_class=HTMLResponse)
 async def test_productos(
     request: Request,
-    db: Annotated[Session, Depends(get_session)]
+    db: Annotated[Session, Depends(get_session)],
+    bloqueante: Annotated[Callable[..., Any], Depends(EjecutorThreadpool("lectura"))]
 ):
     """
     Endpoint de prueba para verificar productos en la base de datos
     """
     try:
         # Intentar obtener todos los productos activos
-        productos_activos = producto_crud.get_activos(db)
+        productos_activos = await bloqueante(producto_crud.get_activos, db)
         
         return templates.TemplateResponse(
             name="_productos.html", 
@@ -58,6 +60,8 @@ async def test_productos(
 async def buscar_productos(
     request: Request,
     db: Annotated[Session, Depends(get_session)],
+    bloqueante: Annotated[Callable[..., Any], Depends(EjecutorThreadpool("busqueda"))],
+    cache: Annotated[ValidadorCatalogo, Depends(condicional_catalogo)],
     q: str = Query("", description="Término de búsqueda")
 ):
     """
@@ -71,6 +75,8 @@ async def buscar_productos(
         HTML con las cards de productos que coinciden con la búsqueda
     """
     termino_limpio = q.strip()
+    if cache.no_modificado:
+        return cache.respuesta_304()
     
     try:
         # Si el término está vacío o es muy corto, no hacer búsqueda
@@ -87,14 +93,14 @@ async def buscar_productos(
             )
         
         # Buscar productos que contengan el término en nombre, código o descripción
-        productos = producto_crud.buscar_por_termino(db, termino=termino_limpio)
+        productos = await bloqueante(producto_crud.buscar_por_termino, db, termino=termino_limpio)
 
         print(producto for producto in productos)
         
         # No hay categorías hijas en una búsqueda
         categorias_hijas = []
         
-        return templates.TemplateResponse(
+        return cache.aplicar(templates.TemplateResponse(
             name="_productos.html", 
             request=request, 
             context={
@@ -103,7 +109,7 @@ async def buscar_productos(
                 "categorias_hijas": categorias_hijas,
                 "termino_busqueda": termino_limpio
             }
-        )
+        ))
     except Exception as e:
         print(f"Error en buscar_productos: {e}")
         return templates.TemplateResponse(
@@ -123,18 +129,22 @@ async def buscar_productos(
 async def listar_productos_activos(
     request: Request,
     db: Annotated[Session, Depends(get_session)],
+    bloqueante: Annotated[Callable[..., Any], Depends(EjecutorThreadpool("lectura"))],
+    cache: Annotated[ValidadorCatalogo, Depends(condicional_catalogo)],
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100)
 ):
     """
     Listar todos los productos activos con paginación.
     """
-    productos = producto_crud.get_activos(db)
+    if cache.no_modificado:
+        return cache.respuesta_304()
+    productos = await bloqueante(producto_crud.get_activos, db)
     
     # Aplicar paginación manual
     productos_paginados = productos[skip:skip + limit]
     
-    return templates.TemplateResponse(
+    return cache.aplicar(templates.TemplateResponse(
         name="_productos.html", 
         request=request, 
         context={
@@ -142,4 +152,33 @@ async def listar_productos_activos(
             "total_productos": len(productos_paginados), 
             "categorias_hijas": []
         }
+    ))
+
+
+@router.get("/mas_vendidos", response_class=HTMLResponse)
+async def listar_mas_vendidos(
+    request: Request,
+    db: Annotated[Session, Depends(get_session)],
+    bloqueante: Annotated[Callable[..., Any], Depends(EjecutorThreadpool("lectura"))],
+    ventana: str = Query("7d", pattern="^(hoy|7d|30d)$"),
+    categoria_id: Optional[int] = Query(None, ge=1),
+    limit: int = Query(12, ge=1, le=20)
+):
+    """
+    Sección "más vendidos" de la tienda, global o de una categoría y sus
+    descendientes. Se sirve desde el ranking en memoria.
+    """
+    productos = await bloqueante(
+        producto_crud.get_mas_vendidos, db, limit=limit, ventana=ventana, categoria_id=categoria_id
+    )
+
+    return templates.TemplateResponse(
+        name="_productos.html",
+        request=request,
+        context={
+            "productos": productos,
+            "total_productos": len(productos),
+            "categorias_hijas": [],
+            "titulo": "Más vendidos"
+        }
     )
@@ -0,0 +1,272 @@
+"""
+Comandos de mantenimiento del sistema Market
+
+Uso:
+    python -m app.cli backfill-rollups [--desde YYYY-MM-DD] [--hasta YYYY-MM-DD]
+    python -m app.cli benchmark-analitica [--desde YYYY-MM-DD] [--hasta YYYY-MM-DD] [--repeticiones N]
+    python -m app.cli particiones-asegurar [--meses N]
+    python -m app.cli particiones-archivar [--retencion-meses N] [--eliminar]
+    python -m app.cli idempotencia-limpiar
+    python -m app.cli cola-worker [--workers N]
+    python -m app.cli cola-purgar [--dias N]
+    python -m app.cli templates-precompilar
+    python -m app.cli static-comprimir [--directorio app/static]
+"""
+
+import argparse
+import sys
+import time
+from datetime import date, timedelta
+
+from sqlmodel import Session
+
+from app.core import templates as templates_core
+from app.core.compresion import brotli, precomprimir_directorio
+from app.core.database import engine
+from app.crud import analitica as analitica_crud
+from app.crud import cola_pedidos as cola_pedidos_crud
+from app.crud import particion as particion_crud
+from app.crud import idempotencia as idempotencia_crud
+from app.crud import reporte as reporte_crud
+
+
+def _fecha(valor: str) -> date:
+    try:
+        return date.fromisoformat(valor)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Fecha inválida: {valor} (formato YYYY-MM-DD)")
+
+
+def _fin_de_mes(dia: date) -> date:
+    siguiente = (dia.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return siguiente - timedelta(days=1)
+
+
+def backfill_rollups(args: argparse.Namespace) -> int:
+    """
+    Recalcular los rollups de ventas mes a mes (una transacción por mes)
+    """
+    with Session(engine) as db:
+        rango = reporte_crud.rango_ventas(db)
+        if rango is None and (args.desde is None or args.hasta is None):
+            print("No hay ventas registradas")
+            return 0
+
+        desde = args.desde or rango[0]
+        hasta = args.hasta or rango[1]
+        if hasta < desde:
+            print("--hasta debe ser posterior a --desde", file=sys.stderr)
+            return 2
+
+        inicio_total = time.perf_counter()
+        tramo = desde
+        while tramo <= hasta:
+            fin_tramo = min(_fin_de_mes(tramo), hasta)
+            inicio = time.perf_counter()
+            filas = reporte_crud.reconstruir_rollups(db, fecha_inicio=tramo, fecha_fin=fin_tramo)
+            print(
+                f"{tramo} .. {fin_tramo}: "
+                f"{filas['hora_producto']} hora x producto, "
+                f"{filas['dia_producto']} día x producto, "
+                f"{filas['dia_metodo_pago']} día x método de pago "
+                f"({time.perf_counter() - inicio:.2f}s)"
+            )
+            tramo = fin_tramo + timedelta(days=1)
+
+        print(f"Backfill completado en {time.perf_counter() - inicio_total:.2f}s")
+    return 0
+
+
+def benchmark_analitica(args: argparse.Namespace) -> int:
+    """
+    Comparar la analítica NumPy con SQL y Python puro sobre el mismo rango
+    """
+    hasta = args.hasta or date.today()
+    desde = args.desde or hasta - timedelta(days=364)
+
+    with Session(engine) as db:
+        resultado = analitica_crud.benchmark(
+            db, fecha_inicio=desde, fecha_fin=hasta, repeticiones=args.repeticiones
+        )
+
+    print(f"Rango {desde} .. {hasta}: {resultado['lineas']} líneas, "
+          f"{resultado['productos_catalogo']} productos en catálogo")
+    print(f"  carga columnar : {resultado['ms_carga_columnar']:>10.2f} ms")
+    print(f"  numpy          : {resultado['ms_numpy']:>10.2f} ms")
+    print(f"  python puro    : {resultado['ms_python']:>10.2f} ms")
+    print(f"  sql            : {resultado['ms_sql']:>10.2f} ms")
+    print(f"  resultados coinciden: {'sí' if resultado['coinciden'] else 'NO'}")
+    return 0 if resultado["coinciden"] else 1
+
+
+def _restar_meses(dia: date, meses: int) -> date:
+    total = dia.year * 12 + dia.month - 1 - meses
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def particiones_asegurar(args: argparse.Namespace) -> int:
+    """
+    Crear las particiones mensuales que falten hasta --meses meses adelante
+    """
+    with Session(engine) as db:
+        if not particion_crud.particionado(db):
+            print("La base no está particionada (ver db_info/create_particiones.sql)", file=sys.stderr)
+            return 1
+        creadas = particion_crud.asegurar(db, meses_adelante=args.meses)
+    print(f"Particiones creadas: {creadas}")
+    return 0
+
+
+def particiones_archivar(args: argparse.Namespace) -> int:
+    """
+    Separar las particiones más viejas que la retención y archivarlas o borrarlas
+    """
+    limite = _restar_meses(date.today(), args.retencion_meses)
+    with Session(engine) as db:
+        if not particion_crud.particionado(db):
+            print("La base no está particionada (ver db_info/create_particiones.sql)", file=sys.stderr)
+            return 1
+        procesadas = particion_crud.archivar(db, antes_de=limite, eliminar=args.eliminar)
+
+    destino = "eliminadas" if args.eliminar else "movidas al esquema archivo"
+    print(f"Particiones anteriores a {limite} {destino}: {len(procesadas)}")
+    for nombre in procesadas:
+        print(f"  {nombre}")
+    return 0
+
+
+def idempotencia_limpiar(args: argparse.Namespace) -> int:
+    """
+    Borrar las claves de idempotencia del checkout ya vencidas
+    """
+    borradas = idempotencia_crud.limpiar()
+    print(f"Claves de idempotencia vencidas borradas: {borradas}")
+    return 0
+
+
+def cola_worker(args: argparse.Namespace) -> int:
+    """
+    Procesar la cola de pedidos en primer plano hasta Ctrl+C
+    """
+    cola_pedidos_crud.iniciar(workers=args.workers)
+    print(f"Workers de la cola de pedidos: {args.workers} (Ctrl+C para terminar)")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        cola_pedidos_crud.detener()
+    return 0
+
+
+def cola_purgar(args: argparse.Namespace) -> int:
+    """
+    Borrar las tareas completadas de la cola de pedidos
+    """
+    borradas = cola_pedidos_crud.purgar(dias=args.dias)
+    print(f"Tareas completadas borradas: {borradas}")
+    return 0
+
+
+def templates_precompilar(args: argparse.Namespace) -> int:
+    """
+    Compilar todas las plantillas y guardar su bytecode en TEMPLATES_CACHE_DIR
+    (para correr en el build y arrancar sin compilar)
+    """
+    inicio = time.perf_counter()
+    compiladas = templates_core.precompilar(templates_core.templates.env)
+    print(
+        f"Plantillas compiladas: {compiladas} en {time.perf_counter() - inicio:.2f} s "
+        f"-> {templates_core.TEMPLATES_CACHE_DIR}"
+    )
+    return 0
+
+
+def static_comprimir(args: argparse.Namespace) -> int:
+    """
+    Escribir los hermanos .gz/.br de los archivos estáticos (paso de build)
+    """
+    resumen = precomprimir_directorio(args.directorio)
+    print(f"Archivos: {resumen['archivos']} ({resumen['bytes_originales']} bytes)")
+    print(f"   gzip:   {resumen['bytes_gzip']} bytes")
+    if brotli is None:
+        print("   brotli: no instalado (pip install brotli), solo se generó .gz")
+    else:
+        print(f"   brotli: {resumen['bytes_brotli']} bytes")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Mantenimiento de Market")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    backfill = subparsers.add_parser(
+        "backfill-rollups",
+        help="Recalcular los rollups de ventas desde venta/detalle_venta"
+    )
+    backfill.add_argument("--desde", type=_fecha, help="Primer día (por defecto la primera venta)")
+    backfill.add_argument("--hasta", type=_fecha, help="Último día (por defecto la última venta)")
+    backfill.set_defaults(func=backfill_rollups)
+
+    bench = subparsers.add_parser(
+        "benchmark-analitica",
+        help="Medir la analítica NumPy frente a SQL y Python puro"
+    )
+    bench.add_argument("--desde", type=_fecha, help="Primer día (por defecto un año atrás)")
+    bench.add_argument("--hasta", type=_fecha, help="Último día (por defecto hoy)")
+    bench.add_argument("--repeticiones", type=int, default=5, help="Mejor de N ejecuciones")
+    bench.set_defaults(func=benchmark_analitica)
+
+    asegurar = subparsers.add_parser(
+        "particiones-asegurar",
+        help="Crear particiones mensuales futuras de venta, detalle_venta y movimiento_inventario"
+    )
+    asegurar.add_argument("--meses", type=int, default=3, help="Meses por delante del actual")
+    asegurar.set_defaults(func=particiones_asegurar)
+
+    archivar = subparsers.add_parser(
+        "particiones-archivar",
+        help="Separar particiones viejas y moverlas al esquema archivo"
+    )
+    archivar.add_argument("--retencion-meses", type=int, default=24, help="Meses completos que se conservan")
+    archivar.add_argument("--eliminar", action="store_true", help="Borrar en vez de archivar")
+    archivar.set_defaults(func=particiones_archivar)
+
+    limpiar = subparsers.add_parser(
+        "idempotencia-limpiar",
+        help="Borrar claves de idempotencia del checkout vencidas"
+    )
+    limpiar.set_defaults(func=idempotencia_limpiar)
+
+    worker = subparsers.add_parser(
+        "cola-worker",
+        help="Procesar la cola de pedidos (pasos posteriores al checkout)"
+    )
+    worker.add_argument("--workers", type=int, default=2, help="Hilos worker (por defecto 2)")
+    worker.set_defaults(func=cola_worker)
+
+    purgar = subparsers.add_parser(
+        "cola-purgar",
+        help="Borrar tareas completadas de la cola de pedidos"
+    )
+    purgar.add_argument("--dias", type=int, default=7, help="Antigüedad mínima en días (por defecto 7)")
+    purgar.set_defaults(func=cola_purgar)
+
+    precompilar = subparsers.add_parser(
+        "templates-precompilar",
+        help="Compilar las plantillas Jinja2 a la caché de bytecode"
+    )
+    precompilar.set_defaults(func=templates_precompilar)
+
+    comprimir = subparsers.add_parser(
+        "static-comprimir",
+        help="Generar archivos .gz/.br junto a los estáticos"
+    )
+    comprimir.add_argument("--directorio", default="app/static", help="Directorio de estáticos (por defecto app/static)")
+    comprimir.set_defaults(func=static_comprimir)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
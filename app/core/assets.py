@@ -0,0 +1,151 @@
+"""
+Estáticos con huella de contenido (style.css -> style.<hash>.css) y caché inmutable
+"""
+
+import hashlib
+import os
+import re
+import threading
+from typing import Dict, Optional, Tuple
+
+from starlette.responses import Response
+from starlette.types import Scope
+
+from app.core.compresion import VARIANTES_PRECOMPRIMIDAS, StaticPrecomprimidos
+
+
+STATIC_DIR = os.getenv("STATIC_DIR", "app/static")
+STATIC_URL = "/static"
+# Caracteres hexadecimales del hash que se agregan al nombre del archivo
+ASSETS_LARGO_HASH = 10
+# "1" en desarrollo: recalcula el hash de un archivo cuando cambia en disco
+ASSETS_AUTO_RELOAD = os.getenv("ASSETS_AUTO_RELOAD", os.getenv("TEMPLATES_AUTO_RELOAD", "0")) == "1"
+
+CACHE_INMUTABLE = "public, max-age=31536000, immutable"
+
+_RE_VERSIONADO = re.compile(rf"^(?P<base>.+)\.(?P<hash>[0-9a-f]{{{ASSETS_LARGO_HASH}}})(?P<ext>\.[^./]+)$")
+
+
+def nombre_versionado(ruta: str, huella: str) -> str:
+    """
+    "css/style.css" -> "css/style.<huella>.css"
+    """
+    base, ext = os.path.splitext(ruta)
+    return f"{base}.{huella}{ext}"
+
+
+class ManifiestoAssets:
+    """
+    Mapa ruta relativa -> ruta con hash de contenido de cada archivo de
+    `directorio`, calculado una vez al importar. Las variantes .br/.gz
+    de static-comprimir no entran al manifiesto: se sirven por negociación.
+    """
+
+    def __init__(self, directorio: str = STATIC_DIR, auto_reload: bool = ASSETS_AUTO_RELOAD):
+        self.directorio = directorio
+        self.auto_reload = auto_reload
+        self._lock = threading.Lock()
+        # ruta -> (ruta versionada, mtime_ns)
+        self._rutas: Dict[str, Tuple[str, int]] = {}
+        # ruta versionada -> ruta
+        self._originales: Dict[str, str] = {}
+        self.cargar()
+
+    def _hash(self, ruta: str) -> Tuple[str, int]:
+        completa = os.path.join(self.directorio, ruta)
+        with open(completa, "rb") as f:
+            huella = hashlib.sha256(f.read()).hexdigest()[:ASSETS_LARGO_HASH]
+        return nombre_versionado(ruta, huella), os.stat(completa).st_mtime_ns
+
+    def cargar(self) -> int:
+        """
+        Recalcular el manifiesto completo. Devuelve cuántos archivos tiene.
+        """
+        rutas = {}
+        extensiones_variantes = tuple(ext for _, ext in VARIANTES_PRECOMPRIMIDAS)
+        for raiz, _, archivos in os.walk(self.directorio):
+            for archivo in sorted(archivos):
+                if archivo.endswith(extensiones_variantes):
+                    continue
+                ruta = os.path.relpath(os.path.join(raiz, archivo), self.directorio).replace(os.sep, "/")
+                rutas[ruta] = self._hash(ruta)
+
+        with self._lock:
+            self._rutas = rutas
+            self._originales = {versionada: ruta for ruta, (versionada, _) in rutas.items()}
+        return len(rutas)
+
+    def _refrescar(self, ruta: str) -> None:
+        try:
+            mtime = os.stat(os.path.join(self.directorio, ruta)).st_mtime_ns
+        except OSError:
+            return
+        actual = self._rutas.get(ruta)
+        if actual is not None and actual[1] == mtime:
+            return
+        versionada, mtime = self._hash(ruta)
+        with self._lock:
+            if actual is not None:
+                self._originales.pop(actual[0], None)
+            self._rutas[ruta] = (versionada, mtime)
+            self._originales[versionada] = ruta
+
+    def url(self, ruta: str) -> str:
+        """
+        URL con hash de un estático (global `asset_url` de las plantillas).
+        Un archivo que no está en el manifiesto se devuelve sin hash.
+        """
+        ruta = ruta.lstrip("/")
+        if self.auto_reload:
+            self._refrescar(ruta)
+        entrada = self._rutas.get(ruta)
+        return f"{STATIC_URL}/{entrada[0] if entrada else ruta}"
+
+    def original(self, versionada: str) -> Optional[str]:
+        """
+        Ruta real de una ruta versionada vigente, o None
+        """
+        return self._originales.get(versionada)
+
+    @property
+    def huella(self) -> str:
+        """
+        Huella del manifiesto completo: cambia si cambia algún estático
+        """
+        with self._lock:
+            nombres = sorted(versionada for versionada, _ in self._rutas.values())
+        return hashlib.sha1("\n".join(nombres).encode()).hexdigest()[:8]
+
+
+manifiesto_assets = ManifiestoAssets()
+
+
+class StaticAssets(StaticPrecomprimidos):
+    """
+    StaticPrecomprimidos que además entiende las rutas versionadas del
+    manifiesto: las sirve con Cache-Control inmutable por un año. Una ruta
+    con un hash viejo (HTML anterior a un deploy) recibe el archivo actual
+    pero sin caché, para no fijar contenido que no corresponde a ese hash.
+    """
+
+    def __init__(self, *args, manifiesto: ManifiestoAssets = manifiesto_assets, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.manifiesto = manifiesto
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        ruta = path.replace(os.sep, "/")
+        original = self.manifiesto.original(ruta)
+        if original is not None:
+            respuesta = await super().get_response(original, scope)
+            if respuesta.status_code in (200, 304):
+                respuesta.headers["cache-control"] = CACHE_INMUTABLE
+            return respuesta
+
+        coincidencia = _RE_VERSIONADO.match(ruta)
+        if coincidencia is not None:
+            respuesta = await super().get_response(coincidencia["base"] + coincidencia["ext"], scope)
+            if respuesta.status_code in (200, 304):
+                respuesta.headers["cache-control"] = "no-cache"
+            return respuesta
+
+        return await super().get_response(path, scope)
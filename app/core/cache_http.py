@@ -0,0 +1,162 @@
+"""
+GET condicional (ETag / Last-Modified) para los fragmentos del catálogo
+"""
+
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+from sqlalchemy.exc import ProgrammingError, SQLAlchemyError
+from sqlmodel import text
+
+from app.core.assets import manifiesto_assets
+from app.core.database import engine
+from app.core.templates import TEMPLATES_DIR
+
+
+# Segundos que cada proceso reutiliza la versión leída de catalogo_version
+CATALOGO_VERSION_TTL = float(os.getenv("CATALOGO_VERSION_TTL", "1"))
+# Cache-Control de los fragmentos: el navegador revalida siempre (max-age),
+# la CDN puede servirlos s-maxage segundos y luego revalidar en segundo plano
+CATALOGO_MAX_AGE = int(os.getenv("CATALOGO_MAX_AGE", "0"))
+CATALOGO_S_MAXAGE = int(os.getenv("CATALOGO_S_MAXAGE", "60"))
+CATALOGO_STALE_WHILE_REVALIDATE = int(os.getenv("CATALOGO_STALE_WHILE_REVALIDATE", "30"))
+
+
+def _huella_plantillas(directorio: str = TEMPLATES_DIR) -> str:
+    """
+    Huella de las plantillas desplegadas y de los estáticos que referencian
+    (asset_url): un cambio de cualquiera de ellos también invalida los ETag
+    aunque el catálogo no haya cambiado
+    """
+    huella = hashlib.sha1(manifiesto_assets.huella.encode())
+    for raiz, _, archivos in os.walk(directorio):
+        for archivo in sorted(archivos):
+            ruta = os.path.join(raiz, archivo)
+            huella.update(f"{ruta}:{os.stat(ruta).st_mtime_ns}".encode())
+    return huella.hexdigest()[:8]
+
+
+class VersionCatalogo:
+    """
+    Lee (versión, fecha) de catalogo_version (ver
+    db_info/create_catalogo_version.sql), como mucho una vez cada `ttl`
+    segundos por proceso
+    """
+
+    def __init__(self, bind=engine, ttl: float = CATALOGO_VERSION_TTL):
+        self.bind = bind
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._valor: Optional[Tuple[int, datetime]] = None
+        self._expira = 0.0
+        self._deshabilitada = False
+
+    def obtener(self) -> Optional[Tuple[int, datetime]]:
+        """
+        (versión, fecha de la última modificación en UTC) o None si la tabla
+        no existe (sin migrar, los fragmentos se sirven sin validadores)
+        """
+        if self._deshabilitada:
+            return None
+        with self._lock:
+            if self._valor is not None and time.monotonic() < self._expira:
+                return self._valor
+
+        try:
+            with self.bind.connect() as conn:
+                row = conn.execute(
+                    text("SELECT version, fecha_actualizacion FROM catalogo_version WHERE id = 1")
+                ).first()
+        except ProgrammingError as e:
+            print(f"Sin tabla catalogo_version, GET condicional desactivado: {e}")
+            self._deshabilitada = True
+            return None
+        except SQLAlchemyError as e:
+            print(f"Error leyendo la versión del catálogo: {e}")
+            return None
+        if row is None:
+            return None
+
+        # Las fechas HTTP no tienen fracciones de segundo
+        valor = (row.version, row.fecha_actualizacion.replace(microsecond=0, tzinfo=timezone.utc))
+        with self._lock:
+            self._valor = valor
+            self._expira = time.monotonic() + self.ttl
+        return valor
+
+
+version_catalogo = VersionCatalogo()
+
+_HUELLA_PLANTILLAS = _huella_plantillas()
+
+
+class ValidadorCatalogo:
+    """
+    Validadores de una petición a un fragmento del catálogo. Uso:
+
+        if cache.no_modificado:
+            return cache.respuesta_304()
+        return cache.aplicar(templates.TemplateResponse(...))
+    """
+
+    def __init__(self, request: Request, version: Optional[Tuple[int, datetime]]):
+        self.etag: Optional[str] = None
+        self.ultima_modificacion: Optional[datetime] = None
+        self.no_modificado = False
+        if version is None:
+            return
+
+        numero, fecha = version
+        self.etag = f'W/"c{numero}-{_HUELLA_PLANTILLAS}"'
+        self.ultima_modificacion = fecha
+
+        si_no_coincide = request.headers.get("if-none-match")
+        if si_no_coincide is not None:
+            etiquetas = {etiqueta.strip() for etiqueta in si_no_coincide.split(",")}
+            self.no_modificado = self.etag in etiquetas or "*" in etiquetas
+            return
+
+        # If-Modified-Since solo cuenta si no hay If-None-Match
+        si_modificado_desde = request.headers.get("if-modified-since")
+        if si_modificado_desde:
+            try:
+                self.no_modificado = fecha <= parsedate_to_datetime(si_modificado_desde)
+            except (TypeError, ValueError):
+                pass
+
+    def _cabeceras(self) -> dict:
+        cabeceras = {
+            "Cache-Control": (
+                f"public, max-age={CATALOGO_MAX_AGE}, s-maxage={CATALOGO_S_MAXAGE}, "
+                f"stale-while-revalidate={CATALOGO_STALE_WHILE_REVALIDATE}"
+            ),
+        }
+        if self.etag:
+            cabeceras["ETag"] = self.etag
+            cabeceras["Last-Modified"] = format_datetime(self.ultima_modificacion, usegmt=True)
+        return cabeceras
+
+    def respuesta_304(self) -> Response:
+        return Response(status_code=304, headers=self._cabeceras())
+
+    def aplicar(self, response: Response) -> Response:
+        """
+        Agregar ETag, Last-Modified y Cache-Control a una respuesta 200
+        """
+        if response.status_code == 200 and self.etag:
+            response.headers.update(self._cabeceras())
+        return response
+
+
+def condicional_catalogo(request: Request) -> ValidadorCatalogo:
+    """
+    Dependencia para las rutas que sirven fragmentos del catálogo
+    """
+    return ValidadorCatalogo(request, version_catalogo.obtener())
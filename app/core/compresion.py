@@ -0,0 +1,216 @@
+"""
+Compresión de respuestas (gzip y brotli) y archivos estáticos precomprimidos
+"""
+
+import gzip
+import os
+import zlib
+from typing import Iterable, Set, Tuple
+
+import anyio.to_thread
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import IdentityResponder
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él solo se usa gzip
+    brotli = None
+
+
+# Respuestas dinámicas más chicas que esto (bytes) se envían sin comprimir
+COMPRESION_MINIMO = int(os.getenv("COMPRESION_MINIMO", "1000"))
+COMPRESION_NIVEL_GZIP = int(os.getenv("COMPRESION_NIVEL_GZIP", "6"))
+# Calidad de brotli al vuelo (0-11); los estáticos se comprimen con 11 en el build
+COMPRESION_CALIDAD_BROTLI = int(os.getenv("COMPRESION_CALIDAD_BROTLI", "5"))
+
+# Tipos de archivo estático que vale la pena precomprimir
+EXTENSIONES_COMPRIMIBLES = (".css", ".js", ".svg", ".html", ".json", ".txt", ".map")
+
+# Content-Type (prefijos) que no se comprimen al vuelo: ya vienen comprimidos
+# o son streams de eventos que no deben quedar retenidos en el compresor
+TIPOS_NO_COMPRIMIBLES = (
+    "text/event-stream",
+    "image/", "audio/", "video/", "font/woff",
+    "application/gzip", "application/x-gzip", "application/zip", "application/x-zip-compressed",
+    "application/x-brotli", "application/zstd", "application/x-7z-compressed",
+    "application/x-rar-compressed", "application/x-bzip2", "application/x-xz",
+)
+# Excepciones de texto dentro de esos prefijos
+TIPOS_COMPRIMIBLES = ("image/svg+xml",)
+
+# (Content-Encoding, extensión del archivo precomprimido) en orden de preferencia
+VARIANTES_PRECOMPRIMIDAS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def codificaciones_aceptadas(accept_encoding: str) -> Set[str]:
+    """
+    Codificaciones de Accept-Encoding, sin las marcadas con q=0
+    """
+    aceptadas = set()
+    for parte in accept_encoding.split(","):
+        nombre, _, parametros = parte.strip().partition(";")
+        if parametros.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        if nombre:
+            aceptadas.add(nombre.strip().lower())
+    return aceptadas
+
+
+def tipo_comprimible(content_type: str) -> bool:
+    """
+    False para los Content-Type que no vale la pena comprimir (ver TIPOS_NO_COMPRIMIBLES)
+    """
+    tipo = content_type.split(";", 1)[0].strip().lower()
+    return tipo in TIPOS_COMPRIMIBLES or not tipo.startswith(TIPOS_NO_COMPRIMIBLES)
+
+
+class ResponderComprimido(IdentityResponder):
+    """
+    IdentityResponder que además deja pasar sin tocar los Content-Type ya
+    comprimidos (imágenes, zip, gzip...), no solo text/event-stream
+    """
+
+    async def send_with_compression(self, message: Message) -> None:
+        await super().send_with_compression(message)
+        if message["type"] == "http.response.start":
+            content_type = Headers(raw=message["headers"]).get("content-type", "")
+            self.content_type_is_excluded = self.content_type_is_excluded or not tipo_comprimible(content_type)
+
+
+class GzipResponder(ResponderComprimido):
+    """
+    Gzip con zlib en lugar del GzipFile de starlette: en streaming cada parte
+    se vacía con Z_SYNC_FLUSH, así el cliente puede descomprimir y mostrar lo
+    recibido sin esperar al final de la respuesta
+    """
+
+    content_encoding = "gzip"
+
+    def __init__(self, app: ASGIApp, minimum_size: int, nivel: int = COMPRESION_NIVEL_GZIP) -> None:
+        super().__init__(app, minimum_size)
+        # wbits 16 + MAX_WBITS: formato gzip (cabecera y CRC), no zlib crudo
+        self.compresor = zlib.compressobj(nivel, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        comprimido = self.compresor.compress(body)
+        return comprimido + self.compresor.flush(zlib.Z_SYNC_FLUSH if more_body else zlib.Z_FINISH)
+
+
+class BrotliResponder(ResponderComprimido):
+    content_encoding = "br"
+
+    def __init__(self, app: ASGIApp, minimum_size: int, calidad: int = COMPRESION_CALIDAD_BROTLI) -> None:
+        super().__init__(app, minimum_size)
+        self.compresor = brotli.Compressor(quality=calidad)
+
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        comprimido = self.compresor.process(body)
+        # En streaming se vacía el buffer en cada parte para no retener datos
+        return comprimido + (self.compresor.flush() if more_body else self.compresor.finish())
+
+
+class CompresionMiddleware:
+    """
+    Comprime las respuestas dinámicas con brotli (si está instalado y el
+    cliente lo acepta) o gzip, a partir de `minimo` bytes. Las rutas con
+    prefijo en `excluir` (los estáticos, que ya vienen precomprimidos), las
+    respuestas que ya traen Content-Encoding y las de tipos ya comprimidos
+    (ver TIPOS_NO_COMPRIMIBLES) pasan sin tocar.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimo: int = COMPRESION_MINIMO,
+        nivel_gzip: int = COMPRESION_NIVEL_GZIP,
+        calidad_brotli: int = COMPRESION_CALIDAD_BROTLI,
+        excluir: Tuple[str, ...] = ("/static",)
+    ) -> None:
+        self.app = app
+        self.minimo = minimo
+        self.nivel_gzip = nivel_gzip
+        self.calidad_brotli = calidad_brotli
+        self.excluir = excluir
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"].startswith(self.excluir):
+            await self.app(scope, receive, send)
+            return
+
+        aceptadas = codificaciones_aceptadas(Headers(scope=scope).get("accept-encoding", ""))
+        if brotli is not None and "br" in aceptadas:
+            responder = BrotliResponder(self.app, self.minimo, calidad=self.calidad_brotli)
+        elif "gzip" in aceptadas:
+            responder = GzipResponder(self.app, self.minimo, nivel=self.nivel_gzip)
+        else:
+            responder = IdentityResponder(self.app, self.minimo)
+
+        await responder(scope, receive, send)
+
+
+class StaticPrecomprimidos(StaticFiles):
+    """
+    StaticFiles que, si el cliente lo acepta, sirve el hermano .br o .gz de
+    cada archivo (generado con `python -m app.cli static-comprimir`) con el
+    Content-Type del original. Nunca comprime al vuelo; un hermano más viejo
+    que el original se ignora.
+    """
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        respuesta = await super().get_response(path, scope)
+        if respuesta.status_code != 200 or not isinstance(respuesta, FileResponse):
+            return respuesta
+
+        aceptadas = codificaciones_aceptadas(Headers(scope=scope).get("accept-encoding", ""))
+        for codificacion, extension in VARIANTES_PRECOMPRIMIDAS:
+            if codificacion not in aceptadas:
+                continue
+            ruta, stat = await anyio.to_thread.run_sync(self.lookup_path, path + extension)
+            if stat is None or stat.st_mtime < respuesta.stat_result.st_mtime:
+                continue
+            # Con su propio ETag: puede terminar en 304 si el cliente ya la tiene
+            variante = self.file_response(ruta, stat, scope)
+            if variante.status_code == 200:
+                variante.headers["content-type"] = respuesta.headers["content-type"]
+                variante.headers["content-encoding"] = codificacion
+            variante.headers.add_vary_header("Accept-Encoding")
+            return variante
+
+        respuesta.headers.add_vary_header("Accept-Encoding")
+        return respuesta
+
+
+def precomprimir_directorio(directorio: str, extensiones: Iterable[str] = EXTENSIONES_COMPRIMIBLES) -> dict:
+    """
+    Escribir archivo.gz (y archivo.br si brotli está instalado) junto a cada
+    archivo comprimible de `directorio`, solo si resulta más chico.
+    Devuelve {"archivos", "bytes_originales", "bytes_gzip", "bytes_brotli"}.
+    """
+    resumen = {"archivos": 0, "bytes_originales": 0, "bytes_gzip": 0, "bytes_brotli": 0}
+    for raiz, _, archivos in os.walk(directorio):
+        for archivo in sorted(archivos):
+            if not archivo.endswith(tuple(extensiones)):
+                continue
+            ruta = os.path.join(raiz, archivo)
+            with open(ruta, "rb") as f:
+                contenido = f.read()
+
+            variantes = [(".gz", gzip.compress(contenido, compresslevel=9, mtime=0), "bytes_gzip")]
+            if brotli is not None:
+                variantes.append((".br", brotli.compress(contenido, quality=11), "bytes_brotli"))
+
+            resumen["archivos"] += 1
+            resumen["bytes_originales"] += len(contenido)
+            for extension, comprimido, clave in variantes:
+                destino = ruta + extension
+                if len(comprimido) >= len(contenido):
+                    if os.path.exists(destino):
+                        os.remove(destino)
+                    continue
+                with open(destino, "wb") as f:
+                    f.write(comprimido)
+                resumen[clave] += len(comprimido)
+    return resumen
@@ -0,0 +1,231 @@
+"""
+Trabajo bloqueante fuera del event loop y detección de bloqueos del loop
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from functools import partial
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+import anyio
+import anyio.to_thread
+
+from app.core.vuelo_unico import VUELO_UNICO, LlamadaCoalescida, vuelo_unico
+
+
+# Hilos simultáneos por clase de ruta. Cada clase tiene su propio límite para
+# que, por ejemplo, muchas búsquedas no dejen sin hilos al checkout.
+LIMITES_THREADPOOL = {
+    "lectura": int(os.getenv("THREADPOOL_LECTURA", "20")),
+    "busqueda": int(os.getenv("THREADPOOL_BUSQUEDA", "8")),
+    "escritura": int(os.getenv("THREADPOOL_ESCRITURA", "10")),
+}
+
+# Un bloqueo del loop más largo que esto (ms) se registra
+BLOQUEO_UMBRAL_MS = float(os.getenv("BLOQUEO_UMBRAL_MS", "100"))
+# "0" desactiva el detector
+DETECTOR_BLOQUEOS = os.getenv("DETECTOR_BLOQUEOS", "1") != "0"
+
+# Raíz del proyecto: las ubicaciones de los bloqueos se buscan en su código
+RAIZ_PROYECTO = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+T = TypeVar("T")
+
+_limitadores: Dict[str, anyio.CapacityLimiter] = {}
+
+
+def limitador(clase: str) -> anyio.CapacityLimiter:
+    """
+    CapacityLimiter de una clase de ruta (se crea en el primer uso, dentro
+    del event loop)
+    """
+    if clase not in LIMITES_THREADPOOL:
+        raise ValueError(f"Clase de threadpool desconocida: {clase}")
+    if clase not in _limitadores:
+        _limitadores[clase] = anyio.CapacityLimiter(LIMITES_THREADPOOL[clase])
+    return _limitadores[clase]
+
+
+async def en_threadpool(clase: str, funcion: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Ejecutar una función bloqueante (CRUD, SQLModel) en un hilo, con a lo
+    sumo LIMITES_THREADPOOL[clase] ejecuciones simultáneas. Los métodos
+    @coalescido se coalescen antes de pedir un hilo: las llamadas que
+    esperan una consulta en curso no ocupan el threadpool.
+    """
+    if VUELO_UNICO and isinstance(funcion, LlamadaCoalescida):
+        return await vuelo_unico.compartir_async(
+            funcion.clave(*args, **kwargs),
+            partial(anyio.to_thread.run_sync, partial(funcion.directo, *args, **kwargs), limiter=limitador(clase))
+        )
+    return await anyio.to_thread.run_sync(partial(funcion, *args, **kwargs), limiter=limitador(clase))
+
+
+class EjecutorThreadpool:
+    """
+    Dependencia para rutas async: `await bloqueante(crud.metodo, db, ...)`
+    corre la llamada en el threadpool de su clase
+    """
+
+    def __init__(self, clase: str):
+        if clase not in LIMITES_THREADPOOL:
+            raise ValueError(f"Clase de threadpool desconocida: {clase}")
+        self.clase = clase
+
+    def __call__(self) -> Callable[..., Any]:
+        return partial(en_threadpool, self.clase)
+
+
+def metricas_threadpool() -> Dict[str, Any]:
+    """
+    Uso actual de cada clase: límite, hilos ocupados y tareas en espera
+    """
+    resultado = {}
+    for clase, limite in LIMITES_THREADPOOL.items():
+        lim = _limitadores.get(clase)
+        if lim is None:
+            resultado[clase] = {"limite": limite, "ocupados": 0, "en_espera": 0}
+            continue
+        estadisticas = lim.statistics()
+        resultado[clase] = {
+            "limite": limite,
+            "ocupados": estadisticas.borrowed_tokens,
+            "en_espera": estadisticas.tasks_waiting,
+        }
+    return resultado
+
+
+class DetectorBloqueos:
+    """
+    Mide cuánto se atrasa el event loop y atribuye cada bloqueo a la ruta
+    que lo causó.
+
+    Una tarea del loop despierta cada `intervalo` segundos y mide su atraso.
+    Un hilo vigía revisa ese latido; si se atrasa más del umbral, toma la
+    pila del hilo del loop (sys._current_frames) y busca en ella el código
+    de algún endpoint registrado. Así se sabe qué ruta estaba ejecutando
+    código bloqueante y en qué línea, sin instrumentar cada endpoint.
+    """
+
+    def __init__(self, umbral_ms: float = BLOQUEO_UMBRAL_MS):
+        self.umbral = umbral_ms / 1000
+        self.intervalo = self.umbral / 2
+        self._lock = threading.Lock()
+        self._rutas: Dict[Any, str] = {}
+        self._latido = time.monotonic()
+        self._hilo_loop: Optional[int] = None
+        self._muestra: Optional[tuple] = None
+        self._tarea: Optional[asyncio.Task] = None
+        self._vigia: Optional[threading.Thread] = None
+        self._detener = threading.Event()
+        self._reiniciar_metricas()
+
+    def _reiniciar_metricas(self) -> None:
+        self._bloqueos = 0
+        self._max_ms = 0.0
+        self._por_ruta: Dict[str, Dict[str, Any]] = {}
+
+    def registrar_rutas(self, app: Any) -> None:
+        """
+        Mapear el código de cada endpoint de `app` a "MÉTODO /ruta"
+        """
+        for ruta in app.routes:
+            endpoint = getattr(ruta, "endpoint", None)
+            codigo = getattr(endpoint, "__code__", None)
+            if codigo is None:
+                continue
+            metodos = ",".join(sorted(getattr(ruta, "methods", None) or []))
+            self._rutas[codigo] = f"{metodos} {ruta.path}".strip()
+
+    def _ruta_en_pila(self) -> Optional[tuple]:
+        """
+        (ruta, archivo:línea más interna del proyecto) según la pila actual
+        del hilo del loop
+        """
+        frame = sys._current_frames().get(self._hilo_loop)
+        ubicacion = None
+        while frame is not None:
+            codigo = frame.f_code
+            archivo = codigo.co_filename
+            if ubicacion is None and archivo.startswith(RAIZ_PROYECTO) and "site-packages" not in archivo:
+                ubicacion = f"{os.path.relpath(archivo, RAIZ_PROYECTO)}:{frame.f_lineno}"
+            if codigo in self._rutas:
+                return self._rutas[codigo], ubicacion
+            frame = frame.f_back
+        return None
+
+    def _registrar(self, atraso: float) -> None:
+        ruta, ubicacion = self._muestra or ("desconocida", None)
+        self._muestra = None
+        ms = atraso * 1000
+        with self._lock:
+            self._bloqueos += 1
+            self._max_ms = max(self._max_ms, ms)
+            datos = self._por_ruta.setdefault(ruta, {"bloqueos": 0, "total_ms": 0.0, "max_ms": 0.0})
+            datos["bloqueos"] += 1
+            datos["total_ms"] += ms
+            datos["max_ms"] = max(datos["max_ms"], ms)
+            if ubicacion:
+                datos["ultima_ubicacion"] = ubicacion
+        print(f"⚠️ Event loop bloqueado {ms:.0f} ms en {ruta}" + (f" ({ubicacion})" if ubicacion else ""))
+
+    async def _medir(self) -> None:
+        self._hilo_loop = threading.get_ident()
+        while True:
+            inicio = time.monotonic()
+            self._latido = inicio
+            await asyncio.sleep(self.intervalo)
+            atraso = time.monotonic() - inicio - self.intervalo
+            self._latido = time.monotonic()
+            if atraso >= self.umbral:
+                self._registrar(atraso)
+            else:
+                self._muestra = None
+
+    def _vigilar(self) -> None:
+        while not self._detener.wait(self.intervalo):
+            if self._muestra is None and time.monotonic() - self._latido > self.intervalo + self.umbral:
+                self._muestra = self._ruta_en_pila()
+
+    def iniciar(self, app: Any) -> None:
+        """
+        Arrancar la medición (llamar desde el lifespan, dentro del loop)
+        """
+        self.registrar_rutas(app)
+        self._detener.clear()
+        self._tarea = asyncio.get_running_loop().create_task(self._medir())
+        self._vigia = threading.Thread(target=self._vigilar, name="detector-bloqueos", daemon=True)
+        self._vigia.start()
+
+    def detener(self) -> None:
+        self._detener.set()
+        if self._tarea is not None:
+            self._tarea.cancel()
+            self._tarea = None
+
+    def metricas(self) -> Dict[str, Any]:
+        """
+        Bloqueos registrados (totales y por ruta, la que más tiempo bloqueó primero)
+        """
+        with self._lock:
+            rutas = sorted(self._por_ruta.items(), key=lambda item: item[1]["total_ms"], reverse=True)
+            return {
+                "activo": self._tarea is not None,
+                "umbral_ms": self.umbral * 1000,
+                "bloqueos": self._bloqueos,
+                "max_ms": round(self._max_ms, 1),
+                "rutas": {
+                    ruta: {**datos, "total_ms": round(datos["total_ms"], 1), "max_ms": round(datos["max_ms"], 1)}
+                    for ruta, datos in rutas
+                },
+            }
+
+    def reiniciar(self) -> None:
+        with self._lock:
+            self._reiniciar_metricas()
+
+
+detector_bloqueos = DetectorBloqueos()
@@ -0,0 +1,318 @@
+"""
+Micro-caché en memoria de respuestas GET (fragmentos del catálogo) con stale-while-revalidate
+"""
+
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.cache_http import version_catalogo
+from app.core.concurrencia import en_threadpool
+
+
+# Segundos que una respuesta se sirve como fresca
+MICROCACHE_TTL = float(os.getenv("MICROCACHE_TTL", "5"))
+# Segundos adicionales que se sirve vencida mientras se recalcula en segundo plano
+MICROCACHE_STALE = float(os.getenv("MICROCACHE_STALE", "30"))
+# Límites de memoria: cantidad de entradas y bytes de cuerpo en total
+MICROCACHE_MAX_ENTRADAS = int(os.getenv("MICROCACHE_MAX_ENTRADAS", "500"))
+MICROCACHE_MAX_BYTES = int(os.getenv("MICROCACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+# Respuestas más grandes que esto no se guardan
+MICROCACHE_MAX_ENTRADA = int(os.getenv("MICROCACHE_MAX_ENTRADA", str(1024 * 1024)))
+# "0" desactiva la caché
+MICROCACHE = os.getenv("MICROCACHE", "1") != "0"
+
+# Cabeceras de la petición que cambian la respuesta y por eso forman parte de la clave
+CABECERAS_CLAVE = ("hx-request",)
+# Cabeceras condicionales: la recarga en segundo plano pide siempre la respuesta completa
+_CABECERAS_CONDICIONALES = (b"if-none-match", b"if-modified-since")
+# Cabeceras de la respuesta que se repiten en un 304 servido desde la caché
+_CABECERAS_304 = (b"etag", b"last-modified", b"cache-control", b"vary")
+
+
+class EntradaCache:
+    __slots__ = ("estado", "cabeceras", "cuerpo", "version", "creada", "etag")
+
+    def __init__(self, estado: int, cabeceras: List[Tuple[bytes, bytes]], cuerpo: bytes, version: Optional[int]):
+        self.estado = estado
+        self.cabeceras = cabeceras
+        self.cuerpo = cuerpo
+        self.version = version
+        self.creada = time.monotonic()
+        self.etag = next((valor.decode("latin-1") for nombre, valor in cabeceras if nombre == b"etag"), None)
+
+
+class MicroCache:
+    """
+    LRU acotado por cantidad de entradas y por bytes, con TTL y ventana
+    stale. Cada entrada guarda la versión del catálogo con la que se generó:
+    si la versión actual es otra, la entrada ya no se sirve.
+    """
+
+    def __init__(
+        self,
+        ttl: float = MICROCACHE_TTL,
+        stale: float = MICROCACHE_STALE,
+        max_entradas: int = MICROCACHE_MAX_ENTRADAS,
+        max_bytes: int = MICROCACHE_MAX_BYTES
+    ):
+        self.ttl = ttl
+        self.stale = stale
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entradas: "OrderedDict[tuple, EntradaCache]" = OrderedDict()
+        self._bytes = 0
+        self._reiniciar_metricas()
+
+    def _reiniciar_metricas(self) -> None:
+        self._aciertos = 0
+        self._vencidos = 0
+        self._fallos = 0
+        self._invalidadas = 0
+        self._recargas = 0
+        self._desalojos = 0
+
+    def obtener(self, clave: tuple, version: Optional[int]) -> Tuple[Optional[EntradaCache], str]:
+        """
+        (entrada, "HIT" | "STALE") o (None, "MISS")
+        """
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and version is not None and entrada.version != version:
+                self._quitar(clave)
+                self._invalidadas += 1
+                entrada = None
+            if entrada is None:
+                self._fallos += 1
+                return None, "MISS"
+
+            edad = time.monotonic() - entrada.creada
+            if edad > self.ttl + self.stale:
+                self._quitar(clave)
+                self._fallos += 1
+                return None, "MISS"
+
+            self._entradas.move_to_end(clave)
+            if edad > self.ttl:
+                self._vencidos += 1
+                return entrada, "STALE"
+            self._aciertos += 1
+            return entrada, "HIT"
+
+    def guardar(self, clave: tuple, entrada: EntradaCache) -> None:
+        with self._lock:
+            if clave in self._entradas:
+                self._quitar(clave)
+            self._entradas[clave] = entrada
+            self._bytes += len(entrada.cuerpo)
+            while self._entradas and (len(self._entradas) > self.max_entradas or self._bytes > self.max_bytes):
+                self._quitar(next(iter(self._entradas)))
+                self._desalojos += 1
+
+    def _quitar(self, clave: tuple) -> None:
+        entrada = self._entradas.pop(clave)
+        self._bytes -= len(entrada.cuerpo)
+
+    def registrar_recarga(self) -> None:
+        with self._lock:
+            self._recargas += 1
+
+    def vaciar(self) -> None:
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+
+    def metricas(self) -> Dict[str, Any]:
+        """
+        Aciertos, vencidos servidos, fallos y la proporción de peticiones
+        respondidas desde la caché
+        """
+        with self._lock:
+            total = self._aciertos + self._vencidos + self._fallos
+            return {
+                "activa": MICROCACHE,
+                "ttl": self.ttl,
+                "stale": self.stale,
+                "entradas": len(self._entradas),
+                "bytes": self._bytes,
+                "aciertos": self._aciertos,
+                "vencidos": self._vencidos,
+                "fallos": self._fallos,
+                "invalidadas": self._invalidadas,
+                "recargas": self._recargas,
+                "desalojos": self._desalojos,
+                "proporcion_aciertos": round((self._aciertos + self._vencidos) / total, 4) if total else 0.0,
+            }
+
+    def reiniciar(self) -> None:
+        with self._lock:
+            self._reiniciar_metricas()
+
+
+micro_cache = MicroCache()
+
+
+class MicroCacheMiddleware:
+    """
+    Sirve desde `micro_cache` los GET anónimos cuyas rutas coinciden con
+    alguna expresión de `rutas`. Una entrada vencida (dentro de la ventana
+    stale) se responde igual y dispara una sola recarga en segundo plano
+    por clave. Solo se guardan respuestas 200 sin Set-Cookie ni
+    Cache-Control private/no-store.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        rutas: Iterable[str] = (),
+        cache: MicroCache = micro_cache,
+        cabeceras_clave: Tuple[str, ...] = CABECERAS_CLAVE
+    ) -> None:
+        self.app = app
+        self.rutas = [re.compile(ruta) for ruta in rutas]
+        self.cache = cache
+        self.cabeceras_clave = cabeceras_clave
+        self._recargando: set = set()
+        self._tareas: set = set()
+
+    def _clave(self, scope: Scope, headers: Headers) -> tuple:
+        return (
+            scope["path"],
+            scope.get("query_string", b""),
+            tuple(headers.get(nombre, "") for nombre in self.cabeceras_clave),
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            not MICROCACHE
+            or scope["type"] != "http"
+            or scope["method"] != "GET"
+            or not any(ruta.fullmatch(scope["path"]) for ruta in self.rutas)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        # Con credenciales la respuesta puede ser personal: no se cachea
+        if "authorization" in headers:
+            await self.app(scope, receive, send)
+            return
+
+        clave = self._clave(scope, headers)
+        version = await self._version()
+        entrada, resultado = self.cache.obtener(clave, version)
+        if entrada is None:
+            await self._generar(scope, receive, send, clave, version)
+            return
+
+        if resultado == "STALE" and clave not in self._recargando:
+            self._recargando.add(clave)
+            tarea = asyncio.get_running_loop().create_task(self._recargar(scope, clave))
+            self._tareas.add(tarea)
+            tarea.add_done_callback(self._tareas.discard)
+
+        await self._responder(send, entrada, resultado, headers)
+
+    async def _version(self) -> Optional[int]:
+        valor = await en_threadpool("lectura", version_catalogo.obtener)
+        return valor[0] if valor else None
+
+    async def _generar(self, scope: Scope, receive: Receive, send: Send, clave: tuple, version: Optional[int]) -> None:
+        """
+        Ejecutar la ruta, reenviar la respuesta al cliente y guardarla si se puede
+        """
+        inicio: Optional[Message] = None
+        partes: List[bytes] = []
+        tamano = 0
+
+        async def enviar(message: Message) -> None:
+            nonlocal inicio, tamano
+            if message["type"] == "http.response.start":
+                inicio = message
+                message = {**message, "headers": [*message.get("headers", []), (b"x-cache", b"MISS")]}
+            elif message["type"] == "http.response.body" and tamano <= MICROCACHE_MAX_ENTRADA:
+                cuerpo = message.get("body", b"")
+                partes.append(cuerpo)
+                tamano += len(cuerpo)
+            await send(message)
+
+        await self.app(scope, receive, enviar)
+        self._guardar(clave, version, inicio, partes, tamano)
+
+    def _guardar(
+        self, clave: tuple, version: Optional[int], inicio: Optional[Message], partes: List[bytes], tamano: int
+    ) -> None:
+        if inicio is None or inicio["status"] != 200 or tamano > MICROCACHE_MAX_ENTRADA:
+            return
+        cabeceras = list(inicio.get("headers", []))
+        for nombre, valor in cabeceras:
+            if nombre == b"set-cookie":
+                return
+            if nombre == b"cache-control" and (b"private" in valor or b"no-store" in valor):
+                return
+        self.cache.guardar(clave, EntradaCache(200, cabeceras, b"".join(partes), version))
+
+    async def _recargar(self, scope: Scope, clave: tuple) -> None:
+        """
+        Volver a generar una entrada vencida sin cliente esperando la respuesta
+        """
+        alcance = {
+            **scope,
+            "headers": [(n, v) for n, v in scope["headers"] if n not in _CABECERAS_CONDICIONALES],
+        }
+        pedido_enviado = False
+        inicio: Optional[Message] = None
+        partes: List[bytes] = []
+
+        async def recibir() -> Message:
+            nonlocal pedido_enviado
+            if not pedido_enviado:
+                pedido_enviado = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await anyio.sleep_forever()
+
+        async def enviar(message: Message) -> None:
+            nonlocal inicio
+            if message["type"] == "http.response.start":
+                inicio = message
+            elif message["type"] == "http.response.body":
+                partes.append(message.get("body", b""))
+
+        try:
+            version = await self._version()
+            await self.app(alcance, recibir, enviar)
+            self._guardar(clave, version, inicio, partes, sum(len(parte) for parte in partes))
+            self.cache.registrar_recarga()
+        except Exception as e:
+            print(f"Error recargando {scope['path']} en la micro-caché: {e}")
+        finally:
+            self._recargando.discard(clave)
+
+    async def _responder(self, send: Send, entrada: EntradaCache, resultado: str, headers: Headers) -> None:
+        edad = str(int(time.monotonic() - entrada.creada)).encode()
+        si_no_coincide = headers.get("if-none-match")
+        if entrada.etag and si_no_coincide and entrada.etag in {e.strip() for e in si_no_coincide.split(",")}:
+            cabeceras = [(n, v) for n, v in entrada.cabeceras if n in _CABECERAS_304]
+            await send({
+                "type": "http.response.start",
+                "status": 304,
+                "headers": [*cabeceras, (b"age", edad), (b"x-cache", resultado.encode())],
+            })
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        await send({
+            "type": "http.response.start",
+            "status": entrada.estado,
+            "headers": [*entrada.cabeceras, (b"age", edad), (b"x-cache", resultado.encode())],
+        })
+        await send({"type": "http.response.body", "body": entrada.cuerpo})
@@ -0,0 +1,84 @@
+"""
+Paginación keyset (cursor opaco) para listados renderizados en streaming
+"""
+
+import base64
+import json
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+
+def codificar_cursor(clave: Tuple[Any, ...]) -> str:
+    """
+    Cursor opaco y apto para URL a partir de la clave de orden de la última fila
+    """
+    crudo = json.dumps(list(clave), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(crudo).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(cursor: str, tipos: Tuple[type, ...]) -> Optional[Tuple[Any, ...]]:
+    """
+    Clave del cursor con los tipos esperados, o None si no es válido
+    """
+    try:
+        crudo = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        valores = json.loads(crudo)
+        if not isinstance(valores, list) or len(valores) != len(tipos):
+            return None
+        if not all(isinstance(valor, tipo) for valor, tipo in zip(valores, tipos)):
+            return None
+        return tuple(valores)
+    except (ValueError, TypeError):
+        return None
+
+
+class PaginaKeyset:
+    """
+    Una página de un listado, consumida de forma perezosa mientras la
+    plantilla se renderiza. `filas` debe traer hasta `limite` + 1 filas:
+    la sobrante solo indica que hay más. Después de iterar, `siguiente` es
+    el cursor de la próxima página (o None). `bool(pagina)` lee la primera
+    fila para saber si la página está vacía sin consumir el resto.
+    """
+
+    def __init__(
+        self,
+        filas: Iterator[Dict[str, Any]],
+        limite: int,
+        clave: Callable[[Dict[str, Any]], Tuple[Any, ...]] = lambda fila: (fila["nombre"], fila["id"])
+    ):
+        self._filas = filas
+        self.limite = limite
+        self.clave = clave
+        self._primera: Optional[Dict[str, Any]] = None
+        self._leida = False
+        self.entregadas = 0
+        self.siguiente: Optional[str] = None
+
+    def _leer_primera(self) -> None:
+        if not self._leida:
+            self._primera = next(self._filas, None)
+            self._leida = True
+
+    def __bool__(self) -> bool:
+        self._leer_primera()
+        return self._primera is not None
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        self._leer_primera()
+        fila, anterior = self._primera, None
+        while fila is not None:
+            if self.entregadas == self.limite:
+                self.siguiente = codificar_cursor(self.clave(anterior))
+                break
+            yield fila
+            self.entregadas += 1
+            fila, anterior = next(self._filas, None), fila
+        self.close()
+
+    def close(self) -> None:
+        """
+        Cerrar el iterador de filas (y con él la conexión del cursor)
+        """
+        cerrar = getattr(self._filas, "close", None)
+        if cerrar is not None:
+            cerrar()
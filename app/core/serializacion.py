@@ -0,0 +1,68 @@
+"""
+Serialización rápida (msgspec) de respuestas de la API JSON, con negociación JSON / MessagePack
+"""
+
+from typing import Any
+
+import msgspec
+from fastapi import Request
+from fastapi.responses import Response
+
+
+MEDIA_TYPE_MSGPACK = "application/msgpack"
+# Variantes con las que los clientes suelen pedir MessagePack
+_MEDIA_TYPES_MSGPACK = (MEDIA_TYPE_MSGPACK, "application/x-msgpack", "application/vnd.msgpack")
+
+_codificador_json = msgspec.json.Encoder()
+_codificador_msgpack = msgspec.msgpack.Encoder()
+
+
+class MsgspecJSONResponse(Response):
+    """
+    JSONResponse codificada con msgspec. Para filas que ya vienen de la
+    base con los tipos correctos: no pasa por la validación de Pydantic
+    ni por jsonable_encoder.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return _codificador_json.encode(content)
+
+
+class MessagePackResponse(Response):
+    media_type = MEDIA_TYPE_MSGPACK
+
+    def render(self, content: Any) -> bytes:
+        return _codificador_msgpack.encode(content)
+
+
+def acepta_msgpack(accept: str) -> bool:
+    """
+    True si el Accept pide MessagePack (con q > 0) con más prioridad que JSON
+    """
+    preferencias = {}
+    for parte in accept.split(","):
+        tipo, _, parametros = parte.strip().partition(";")
+        calidad = 1.0
+        for parametro in parametros.split(";"):
+            nombre, _, valor = parametro.strip().partition("=")
+            if nombre == "q":
+                try:
+                    calidad = float(valor)
+                except ValueError:
+                    calidad = 0.0
+        preferencias[tipo.strip().lower()] = calidad
+
+    msgpack = max((preferencias.get(tipo, 0.0) for tipo in _MEDIA_TYPES_MSGPACK), default=0.0)
+    json = max(preferencias.get("application/json", 0.0), preferencias.get("*/*", 0.0))
+    return msgpack > 0 and msgpack >= json
+
+
+def respuesta_negociada(request: Request, contenido: Any, status_code: int = 200) -> Response:
+    """
+    MessagePack si el cliente lo pide en Accept, JSON (msgspec) si no.
+    `contenido` puede ser un msgspec.Struct, dicts, listas o escalares.
+    """
+    clase = MessagePackResponse if acepta_msgpack(request.headers.get("accept", "")) else MsgspecJSONResponse
+    return clase(contenido, status_code=status_code, headers={"Vary": "Accept"})
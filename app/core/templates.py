@@ -0,0 +1,159 @@
+"""
+Entorno Jinja2 compartido (caché de bytecode, precompilación y métricas de render)
+"""
+
+import os
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional
+
+from fastapi.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, Template
+
+from app.core.assets import manifiesto_assets
+from app.core.concurrencia import en_threadpool
+
+
+TEMPLATES_DIR = os.getenv("TEMPLATES_DIR", "app/templates")
+# Bytecode compilado de las plantillas; sobrevive a reinicios del proceso
+TEMPLATES_CACHE_DIR = os.getenv("TEMPLATES_CACHE_DIR", ".cache/jinja")
+# "1" en desarrollo: revisa en cada render si la plantilla cambió en disco
+TEMPLATES_AUTO_RELOAD = os.getenv("TEMPLATES_AUTO_RELOAD", "0") == "1"
+# Caracteres que se juntan antes de enviar cada bloque de un render en streaming
+TEMPLATES_STREAM_BLOQUE = int(os.getenv("TEMPLATES_STREAM_BLOQUE", "8192"))
+
+
+class MetricasRender:
+    """
+    Tiempo de render acumulado por plantilla
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._por_plantilla: Dict[str, Dict[str, float]] = {}
+
+    def registrar(self, nombre: str, segundos: float) -> None:
+        ms = segundos * 1000
+        with self._lock:
+            datos = self._por_plantilla.setdefault(nombre, {"renders": 0, "total_ms": 0.0, "max_ms": 0.0})
+            datos["renders"] += 1
+            datos["total_ms"] += ms
+            datos["max_ms"] = max(datos["max_ms"], ms)
+
+    def resumen(self) -> Dict[str, Any]:
+        """
+        Renders, tiempo total, promedio y máximo de cada plantilla
+        (la que más tiempo acumula primero)
+        """
+        with self._lock:
+            filas = sorted(self._por_plantilla.items(), key=lambda item: item[1]["total_ms"], reverse=True)
+            return {
+                nombre: {
+                    "renders": int(datos["renders"]),
+                    "total_ms": round(datos["total_ms"], 2),
+                    "promedio_ms": round(datos["total_ms"] / datos["renders"], 3),
+                    "max_ms": round(datos["max_ms"], 2),
+                }
+                for nombre, datos in filas
+            }
+
+    def reiniciar(self) -> None:
+        with self._lock:
+            self._por_plantilla.clear()
+
+
+metricas_render = MetricasRender()
+
+
+class PlantillaMedida(Template):
+    """
+    Template que registra en metricas_render cuánto tarda cada render
+    """
+
+    def render(self, *args: Any, **kwargs: Any) -> str:
+        inicio = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            metricas_render.registrar(self.name or "<string>", time.perf_counter() - inicio)
+
+
+def crear_entorno(
+    directorio: str = TEMPLATES_DIR,
+    directorio_cache: str = TEMPLATES_CACHE_DIR,
+    auto_reload: bool = TEMPLATES_AUTO_RELOAD
+) -> Environment:
+    """
+    Environment con caché de bytecode en disco; sin auto_reload las
+    plantillas ya cargadas no vuelven a consultar el disco. Expone
+    `asset_url` para referenciar estáticos con hash.
+    """
+    os.makedirs(directorio_cache, exist_ok=True)
+    entorno = Environment(
+        loader=FileSystemLoader(directorio),
+        bytecode_cache=FileSystemBytecodeCache(directorio_cache),
+        auto_reload=auto_reload,
+        autoescape=True,
+        cache_size=-1,
+    )
+    entorno.template_class = PlantillaMedida
+    # {{ asset_url('style.css') }} -> /static/style.<hash>.css
+    entorno.globals["asset_url"] = manifiesto_assets.url
+    return entorno
+
+
+def precompilar(entorno: Environment) -> int:
+    """
+    Compilar todas las plantillas y dejar su bytecode en la caché.
+    Devuelve cuántas se compilaron.
+    """
+    nombres = entorno.list_templates(extensions=["html"])
+    for nombre in nombres:
+        entorno.get_template(nombre)
+    return len(nombres)
+
+
+# Única instancia para toda la aplicación: cada plantilla se compila una vez
+templates = Jinja2Templates(env=crear_entorno())
+
+
+def _agrupar(partes: Iterator[str], tamano: int) -> Iterator[str]:
+    bloque, largo = [], 0
+    for parte in partes:
+        bloque.append(parte)
+        largo += len(parte)
+        if largo >= tamano:
+            yield "".join(bloque)
+            bloque, largo = [], 0
+    if bloque:
+        yield "".join(bloque)
+
+
+async def transmitir(
+    nombre: str,
+    contexto: Dict[str, Any],
+    al_cerrar: Optional[Callable[[], None]] = None,
+    tamano_bloque: int = TEMPLATES_STREAM_BLOQUE
+) -> AsyncIterator[str]:
+    """
+    Render incremental de una plantilla para StreamingResponse. Las partes
+    de generate() se agrupan en bloques de ~tamano_bloque caracteres y cada
+    bloque se produce en el threadpool de lectura, porque el contexto puede
+    traer filas perezosas de la base. `al_cerrar` libera esos recursos
+    aunque el cliente se desconecte a mitad de la respuesta.
+    """
+    bloques = _agrupar(templates.get_template(nombre).generate(contexto), tamano_bloque)
+    segundos = 0.0
+    try:
+        while True:
+            inicio = time.perf_counter()
+            bloque = await en_threadpool("lectura", next, bloques, None)
+            segundos += time.perf_counter() - inicio
+            if bloque is None:
+                break
+            yield bloque
+    finally:
+        bloques.close()
+        if al_cerrar is not None:
+            al_cerrar()
+        metricas_render.registrar(nombre, segundos)
@@ -0,0 +1,149 @@
+"""
+Single-flight: llamadas idénticas y simultáneas comparten una sola ejecución
+"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import Future
+from functools import partial, update_wrapper
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+# "0" desactiva la coalescencia (cada llamada ejecuta su propia consulta)
+VUELO_UNICO = os.getenv("VUELO_UNICO", "1") != "0"
+
+
+class VueloUnico:
+    """
+    Tabla de ejecuciones en curso por clave. La primera llamada con una
+    clave ejecuta la función; las que llegan mientras tanto esperan su
+    Future y reciben el mismo resultado (o la misma excepción). Sirve tanto
+    desde hilos del threadpool (`compartir`) como desde el event loop
+    (`compartir_async`), y ambos caminos comparten la misma tabla.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._vuelos: Dict[Hashable, Future] = {}
+        self._tareas: set = set()
+        self._ejecuciones = 0
+        self._compartidas = 0
+
+    def _unirse(self, clave: Hashable):
+        """
+        (future, True) si esta llamada debe ejecutar, (future, False) si espera
+        """
+        with self._lock:
+            vuelo = self._vuelos.get(clave)
+            if vuelo is not None:
+                self._compartidas += 1
+                return vuelo, False
+            vuelo = Future()
+            self._vuelos[clave] = vuelo
+            self._ejecuciones += 1
+            return vuelo, True
+
+    def _terminar(self, clave: Hashable, vuelo: Future, resultado: Any = None, error: BaseException = None) -> None:
+        with self._lock:
+            self._vuelos.pop(clave, None)
+        if error is not None:
+            vuelo.set_exception(error)
+        else:
+            vuelo.set_result(resultado)
+
+    def compartir(self, clave: Hashable, funcion: Callable[[], Any]) -> Any:
+        """
+        Ejecutar `funcion` en este hilo o esperar la ejecución en curso de `clave`
+        """
+        vuelo, lider = self._unirse(clave)
+        if not lider:
+            return vuelo.result()
+        try:
+            resultado = funcion()
+        except BaseException as e:
+            self._terminar(clave, vuelo, error=e)
+            raise
+        self._terminar(clave, vuelo, resultado)
+        return resultado
+
+    async def compartir_async(self, clave: Hashable, funcion: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Igual que compartir() pero sin ocupar un hilo mientras se espera.
+        La ejecución corre en su propia tarea: si el cliente que la inició se
+        desconecta, las demás llamadas igual reciben el resultado.
+        """
+        vuelo, lider = self._unirse(clave)
+        if lider:
+            async def ejecutar() -> None:
+                try:
+                    resultado = await funcion()
+                except BaseException as e:
+                    self._terminar(clave, vuelo, error=e)
+                    return
+                self._terminar(clave, vuelo, resultado)
+
+            tarea = asyncio.get_running_loop().create_task(ejecutar())
+            self._tareas.add(tarea)
+            tarea.add_done_callback(self._tareas.discard)
+        return await asyncio.shield(asyncio.wrap_future(vuelo))
+
+    def metricas(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "activo": VUELO_UNICO,
+                "en_curso": len(self._vuelos),
+                "ejecuciones": self._ejecuciones,
+                "compartidas": self._compartidas,
+            }
+
+    def reiniciar(self) -> None:
+        with self._lock:
+            self._ejecuciones = 0
+            self._compartidas = 0
+
+
+vuelo_unico = VueloUnico()
+
+
+class LlamadaCoalescida:
+    """
+    Método de un CRUD decorado con @coalescido, ligado a su instancia.
+    La clave ignora la sesión (primer argumento): dos peticiones con
+    sesiones distintas y los mismos parámetros comparten la consulta.
+    """
+
+    def __init__(self, funcion: Callable[..., Any], instancia: Any):
+        self.funcion = funcion
+        self.instancia = instancia
+        update_wrapper(self, funcion)
+
+    def clave(self, db: Any, *args: Any, **kwargs: Any) -> Hashable:
+        return (self.funcion.__qualname__, args, tuple(sorted(kwargs.items())))
+
+    def directo(self, db: Any, *args: Any, **kwargs: Any) -> Any:
+        """
+        Ejecutar sin coalescer
+        """
+        return self.funcion(self.instancia, db, *args, **kwargs)
+
+    def __call__(self, db: Any, *args: Any, **kwargs: Any) -> Any:
+        if not VUELO_UNICO:
+            return self.directo(db, *args, **kwargs)
+        return vuelo_unico.compartir(self.clave(db, *args, **kwargs), partial(self.directo, db, *args, **kwargs))
+
+
+class coalescido:
+    """
+    Decorador para lecturas caras de un CRUD: las llamadas simultáneas con
+    los mismos parámetros ejecutan la consulta una sola vez. El resultado
+    se comparte entre todas, así que quien lo recibe no debe modificarlo.
+    """
+
+    def __init__(self, funcion: Callable[..., Any]):
+        self.funcion = funcion
+        update_wrapper(self, funcion)
+
+    def __get__(self, instancia: Any, propietario: Any = None) -> Any:
+        if instancia is None:
+            return self
+        return LlamadaCoalescida(self.funcion, instancia)
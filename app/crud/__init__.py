@@ -7,11 +7,33 @@ from .categoria import categoria
 from .producto import producto  
 from .venta import venta
 from .usuario import usuario
+from .importacion import importacion
+from .reporte import reporte
+from .ranking import ranking
+from .exportacion import exportacion
+from .analitica import analitica
+from .particion import particion
+from .caja import caja
+from .carrito import carrito
+from .idempotencia import idempotencia
+from .cola_pedidos import cola_pedidos
+from .precios import precios
 
 __all__ = [
     "CRUDBase",
     "categoria",
     "producto", 
     "venta",
-    "usuario"
+    "usuario",
+    "importacion",
+    "reporte",
+    "ranking",
+    "exportacion",
+    "analitica",
+    "particion",
+    "caja",
+    "carrito",
+    "idempotencia",
+    "cola_pedidos",
+    "precios"
 ]
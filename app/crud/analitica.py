@@ -0,0 +1,369 @@
+"""
+Analítica vectorizada de ventas y márgenes (NumPy)
+"""
+
+import time as _time
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict
+
+import numpy as np
+from sqlmodel import Session, text
+
+
+# Cortes acumulados de ingresos para la clasificación ABC
+CORTE_A = 0.80
+CORTE_B = 0.95
+
+CONSULTA_COLUMNAS = """
+    WITH lineas AS (
+        SELECT d.venta_id,
+               d.producto_id,
+               (d.cantidad - d.cantidad_devuelta)::float8 AS cantidad,
+               importe_neto_detalle(d.subtotal, d.cantidad, d.cantidad_devuelta)::float8 AS importe
+        FROM venta v
+        INNER JOIN detalle_venta d ON d.venta_id = v.id AND d.fecha_venta = v.fecha_venta
+        WHERE v.estado = 'completada'
+          AND v.fecha_venta >= :desde AND v.fecha_venta < :hasta
+          AND d.fecha_venta >= :desde AND d.fecha_venta < :hasta
+    ),
+    catalogo AS (
+        SELECT p.id, p.nombre, p.precio_compra::float8 AS precio_compra,
+               COALESCE(p.categoria_id, 0) AS categoria_id,
+               COALESCE(c.nombre, 'Sin categoría') AS categoria
+        FROM producto p
+        LEFT JOIN categoria c ON c.id = p.categoria_id
+    )
+    SELECT
+        l.venta_id, l.producto_id, l.cantidad, l.importe,
+        c.id AS catalogo_id, c.nombre AS catalogo_nombre, c.precio_compra,
+        c.categoria_id, c.categoria
+    FROM (
+        SELECT COALESCE(array_agg(venta_id), '{}') AS venta_id,
+               COALESCE(array_agg(producto_id), '{}') AS producto_id,
+               COALESCE(array_agg(cantidad), '{}') AS cantidad,
+               COALESCE(array_agg(importe), '{}') AS importe
+        FROM lineas
+    ) l
+    CROSS JOIN (
+        -- Ordenado por id en cada columna: np.searchsorted necesita catalogo_id
+        -- ordenado y el ORDER BY de una subconsulta no garantiza el de array_agg
+        SELECT COALESCE(array_agg(id ORDER BY id), '{}') AS id,
+               COALESCE(array_agg(nombre ORDER BY id), '{}') AS nombre,
+               COALESCE(array_agg(precio_compra ORDER BY id), '{}') AS precio_compra,
+               COALESCE(array_agg(categoria_id ORDER BY id), '{}') AS categoria_id,
+               COALESCE(array_agg(categoria ORDER BY id), '{}') AS categoria
+        FROM catalogo
+    ) c
+"""
+
+
+def _redondear(valor: float) -> float:
+    return round(float(valor), 2)
+
+
+def _porcentaje(parte: float, total: float) -> float:
+    return round(float(parte) / float(total) * 100, 2) if total else 0.0
+
+
+def _clase_abc(participacion_previa: float) -> str:
+    if participacion_previa < CORTE_A:
+        return "A"
+    if participacion_previa < CORTE_B:
+        return "B"
+    return "C"
+
+
+class AnaliticaVentas:
+    """
+    Márgenes por producto y categoría, clasificación ABC y estadísticas de
+    canasta. Las líneas del rango y el catálogo se traen en una sola consulta
+    columnar (array_agg por columna) y se agregan con np.bincount.
+
+    analizar_python y analizar_sql calculan lo mismo sin NumPy para el
+    benchmark (python -m app.cli benchmark-analitica).
+
+    El costo usa el precio_compra actual del producto.
+    """
+
+    def cargar_columnas(self, db: Session, *, fecha_inicio: date, fecha_fin: date) -> Dict[str, Any]:
+        """
+        Una consulta, una fila: cada columna llega como array de PostgreSQL
+        """
+        row = db.execute(text(CONSULTA_COLUMNAS), {
+            "desde": datetime.combine(fecha_inicio, time.min),
+            "hasta": datetime.combine(fecha_fin + timedelta(days=1), time.min),
+        }).one()
+
+        return {
+            "venta_id": np.asarray(row.venta_id, dtype=np.int64),
+            "producto_id": np.asarray(row.producto_id, dtype=np.int64),
+            "cantidad": np.asarray(row.cantidad, dtype=np.float64),
+            "importe": np.asarray(row.importe, dtype=np.float64),
+            "catalogo_id": np.asarray(row.catalogo_id, dtype=np.int64),
+            "catalogo_nombre": row.catalogo_nombre,
+            "precio_compra": np.asarray(row.precio_compra, dtype=np.float64),
+            "categoria_id": np.asarray(row.categoria_id, dtype=np.int64),
+            "categoria": row.categoria,
+        }
+
+    def analizar_columnas(self, columnas: Dict[str, Any], *, top: int = 20) -> Dict[str, Any]:
+        """
+        Calcular el reporte a partir de las columnas de cargar_columnas
+        """
+        catalogo_id = columnas["catalogo_id"]
+        n_productos = len(catalogo_id)
+
+        # Group-by por producto: índice denso en el catálogo (ordenado por id)
+        idx_producto = np.searchsorted(catalogo_id, columnas["producto_id"])
+        cantidad = np.bincount(idx_producto, weights=columnas["cantidad"], minlength=n_productos)
+        ingresos = np.bincount(idx_producto, weights=columnas["importe"], minlength=n_productos)
+        costo = cantidad * columnas["precio_compra"]
+        margen = ingresos - costo
+
+        vendidos = np.flatnonzero(cantidad > 0)
+        total_ingresos = ingresos.sum()
+        total_costo = costo.sum()
+
+        # ABC sobre los productos vendidos, por ingresos descendentes
+        orden = vendidos[np.argsort(-ingresos[vendidos], kind="stable")]
+        participacion = ingresos[orden] / total_ingresos if total_ingresos else np.zeros(len(orden))
+        previa = np.cumsum(participacion) - participacion
+        clases = np.where(previa < CORTE_A, "A", np.where(previa < CORTE_B, "B", "C"))
+        clase_por_producto = dict(zip(orden.tolist(), clases.tolist()))
+
+        abc = {}
+        for clase in ("A", "B", "C"):
+            mascara = clases == clase
+            ingresos_clase = ingresos[orden[mascara]].sum()
+            abc[clase] = {
+                "productos": int(mascara.sum()),
+                "ingresos": _redondear(ingresos_clase),
+                "participacion": _porcentaje(ingresos_clase, total_ingresos),
+            }
+
+        mejores = vendidos[np.argsort(-margen[vendidos], kind="stable")][:top]
+        productos = [
+            {
+                "producto_id": int(catalogo_id[i]),
+                "nombre": columnas["catalogo_nombre"][i],
+                "cantidad": _redondear(cantidad[i]),
+                "ingresos": _redondear(ingresos[i]),
+                "costo": _redondear(costo[i]),
+                "margen": _redondear(margen[i]),
+                "margen_pct": _porcentaje(margen[i], ingresos[i]),
+                "clase_abc": clase_por_producto[int(i)],
+            }
+            for i in mejores
+        ]
+
+        # Group-by por categoría sobre los agregados por producto
+        ids_categoria, idx_categoria = np.unique(columnas["categoria_id"], return_inverse=True)
+        nombres_categoria = dict(zip(columnas["categoria_id"].tolist(), columnas["categoria"]))
+        ingresos_cat = np.bincount(idx_categoria, weights=ingresos, minlength=len(ids_categoria))
+        costo_cat = np.bincount(idx_categoria, weights=costo, minlength=len(ids_categoria))
+        cantidad_cat = np.bincount(idx_categoria, weights=cantidad, minlength=len(ids_categoria))
+        categorias = [
+            {
+                "categoria_id": int(ids_categoria[i]),
+                "nombre": nombres_categoria[int(ids_categoria[i])],
+                "cantidad": _redondear(cantidad_cat[i]),
+                "ingresos": _redondear(ingresos_cat[i]),
+                "costo": _redondear(costo_cat[i]),
+                "margen": _redondear(ingresos_cat[i] - costo_cat[i]),
+                "margen_pct": _porcentaje(ingresos_cat[i] - costo_cat[i], ingresos_cat[i]),
+            }
+            for i in np.argsort(-(ingresos_cat - costo_cat), kind="stable")
+            if cantidad_cat[i] > 0
+        ]
+
+        # Canasta: group-by por venta
+        _, idx_venta = np.unique(columnas["venta_id"], return_inverse=True)
+        valor_venta = np.bincount(idx_venta, weights=columnas["importe"])
+        unidades_venta = np.bincount(idx_venta, weights=columnas["cantidad"])
+        lineas_venta = np.bincount(idx_venta)
+        num_ventas = len(valor_venta)
+        tamanos = np.bincount(np.minimum(lineas_venta, 5), minlength=6)[1:] if num_ventas else np.zeros(5, dtype=np.int64)
+
+        canasta = {
+            "num_ventas": num_ventas,
+            "ticket_promedio": _redondear(valor_venta.mean()) if num_ventas else 0.0,
+            "ticket_mediana": _redondear(np.median(valor_venta)) if num_ventas else 0.0,
+            "ticket_p90": _redondear(np.percentile(valor_venta, 90)) if num_ventas else 0.0,
+            "unidades_promedio": _redondear(unidades_venta.mean()) if num_ventas else 0.0,
+            "lineas_promedio": _redondear(lineas_venta.mean()) if num_ventas else 0.0,
+            "ventas_por_lineas": {
+                ("5+" if n == 5 else str(n)): int(tamanos[n - 1]) for n in range(1, 6)
+            },
+        }
+
+        return {
+            "totales": {
+                "ingresos": _redondear(total_ingresos),
+                "costo": _redondear(total_costo),
+                "margen": _redondear(total_ingresos - total_costo),
+                "margen_pct": _porcentaje(total_ingresos - total_costo, total_ingresos),
+                "unidades": _redondear(cantidad.sum()),
+                "productos_vendidos": int(len(vendidos)),
+            },
+            "productos": productos,
+            "categorias": categorias,
+            "abc": abc,
+            "canasta": canasta,
+        }
+
+    def analizar(
+        self,
+        db: Session,
+        *,
+        fecha_inicio: date,
+        fecha_fin: date,
+        top: int = 20
+    ) -> Dict[str, Any]:
+        """
+        Reporte de márgenes, ABC y canasta de ventas completadas en un rango
+        de fechas (ambos extremos incluidos)
+        """
+        columnas = self.cargar_columnas(db, fecha_inicio=fecha_inicio, fecha_fin=fecha_fin)
+        reporte = self.analizar_columnas(columnas, top=top)
+        reporte["fecha_inicio"] = fecha_inicio
+        reporte["fecha_fin"] = fecha_fin
+        return reporte
+
+    def analizar_python(self, columnas: Dict[str, Any]) -> Dict[str, float]:
+        """
+        Mismos agregados recorriendo las filas en Python (referencia del benchmark)
+        """
+        precio = dict(zip(columnas["catalogo_id"].tolist(), columnas["precio_compra"].tolist()))
+        categoria = dict(zip(columnas["catalogo_id"].tolist(), columnas["categoria_id"].tolist()))
+
+        cantidad: Dict[int, float] = defaultdict(float)
+        ingresos: Dict[int, float] = defaultdict(float)
+        ventas: Dict[int, float] = defaultdict(float)
+        for venta_id, producto_id, cant, importe in zip(
+            columnas["venta_id"].tolist(), columnas["producto_id"].tolist(),
+            columnas["cantidad"].tolist(), columnas["importe"].tolist()
+        ):
+            cantidad[producto_id] += cant
+            ingresos[producto_id] += importe
+            ventas[venta_id] += importe
+
+        margen_categoria: Dict[int, float] = defaultdict(float)
+        total_ingresos = total_costo = 0.0
+        for producto_id, cant in cantidad.items():
+            costo = cant * precio[producto_id]
+            margen_categoria[categoria[producto_id]] += ingresos[producto_id] - costo
+            total_ingresos += ingresos[producto_id]
+            total_costo += costo
+
+        acumulado = 0.0
+        clases = {"A": 0, "B": 0, "C": 0}
+        for producto_id in sorted(ingresos, key=ingresos.get, reverse=True):
+            if cantidad[producto_id] <= 0:
+                continue
+            clases[_clase_abc(acumulado / total_ingresos if total_ingresos else 0.0)] += 1
+            acumulado += ingresos[producto_id]
+
+        return {
+            "ingresos": _redondear(total_ingresos),
+            "margen": _redondear(total_ingresos - total_costo),
+            "categorias": len(margen_categoria),
+            "num_ventas": len(ventas),
+            "productos_a": clases["A"],
+        }
+
+    def analizar_sql(self, db: Session, *, fecha_inicio: date, fecha_fin: date) -> Dict[str, float]:
+        """
+        Mismos agregados con GROUP BY en PostgreSQL (referencia del benchmark)
+        """
+        params = {
+            "desde": datetime.combine(fecha_inicio, time.min),
+            "hasta": datetime.combine(fecha_fin + timedelta(days=1), time.min),
+        }
+        row = db.execute(text("""
+            WITH lineas AS (
+                SELECT d.venta_id, d.producto_id,
+                       d.cantidad - d.cantidad_devuelta AS cantidad,
+                       importe_neto_detalle(d.subtotal, d.cantidad, d.cantidad_devuelta) AS importe
+                FROM venta v
+                INNER JOIN detalle_venta d ON d.venta_id = v.id AND d.fecha_venta = v.fecha_venta
+                WHERE v.estado = 'completada'
+                  AND v.fecha_venta >= :desde AND v.fecha_venta < :hasta
+                  AND d.fecha_venta >= :desde AND d.fecha_venta < :hasta
+            ),
+            por_producto AS (
+                SELECT l.producto_id, COALESCE(p.categoria_id, 0) AS categoria_id,
+                       SUM(l.cantidad) AS cantidad, SUM(l.importe) AS ingresos,
+                       SUM(l.cantidad) * p.precio_compra AS costo
+                FROM lineas l
+                INNER JOIN producto p ON p.id = l.producto_id
+                GROUP BY l.producto_id, p.categoria_id, p.precio_compra
+            ),
+            abc AS (
+                SELECT SUM(ingresos) OVER (ORDER BY ingresos DESC, producto_id) - ingresos AS previo,
+                       SUM(ingresos) OVER () AS total
+                FROM por_producto
+                WHERE cantidad > 0
+            )
+            SELECT
+                (SELECT SUM(ingresos) FROM por_producto) AS ingresos,
+                (SELECT SUM(ingresos - costo) FROM por_producto) AS margen,
+                (SELECT COUNT(DISTINCT categoria_id) FROM por_producto) AS categorias,
+                (SELECT COUNT(DISTINCT venta_id) FROM lineas) AS num_ventas,
+                (SELECT COUNT(*) FROM abc WHERE total > 0 AND previo / total < :corte_a) AS productos_a
+        """), {**params, "corte_a": CORTE_A}).one()
+
+        return {
+            "ingresos": _redondear(row.ingresos or 0),
+            "margen": _redondear(row.margen or 0),
+            "categorias": row.categorias,
+            "num_ventas": row.num_ventas,
+            "productos_a": row.productos_a,
+        }
+
+    def benchmark(
+        self,
+        db: Session,
+        *,
+        fecha_inicio: date,
+        fecha_fin: date,
+        repeticiones: int = 5
+    ) -> Dict[str, Any]:
+        """
+        Tiempos (mejor de N, en ms) de la carga columnar, del cálculo con
+        NumPy, del equivalente en Python puro y del equivalente en SQL
+        """
+        def mejor(funcion) -> float:
+            tiempos = []
+            for _ in range(repeticiones):
+                inicio = _time.perf_counter()
+                funcion()
+                tiempos.append(_time.perf_counter() - inicio)
+            return round(min(tiempos) * 1000, 2)
+
+        columnas = self.cargar_columnas(db, fecha_inicio=fecha_inicio, fecha_fin=fecha_fin)
+        resultado_numpy = self.analizar_columnas(columnas)
+        resultado_python = self.analizar_python(columnas)
+        resultado_sql = self.analizar_sql(db, fecha_inicio=fecha_inicio, fecha_fin=fecha_fin)
+
+        return {
+            "lineas": int(len(columnas["venta_id"])),
+            "productos_catalogo": int(len(columnas["catalogo_id"])),
+            "ms_carga_columnar": mejor(
+                lambda: self.cargar_columnas(db, fecha_inicio=fecha_inicio, fecha_fin=fecha_fin)
+            ),
+            "ms_numpy": mejor(lambda: self.analizar_columnas(columnas)),
+            "ms_python": mejor(lambda: self.analizar_python(columnas)),
+            "ms_sql": mejor(
+                lambda: self.analizar_sql(db, fecha_inicio=fecha_inicio, fecha_fin=fecha_fin)
+            ),
+            "coinciden": (
+                resultado_python["ingresos"] == resultado_sql["ingresos"] == resultado_numpy["totales"]["ingresos"]
+                and resultado_python["margen"] == resultado_sql["margen"] == resultado_numpy["totales"]["margen"]
+                and resultado_python["num_ventas"] == resultado_sql["num_ventas"] == resultado_numpy["canasta"]["num_ventas"]
+                and resultado_python["productos_a"] == resultado_sql["productos_a"] == resultado_numpy["abc"]["A"]["productos"]
+            ),
+        }
+
+
+analitica = AnaliticaVentas()
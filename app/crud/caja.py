@@ -0,0 +1,232 @@
+"""
+CRUD operations para Caja (control de efectivo)
+"""
+
+from decimal import Decimal
+from typing import Any, Dict, Optional
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, text
+
+from app.crud.base import CRUDBase
+from app.models import Caja, CajaCreate, CajaUpdate, GastoCreate
+
+
+COLUMNAS_CAJA = """
+    id, usuario_id, fecha_apertura, fecha_cierre, monto_inicial, monto_final,
+    total_ventas_efectivo, total_gastos, diferencia, estado::text AS estado, observaciones
+"""
+
+
+class CRUDCaja(CRUDBase[Caja, CajaCreate, CajaUpdate]):
+    """
+    Apertura, cierre y verificación de cajas. Los totales de ventas en
+    efectivo y gastos los mantienen los triggers de
+    db_info/create_caja_totales.sql al registrar cada venta o gasto, así que
+    cerrar una caja solo lee y actualiza su propia fila.
+    """
+
+    def get_caja(self, db: Session, *, caja_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Obtener una caja por ID
+        """
+        row = db.execute(
+            text(f"SELECT {COLUMNAS_CAJA} FROM caja WHERE id = :caja_id"),
+            {"caja_id": caja_id}
+        ).mappings().first()
+        return dict(row) if row else None
+
+    def get_abierta(self, db: Session, *, usuario_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Obtener la caja abierta de un usuario, si tiene una
+        """
+        row = db.execute(text(f"""
+            SELECT {COLUMNAS_CAJA} FROM caja
+            WHERE usuario_id = :usuario_id AND estado = 'abierta'
+        """), {"usuario_id": usuario_id}).mappings().first()
+        return dict(row) if row else None
+
+    def abrir(
+        self,
+        db: Session,
+        *,
+        usuario_id: int,
+        monto_inicial: Decimal,
+        observaciones: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Abrir una caja para el usuario.
+        Lanza ValueError si el usuario ya tiene una caja abierta.
+        """
+        try:
+            row = db.execute(text(f"""
+                INSERT INTO caja (usuario_id, monto_inicial, observaciones)
+                VALUES (:usuario_id, :monto_inicial, :observaciones)
+                RETURNING {COLUMNAS_CAJA}
+            """), {
+                "usuario_id": usuario_id,
+                "monto_inicial": monto_inicial,
+                "observaciones": observaciones,
+            }).mappings().one()
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            raise ValueError(f"El usuario {usuario_id} ya tiene una caja abierta")
+        return dict(row)
+
+    def registrar_gasto(self, db: Session, *, gasto_in: GastoCreate) -> Dict[str, Any]:
+        """
+        Registrar un gasto; si indica caja_id, el trigger lo suma a la caja
+        (que debe estar abierta) en la misma transacción
+        """
+        try:
+            row = db.execute(text("""
+                INSERT INTO gasto (concepto, monto, categoria, fecha_gasto, usuario_id, caja_id, observaciones)
+                VALUES (:concepto, :monto, CAST(:categoria AS categoria_gasto_enum),
+                        :fecha_gasto, :usuario_id, :caja_id, :observaciones)
+                RETURNING id, concepto, monto, categoria::text AS categoria, fecha_gasto,
+                          usuario_id, caja_id, observaciones
+            """), {
+                **gasto_in.model_dump(exclude={"categoria"}),
+                "categoria": gasto_in.categoria.value,
+            }).mappings().one()
+            db.commit()
+        except IntegrityError as e:
+            db.rollback()
+            raise ValueError(str(e.orig).splitlines()[0])
+        return dict(row)
+
+    def cerrar(
+        self,
+        db: Session,
+        *,
+        caja_id: int,
+        monto_final: Decimal,
+        observaciones: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Cerrar una caja abierta con el efectivo contado. La diferencia sale
+        de los totales acumulados, sin recorrer ventas ni gastos.
+        Lanza ValueError si la caja no existe o ya está cerrada.
+        """
+        try:
+            row = db.execute(text(f"""
+                UPDATE caja
+                SET monto_final = :monto_final,
+                    fecha_cierre = CURRENT_TIMESTAMP,
+                    estado = 'cerrada',
+                    diferencia = :monto_final - (monto_inicial
+                                                 + COALESCE(total_ventas_efectivo, 0)
+                                                 - COALESCE(total_gastos, 0)),
+                    observaciones = COALESCE(:observaciones, observaciones)
+                WHERE id = :caja_id AND estado = 'abierta'
+                RETURNING {COLUMNAS_CAJA}
+            """), {
+                "caja_id": caja_id,
+                "monto_final": monto_final,
+                "observaciones": observaciones,
+            }).mappings().first()
+
+            if row is None:
+                raise ValueError(f"Caja {caja_id} no encontrada o ya cerrada")
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return dict(row)
+
+    def verificar(self, db: Session, *, caja_id: int, corregir: bool = False) -> Dict[str, Any]:
+        """
+        Recalcular los totales de la caja desde venta, detalle_venta y gasto
+        en una sola consulta agregada y compararlos con los acumulados.
+        Con corregir=True sobrescribe los acumulados (y la diferencia si
+        la caja está cerrada) con los valores recalculados. Primero bloquea
+        la caja en una sentencia aparte: así el recálculo toma una instantánea
+        posterior al bloqueo (READ COMMITTED) que incluye las ventas que lo
+        tenían, y las que lleguen después esperan y suman su delta encima.
+        Lanza ValueError si la caja no existe.
+        """
+        if corregir:
+            bloqueada = db.execute(
+                text("SELECT id FROM caja WHERE id = :caja_id FOR UPDATE"),
+                {"caja_id": caja_id}
+            ).first()
+            if bloqueada is None:
+                db.rollback()
+                raise ValueError(f"Caja {caja_id} no encontrada")
+
+        row = db.execute(text("""
+            WITH ventas AS (
+                SELECT v.id, v.fecha_venta, v.total
+                FROM venta v
+                WHERE v.caja_id = :caja_id
+                  AND v.estado = 'completada'
+                  AND v.metodo_pago = 'efectivo'
+            ),
+            devuelto AS (
+                SELECT COALESCE(SUM(d.subtotal - importe_neto_detalle(d.subtotal, d.cantidad, d.cantidad_devuelta)), 0) AS importe
+                FROM detalle_venta d
+                INNER JOIN ventas v ON v.id = d.venta_id AND v.fecha_venta = d.fecha_venta
+                WHERE d.cantidad_devuelta > 0
+            )
+            SELECT
+                c.id,
+                c.estado::text AS estado,
+                COALESCE(c.total_ventas_efectivo, 0) AS total_ventas_efectivo,
+                COALESCE(c.total_gastos, 0) AS total_gastos,
+                (SELECT COALESCE(SUM(total), 0) FROM ventas)
+                    - (SELECT importe FROM devuelto) AS ventas_recalculadas,
+                (SELECT COALESCE(SUM(g.monto), 0) FROM gasto g WHERE g.caja_id = c.id) AS gastos_recalculados
+            FROM caja c
+            WHERE c.id = :caja_id
+        """), {"caja_id": caja_id}).first()
+
+        if row is None:
+            raise ValueError(f"Caja {caja_id} no encontrada")
+
+        discrepancias = {}
+        if row.total_ventas_efectivo != row.ventas_recalculadas:
+            discrepancias["total_ventas_efectivo"] = {
+                "acumulado": row.total_ventas_efectivo,
+                "recalculado": row.ventas_recalculadas,
+            }
+        if row.total_gastos != row.gastos_recalculados:
+            discrepancias["total_gastos"] = {
+                "acumulado": row.total_gastos,
+                "recalculado": row.gastos_recalculados,
+            }
+
+        corregida = False
+        if discrepancias and corregir:
+            db.execute(text("""
+                UPDATE caja
+                SET total_ventas_efectivo = :ventas,
+                    total_gastos = :gastos,
+                    diferencia = CASE
+                        WHEN estado = 'cerrada' THEN monto_final - (monto_inicial + :ventas - :gastos)
+                        ELSE diferencia
+                    END
+                WHERE id = :caja_id
+            """), {
+                "caja_id": caja_id,
+                "ventas": row.ventas_recalculadas,
+                "gastos": row.gastos_recalculados,
+            })
+            db.commit()
+            corregida = True
+        elif corregir:
+            # Sin discrepancias: liberar el bloqueo de la caja
+            db.rollback()
+
+        return {
+            "caja_id": row.id,
+            "estado": row.estado,
+            "total_ventas_efectivo": row.ventas_recalculadas,
+            "total_gastos": row.gastos_recalculados,
+            "consistente": not discrepancias,
+            "discrepancias": discrepancias,
+            "corregida": corregida,
+        }
+
+
+# Instancia del CRUD para usar en los endpoints
+caja = CRUDCaja(Caja)
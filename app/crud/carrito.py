@@ -0,0 +1,358 @@
+"""
+Carrito de compras del lado del servidor con operaciones por delta
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from sqlmodel import Session, text
+
+from app.core.database import engine
+from app.crud.precios import precios
+
+
+# Carritos que se mantienen en memoria por proceso (los menos usados salen primero)
+CARRITO_MAX_SESIONES = int(os.getenv("CARRITO_MAX_SESIONES", "10000"))
+# "memoria" (por proceso) o "db" (tabla carrito_sesion, compartida entre workers)
+CARRITO_BACKEND = os.getenv("CARRITO_BACKEND", "memoria")
+# Segundos que se reutilizan precio, nombre y stock de un producto
+CARRITO_PRECIOS_TTL = int(os.getenv("CARRITO_PRECIOS_TTL", "30"))
+# Tope de unidades por línea
+CARRITO_MAX_CANTIDAD = int(os.getenv("CARRITO_MAX_CANTIDAD", "999"))
+
+# Cookie con el ID de sesión del carrito
+COOKIE_CARRITO = "carrito_sesion"
+COOKIE_CARRITO_MAX_AGE = 30 * 24 * 3600
+
+
+class AlmacenCarritoDB:
+    """
+    Almacén persistente en la tabla carrito_sesion
+    (ver db_info/create_carrito_sesion.sql). Guarda {producto_id: cantidad}
+    como JSONB, una fila por sesión. No hay copia en memoria: cada lectura
+    va a la tabla, así ningún worker sirve un carrito ya cambiado o vaciado
+    por otro.
+    """
+
+    def __init__(self, bind=engine):
+        self.bind = bind
+
+    def obtener(self, sesion_id: str) -> Optional[Dict[int, int]]:
+        with self.bind.connect() as conn:
+            items = conn.execute(
+                text("SELECT items FROM carrito_sesion WHERE sesion_id = :sesion_id"),
+                {"sesion_id": sesion_id}
+            ).scalar()
+        if items is None:
+            return None
+        return {int(producto_id): int(cantidad) for producto_id, cantidad in items.items()}
+
+    def _escribir(self, conn, sesion_id: str, items: Dict[int, int]) -> None:
+        if items:
+            conn.execute(text("""
+                INSERT INTO carrito_sesion (sesion_id, items, fecha_actualizacion)
+                VALUES (:sesion_id, CAST(:items AS JSONB), CURRENT_TIMESTAMP)
+                ON CONFLICT (sesion_id) DO UPDATE SET
+                    items = EXCLUDED.items,
+                    fecha_actualizacion = EXCLUDED.fecha_actualizacion
+            """), {"sesion_id": sesion_id, "items": json.dumps(items)})
+        else:
+            conn.execute(
+                text("DELETE FROM carrito_sesion WHERE sesion_id = :sesion_id"),
+                {"sesion_id": sesion_id}
+            )
+
+    def guardar(self, sesion_id: str, items: Dict[int, int]) -> None:
+        with self.bind.begin() as conn:
+            self._escribir(conn, sesion_id, items)
+
+    def modificar(self, sesion_id: str, cambio: Callable[[Dict[int, int]], Dict[int, int]]) -> Dict[int, int]:
+        """
+        Leer, aplicar `cambio` y escribir en una sola transacción con la fila
+        bloqueada (FOR UPDATE): los cambios simultáneos de la misma sesión,
+        desde cualquier worker, se aplican uno detrás del otro
+        """
+        with self.bind.begin() as conn:
+            # La fila tiene que existir para poder bloquearla
+            conn.execute(text("""
+                INSERT INTO carrito_sesion (sesion_id) VALUES (:sesion_id)
+                ON CONFLICT (sesion_id) DO NOTHING
+            """), {"sesion_id": sesion_id})
+            actuales = conn.execute(
+                text("SELECT items FROM carrito_sesion WHERE sesion_id = :sesion_id FOR UPDATE"),
+                {"sesion_id": sesion_id}
+            ).scalar()
+            items = cambio({int(producto_id): int(cantidad) for producto_id, cantidad in actuales.items()})
+            self._escribir(conn, sesion_id, items)
+        return dict(items)
+
+
+class AlmacenCarritoMemoria:
+    """
+    Almacén LRU en memoria de un solo proceso (no sobrevive a reinicios ni
+    se comparte entre workers: para eso está AlmacenCarritoDB)
+    """
+
+    def __init__(self, max_sesiones: int = CARRITO_MAX_SESIONES):
+        self.max_sesiones = max_sesiones
+        self._lock = threading.Lock()
+        self._carritos: "OrderedDict[str, Dict[int, int]]" = OrderedDict()
+
+    def _escribir(self, sesion_id: str, items: Dict[int, int]) -> None:
+        # Llamar con self._lock tomado
+        if not items:
+            self._carritos.pop(sesion_id, None)
+            return
+        self._carritos[sesion_id] = dict(items)
+        self._carritos.move_to_end(sesion_id)
+        while len(self._carritos) > self.max_sesiones:
+            self._carritos.popitem(last=False)
+
+    def obtener(self, sesion_id: str) -> Optional[Dict[int, int]]:
+        with self._lock:
+            items = self._carritos.get(sesion_id)
+            if items is None:
+                return None
+            self._carritos.move_to_end(sesion_id)
+            return dict(items)
+
+    def guardar(self, sesion_id: str, items: Dict[int, int]) -> None:
+        with self._lock:
+            self._escribir(sesion_id, items)
+
+    def modificar(self, sesion_id: str, cambio: Callable[[Dict[int, int]], Dict[int, int]]) -> Dict[int, int]:
+        """
+        Leer, aplicar `cambio` y escribir sin que otro hilo intercale su cambio
+        """
+        with self._lock:
+            items = cambio(dict(self._carritos.get(sesion_id, {})))
+            self._escribir(sesion_id, items)
+        return dict(items)
+
+
+class CRUDCarrito:
+    """
+    Carritos por sesión (cookie) con operaciones que aplican un delta a una
+    sola línea. Nombre, imagen y stock salen siempre de la base (con una
+    caché de CARRITO_PRECIOS_TTL segundos) y los precios del motor de precios
+    según el tipo de cliente; el navegador solo envía ids y cantidades.
+    """
+
+    def __init__(self, almacen: Any, ttl_precios: int = CARRITO_PRECIOS_TTL):
+        self.almacen = almacen
+        self.ttl_precios = ttl_precios
+        self._lock_precios = threading.Lock()
+        self._precios: Dict[int, Tuple[float, Optional[Dict[str, Any]]]] = {}
+
+    def _productos(self, db: Session, producto_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Datos de los productos activos pedidos; los que falten o estén
+        vencidos en la caché se cargan con un solo query
+        """
+        ahora = time.monotonic()
+        encontrados: Dict[int, Dict[str, Any]] = {}
+        faltantes: List[int] = []
+
+        with self._lock_precios:
+            for producto_id in set(producto_ids):
+                entrada = self._precios.get(producto_id)
+                if entrada is not None and entrada[0] > ahora:
+                    if entrada[1] is not None:
+                        encontrados[producto_id] = entrada[1]
+                else:
+                    faltantes.append(producto_id)
+
+        if faltantes:
+            result = db.execute(text("""
+                SELECT id, nombre, imagen_url, COALESCE(stock_actual, 0) AS stock_actual
+                FROM producto
+                WHERE id = ANY(:ids) AND activo = true
+            """), {"ids": faltantes}).fetchall()
+
+            cargados = {
+                row.id: {
+                    "id": row.id,
+                    "name": row.nombre,
+                    "imageUrl": row.imagen_url if row.imagen_url and row.imagen_url.strip() else None,
+                    "stock": int(row.stock_actual),
+                }
+                for row in result
+            }
+            expira = ahora + self.ttl_precios
+            with self._lock_precios:
+                for producto_id in faltantes:
+                    # Los inexistentes o inactivos también se recuerdan
+                    self._precios[producto_id] = (expira, cargados.get(producto_id))
+            encontrados.update(cargados)
+
+        return encontrados
+
+    def _linea(self, producto: Dict[str, Any], cantidad: int, precio: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            **producto,
+            "price": precio["precio"],
+            "list_price": precio["precio_lista"],
+            "quantity": cantidad,
+            "item_total": precio["subtotal"],
+        }
+
+    def obtener(self, sesion_id: str) -> Dict[int, int]:
+        """
+        {producto_id: cantidad} del carrito de la sesión
+        """
+        return self.almacen.obtener(sesion_id) or {}
+
+    def lineas(self, db: Session, sesion_id: str, *, cliente: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Todas las líneas del carrito con precios actuales (del tipo de
+        `cliente`, si se conoce) y su total. Descarta los productos que ya no
+        están activos.
+        """
+        items = self.obtener(sesion_id)
+        productos = self._productos(db, items)
+        vigentes = [(pid, cant) for pid, cant in items.items() if pid in productos]
+        if len(vigentes) != len(items):
+            self._descartar(sesion_id, set(items) - set(productos))
+
+        cotizacion = precios.cotizar(db, vigentes, cliente=cliente)
+        lineas = [
+            self._linea(productos[producto_id], cantidad, cotizacion["lineas"][producto_id])
+            for producto_id, cantidad in vigentes
+        ]
+
+        return {
+            "items": lineas,
+            "total": cotizacion["total"],
+            "descuento": cotizacion["descuento"],
+            "count": len(lineas),
+        }
+
+    def _aplicar(
+        self,
+        db: Session,
+        sesion_id: str,
+        producto_id: int,
+        nueva_cantidad,
+        cliente: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Cambiar una línea (nueva_cantidad recibe la cantidad actual y devuelve
+        la nueva) y devolver solo esa línea más el total y el conteo del carrito.
+        El cambio se aplica sobre el carrito vigente en el almacén, serializado
+        por sesión, así dos pestañas o workers no pisan sus cambios.
+        """
+        producto = self._productos(db, [producto_id]).get(producto_id)
+        tope = min(CARRITO_MAX_CANTIDAD, max(producto["stock"], 0)) if producto is not None else 0
+
+        def cambiar(items: Dict[int, int]) -> Dict[int, int]:
+            cantidad = max(0, min(int(nueva_cantidad(items.get(producto_id, 0))), tope))
+            if cantidad > 0:
+                items[producto_id] = cantidad
+            else:
+                items.pop(producto_id, None)
+            return items
+
+        items = self.almacen.modificar(sesion_id, cambiar)
+        cantidad = items.get(producto_id, 0)
+
+        # Solo quedan productos vigentes
+        productos = self._productos(db, items)
+        if len(productos) != len(items):
+            self._descartar(sesion_id, set(items) - set(productos))
+            items = {pid: cant for pid, cant in items.items() if pid in productos}
+
+        # Todo el carrito se cotiza en una pasada para el total
+        cotizacion = precios.cotizar(db, list(items.items()), cliente=cliente)
+        return {
+            "producto_id": producto_id,
+            "linea": (
+                self._linea(producto, cantidad, cotizacion["lineas"][producto_id]) if cantidad > 0 else None
+            ),
+            "total": cotizacion["total"],
+            "count": len(items),
+        }
+
+    def _descartar(self, sesion_id: str, producto_ids: Iterable[int]) -> None:
+        """
+        Quitar del carrito vigente los productos que ya no están activos
+        """
+        descartados = set(producto_ids)
+        self.almacen.modificar(
+            sesion_id,
+            lambda items: {pid: cant for pid, cant in items.items() if pid not in descartados}
+        )
+
+    def agregar(
+        self,
+        db: Session,
+        *,
+        sesion_id: str,
+        producto_id: int,
+        cantidad: int = 1,
+        cliente: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Sumar `cantidad` unidades (negativa para restar; en 0 la línea se elimina)
+        """
+        return self._aplicar(db, sesion_id, producto_id, lambda actual: actual + cantidad, cliente)
+
+    def establecer(
+        self,
+        db: Session,
+        *,
+        sesion_id: str,
+        producto_id: int,
+        cantidad: int,
+        cliente: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Fijar la cantidad de una línea (0 la elimina)
+        """
+        return self._aplicar(db, sesion_id, producto_id, lambda actual: cantidad, cliente)
+
+    def eliminar(
+        self,
+        db: Session,
+        *,
+        sesion_id: str,
+        producto_id: int,
+        cliente: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Quitar una línea del carrito
+        """
+        return self._aplicar(db, sesion_id, producto_id, lambda actual: 0, cliente)
+
+    def fusionar(self, db: Session, *, sesion_id: str, items: List[Tuple[int, int]]) -> None:
+        """
+        Cargar en un carrito vacío las líneas de un carrito anterior del
+        navegador (solo ids y cantidades)
+        """
+        if self.obtener(sesion_id):
+            return
+        nuevos: Dict[int, int] = {}
+        for producto_id, cantidad in items:
+            if cantidad > 0:
+                nuevos[producto_id] = min(nuevos.get(producto_id, 0) + cantidad, CARRITO_MAX_CANTIDAD)
+        productos = self._productos(db, nuevos)
+        vigentes = {pid: cant for pid, cant in nuevos.items() if pid in productos}
+        # Si mientras tanto otra petición llenó el carrito, se respeta ese
+        self.almacen.modificar(sesion_id, lambda actuales: actuales or vigentes)
+
+    def vaciar(self, *, sesion_id: str) -> None:
+        """
+        Eliminar el carrito de la sesión (por ejemplo, después del checkout)
+        """
+        self.almacen.guardar(sesion_id, {})
+
+
+def _crear_almacen() -> Any:
+    if CARRITO_BACKEND == "db":
+        return AlmacenCarritoDB()
+    return AlmacenCarritoMemoria()
+
+
+carrito = CRUDCarrito(_crear_almacen())
@@ -2,13 +2,22 @@
 CRUD operations para Categorías
 """
 
-from typing import List, Optional, Dict, Any
+import os
+from typing import List, Optional, Dict, Any, Iterator, Tuple
 from sqlmodel import Session, select, text
 
+from app.core.database import engine
+from app.core.vuelo_unico import VUELO_UNICO, coalescido, vuelo_unico
 from app.crud.base import CRUDBase
 from app.models import Categoria, CategoriaCreate, CategoriaUpdate
 
 
+# Productos por página en los listados con scroll infinito
+PRODUCTOS_POR_PAGINA = int(os.getenv("PRODUCTOS_POR_PAGINA", "60"))
+# Filas que trae cada viaje al cursor del lado del servidor en los listados paginados
+PRODUCTOS_BLOQUE_CURSOR = int(os.getenv("PRODUCTOS_BLOQUE_CURSOR", "20"))
+
+
 class CRUDCategoria(CRUDBase[Categoria, CategoriaCreate, CategoriaUpdate]):
     
     def get_by_nombre(self, db: Session, *, nombre: str) -> Optional[Categoria]:
@@ -18,6 +27,7 @@ class CRUDCategoria(CRUDBase[Categoria, CategoriaCreate, CategoriaUpdate]):
         statement = select(Categoria).where(Categoria.nombre == nombre)
         return db.exec(statement).first()
 
+    @coalescido
     def get_root_active(self, db: Session) -> List[dict]:
         """
         Obtener todas las categorias raíz activas id y nombre
@@ -122,6 +132,60 @@ class CRUDCategoria(CRUDBase[Categoria, CategoriaCreate, CategoriaUpdate]):
             print(f"Error en get_categorias_hijas: {e}")
             return []
 
+    def _consulta_productos_descendientes(self, *, solo_activos: bool, paginada: bool = False, con_cursor: bool = False):
+        """
+        Productos de la categoría :categoria_id y sus descendientes, ordenados
+        por (nombre, id). Paginada agrega LIMIT :limite; con cursor, solo las
+        filas posteriores a (:despues_nombre, :despues_id).
+        """
+        # Filtros para categorías y productos activos
+        categoria_filter = "AND activo = true" if solo_activos else ""
+        producto_filter = "AND p.activo = true" if solo_activos else ""
+        categoria_recursiva_filter = "AND c.activo = true" if solo_activos else ""
+        cursor_filter = "AND (p.nombre, p.id) > (:despues_nombre, :despues_id)" if con_cursor else ""
+        limite = "LIMIT :limite" if paginada else ""
+
+        return text(f"""
+        WITH RECURSIVE categoria_tree AS (
+            -- Caso base: la categoría específica
+            SELECT id, nombre FROM categoria 
+            WHERE id = :categoria_id {categoria_filter}
+            
+            UNION ALL
+            
+            -- Caso recursivo: todos los descendientes activos
+            SELECT c.id, c.nombre FROM categoria c
+            INNER JOIN categoria_tree ct ON c.padre = ct.id
+            WHERE 1=1 {categoria_recursiva_filter}
+        )
+        SELECT 
+            p.id,
+            p.nombre,
+            p.precio_venta as precio,
+            p.stock_actual as stock,
+            p.activo,
+            p.imagen_url,
+            ct.nombre as categoria
+        FROM categoria_tree ct
+        INNER JOIN producto p ON ct.id = p.categoria_id
+        WHERE 1=1 {producto_filter} {cursor_filter}
+        ORDER BY p.nombre, p.id
+        {limite}
+        """)
+
+    @staticmethod
+    def _fila_producto(row) -> Dict[str, Any]:
+        return {
+            "id": row.id,
+            "nombre": row.nombre,
+            "precio": float(row.precio) if row.precio else 0.0,
+            "stock": row.stock,
+            "activo": row.activo,
+            "categoria": row.categoria,
+            "imagen_url": row.imagen_url,
+        }
+
+    @coalescido
     def get_productos_descendientes(
         self, 
         db: Session, 
@@ -142,57 +206,68 @@ class CRUDCategoria(CRUDBase[Categoria, CategoriaCreate, CategoriaUpdate]):
             Lista de productos con información de categoría
         """
         try:
-            # Filtros para categorías y productos activos
-            categoria_filter = "AND activo = true" if solo_activos else ""
-            producto_filter = "AND p.activo = true" if solo_activos else ""
-            categoria_recursiva_filter = "AND c.activo = true" if solo_activos else ""
-            
-            query = text(f"""
-            WITH RECURSIVE categoria_tree AS (
-                -- Caso base: la categoría específica
-                SELECT id, nombre FROM categoria 
-                WHERE id = :categoria_id {categoria_filter}
-                
-                UNION ALL
-                
-                -- Caso recursivo: todos los descendientes activos
-                SELECT c.id, c.nombre FROM categoria c
-                INNER JOIN categoria_tree ct ON c.padre = ct.id
-                WHERE 1=1 {categoria_recursiva_filter}
-            )
-            SELECT 
-                p.id,
-                p.nombre,
-                p.precio_venta as precio,
-                p.stock_actual as stock,
-                p.activo,
-                p.imagen_url,
-                ct.nombre as categoria
-            FROM categoria_tree ct
-            INNER JOIN producto p ON ct.id = p.categoria_id
-            WHERE 1=1 {producto_filter}
-            ORDER BY p.nombre
-            """)
-            
+            query = self._consulta_productos_descendientes(solo_activos=solo_activos)
             result = db.execute(query, {"categoria_id": categoria_id}).fetchall()
             
-            return [
-                {
-                    "id": row.id,
-                    "nombre": row.nombre,
-                    "precio": float(row.precio) if row.precio else 0.0,
-                    "stock": row.stock,
-                    "activo": row.activo,
-                    "categoria": row.categoria,
-                    "imagen_url": row.imagen_url,
-                }
-                for row in result
-            ]
+            return [self._fila_producto(row) for row in result]
             
         except Exception as e:
             print(f"Error en get_productos_descendientes: {e}")
             return []
 
+    def iter_productos_descendientes(
+        self,
+        *,
+        categoria_id: int,
+        solo_activos: bool = True,
+        despues_de: Optional[Tuple[str, int]] = None,
+        limite: int = PRODUCTOS_POR_PAGINA
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Igual que get_productos_descendientes pero de a una página (keyset):
+        a lo sumo `limite` productos posteriores a `despues_de` = (nombre, id).
+        Abre su propia conexión con un cursor del lado del servidor y entrega
+        las filas a medida que llegan, para renderizarlas en streaming.
+        Cerrar el generador libera la conexión.
+        """
+        params: Dict[str, Any] = {"categoria_id": categoria_id, "limite": limite}
+        if despues_de is not None:
+            params["despues_nombre"], params["despues_id"] = despues_de
+        query = self._consulta_productos_descendientes(
+            solo_activos=solo_activos, paginada=True, con_cursor=despues_de is not None
+        )
+
+        with engine.connect() as conn:
+            result = conn.execution_options(
+                stream_results=True, yield_per=PRODUCTOS_BLOQUE_CURSOR
+            ).execute(query, params)
+            for row in result:
+                yield self._fila_producto(row)
+
+    def pagina_productos_descendientes(
+        self,
+        *,
+        categoria_id: int,
+        solo_activos: bool = True,
+        despues_de: Optional[Tuple[str, int]] = None,
+        limite: int = PRODUCTOS_POR_PAGINA
+    ) -> List[Dict[str, Any]]:
+        """
+        Una página de iter_productos_descendientes cargada en memoria. Las
+        peticiones simultáneas de la misma página (categoría, solo_activos y
+        cursor) comparten una sola consulta; la lista es compartida, así que
+        quien la recibe no debe modificarla.
+        """
+        def cargar() -> List[Dict[str, Any]]:
+            return list(self.iter_productos_descendientes(
+                categoria_id=categoria_id, solo_activos=solo_activos, despues_de=despues_de, limite=limite
+            ))
+
+        if not VUELO_UNICO:
+            return cargar()
+        clave = ("CRUDCategoria.pagina_productos_descendientes", categoria_id, solo_activos, despues_de, limite)
+        return vuelo_unico.compartir(clave, cargar)
+
 
 # Instancia del CRUD para usar en los endpoints
 categoria = CRUDCategoria(Categoria)
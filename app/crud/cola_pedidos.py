@@ -0,0 +1,273 @@
+"""
+Cola durable de pasos posteriores al checkout
+"""
+
+import json
+import os
+import smtplib
+import threading
+import time
+from collections import Counter
+from email.message import EmailMessage
+from typing import Any, Callable, Dict, List, Optional
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, text
+
+from app.core.database import engine
+
+
+# Hilos worker que arranca la aplicación (0 para correrlos aparte con la CLI)
+COLA_WORKERS = int(os.getenv("COLA_WORKERS", "2"))
+# Segundos de espera de un worker cuando no hay tareas
+COLA_INTERVALO = float(os.getenv("COLA_INTERVALO", "1.0"))
+# Tareas que reclama un worker por viaje a la base
+COLA_LOTE = int(os.getenv("COLA_LOTE", "10"))
+# Segundos que una tarea reclamada queda reservada antes de volver a la cola
+COLA_VISIBILIDAD = int(os.getenv("COLA_VISIBILIDAD", "300"))
+# Espera base (segundos) del primer reintento; se duplica en cada intento
+COLA_REINTENTO_BASE = int(os.getenv("COLA_REINTENTO_BASE", "5"))
+
+# Correo de confirmación (sin SMTP_HOST solo se registra en el log)
+SMTP_HOST = os.getenv("SMTP_HOST")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "25"))
+SMTP_USUARIO = os.getenv("SMTP_USUARIO")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_REMITENTE = os.getenv("SMTP_REMITENTE", "pedidos@localhost")
+
+TAREA_CONFIRMACION = "confirmacion_pedido"
+
+
+class ColaPedidos:
+    """
+    Cola de tareas en la tabla cola_pedidos (ver db_info/create_pedidos_system.sql).
+
+    `encolar` escribe en la sesión del llamador, así la tarea se confirma
+    junto con la venta o no existe. Los workers reclaman lotes con
+    FOR UPDATE SKIP LOCKED, ejecutan el manejador registrado para cada tipo
+    y reintentan con espera exponencial hasta max_intentos.
+    """
+
+    def __init__(self, bind: Engine = engine):
+        self.bind = bind
+        self._manejadores: Dict[str, Callable[[Dict[str, Any]], None]] = {}
+        self._lock = threading.Lock()
+        self._contadores: Counter = Counter()
+        self._detener = threading.Event()
+        self._hilos: List[threading.Thread] = []
+
+    def manejador(self, tipo: str) -> Callable:
+        """
+        Decorador para registrar la función que procesa un tipo de tarea
+        """
+        def registrar(funcion: Callable[[Dict[str, Any]], None]) -> Callable[[Dict[str, Any]], None]:
+            self._manejadores[tipo] = funcion
+            return funcion
+        return registrar
+
+    def encolar(
+        self,
+        db: Session,
+        *,
+        tipo: str,
+        payload: Dict[str, Any],
+        venta_id: Optional[int] = None,
+        max_intentos: int = 5
+    ) -> int:
+        """
+        Agregar una tarea en la transacción de `db` (no hace commit)
+        """
+        return db.execute(text("""
+            INSERT INTO cola_pedidos (tipo, venta_id, payload, max_intentos)
+            VALUES (:tipo, :venta_id, CAST(:payload AS JSONB), :max_intentos)
+            RETURNING id
+        """), {
+            "tipo": tipo,
+            "venta_id": venta_id,
+            "payload": json.dumps(payload, default=str),
+            "max_intentos": max_intentos,
+        }).scalar()
+
+    def _contar(self, clave: str) -> None:
+        with self._lock:
+            self._contadores[clave] += 1
+
+    def reclamar(self, limite: int = COLA_LOTE) -> List[Any]:
+        """
+        Reservar hasta `limite` tareas disponibles. Cada una queda oculta
+        para los demás workers durante COLA_VISIBILIDAD segundos.
+        """
+        with self.bind.begin() as conn:
+            return conn.execute(text("""
+                UPDATE cola_pedidos c SET
+                    estado = 'procesando',
+                    intentos = c.intentos + 1,
+                    fecha_inicio = COALESCE(c.fecha_inicio, CURRENT_TIMESTAMP),
+                    disponible_en = CURRENT_TIMESTAMP + make_interval(secs => :visibilidad)
+                WHERE c.id IN (
+                    SELECT id FROM cola_pedidos
+                    WHERE estado IN ('pendiente', 'procesando')
+                      AND disponible_en <= CURRENT_TIMESTAMP
+                    ORDER BY disponible_en, id
+                    LIMIT :limite
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING c.id, c.tipo, c.venta_id, c.payload, c.intentos, c.max_intentos
+            """), {"limite": limite, "visibilidad": COLA_VISIBILIDAD}).fetchall()
+
+    def _completar(self, tarea_id: int) -> None:
+        with self.bind.begin() as conn:
+            conn.execute(text("""
+                UPDATE cola_pedidos
+                SET estado = 'completada', fecha_fin = CURRENT_TIMESTAMP, ultimo_error = NULL
+                WHERE id = :id
+            """), {"id": tarea_id})
+
+    def _fallar(self, tarea: Any, error: Exception) -> None:
+        agotada = tarea.intentos >= tarea.max_intentos
+        espera = COLA_REINTENTO_BASE * 2 ** (tarea.intentos - 1)
+        with self.bind.begin() as conn:
+            conn.execute(text("""
+                UPDATE cola_pedidos SET
+                    estado = CAST(:estado AS estado_tarea_cola_enum),
+                    disponible_en = CURRENT_TIMESTAMP + make_interval(secs => :espera),
+                    fecha_fin = CASE WHEN :agotada THEN CURRENT_TIMESTAMP END,
+                    ultimo_error = :error
+                WHERE id = :id
+            """), {
+                "id": tarea.id,
+                "estado": "fallida" if agotada else "pendiente",
+                "espera": espera,
+                "agotada": agotada,
+                "error": str(error)[:2000],
+            })
+
+    def procesar_lote(self, limite: int = COLA_LOTE) -> int:
+        """
+        Reclamar y ejecutar un lote de tareas. Devuelve cuántas se reclamaron.
+        """
+        tareas = self.reclamar(limite)
+        for tarea in tareas:
+            manejador = self._manejadores.get(tarea.tipo)
+            try:
+                if manejador is None:
+                    raise ValueError(f"No hay manejador para la tarea '{tarea.tipo}'")
+                manejador({**tarea.payload, "venta_id": tarea.venta_id})
+            except Exception as e:
+                print(f"Error procesando tarea {tarea.id} ({tarea.tipo}), intento {tarea.intentos}: {e}")
+                self._contar("fallidas" if tarea.intentos >= tarea.max_intentos else "reintentos")
+                self._fallar(tarea, e)
+            else:
+                self._contar("completadas")
+                self._completar(tarea.id)
+        return len(tareas)
+
+    def _bucle(self, intervalo: float) -> None:
+        while not self._detener.is_set():
+            try:
+                procesadas = self.procesar_lote()
+            except Exception as e:
+                print(f"Error en worker de cola de pedidos: {e}")
+                procesadas = 0
+            if not procesadas:
+                self._detener.wait(intervalo)
+
+    def iniciar(self, workers: int = COLA_WORKERS, intervalo: float = COLA_INTERVALO) -> None:
+        """
+        Arrancar `workers` hilos en segundo plano
+        """
+        self._detener.clear()
+        for n in range(workers):
+            hilo = threading.Thread(
+                target=self._bucle, args=(intervalo,), name=f"cola-pedidos-{n}", daemon=True
+            )
+            hilo.start()
+            self._hilos.append(hilo)
+
+    def detener(self, timeout: float = 10.0) -> None:
+        """
+        Pedir a los workers que terminen y esperarlos
+        """
+        self._detener.set()
+        for hilo in self._hilos:
+            hilo.join(timeout)
+        self._hilos = []
+
+    def metricas(self, db: Session) -> Dict[str, Any]:
+        """
+        Profundidad por estado, antigüedad de la tarea pendiente más vieja,
+        latencia (creación -> fin) de la última hora y contadores del proceso
+        """
+        por_estado = {
+            row.estado: row.cantidad
+            for row in db.execute(text("""
+                SELECT estado::text AS estado, COUNT(*) AS cantidad
+                FROM cola_pedidos
+                GROUP BY estado
+            """))
+        }
+        row = db.execute(text("""
+            SELECT
+                (SELECT EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - MIN(fecha_creacion))
+                 FROM cola_pedidos WHERE estado IN ('pendiente', 'procesando')) AS antiguedad,
+                percentile_cont(0.5) WITHIN GROUP (ORDER BY EXTRACT(EPOCH FROM fecha_fin - fecha_creacion)) AS p50,
+                percentile_cont(0.95) WITHIN GROUP (ORDER BY EXTRACT(EPOCH FROM fecha_fin - fecha_creacion)) AS p95,
+                COUNT(*) AS completadas
+            FROM cola_pedidos
+            WHERE estado = 'completada' AND fecha_fin >= CURRENT_TIMESTAMP - INTERVAL '1 hour'
+        """)).first()
+
+        with self._lock:
+            contadores = dict(self._contadores)
+
+        return {
+            "profundidad": por_estado.get("pendiente", 0) + por_estado.get("procesando", 0),
+            "por_estado": por_estado,
+            "antiguedad_pendiente_segundos": float(row.antiguedad) if row.antiguedad is not None else None,
+            "latencia_ultima_hora": {
+                "completadas": row.completadas,
+                "p50_segundos": float(row.p50) if row.p50 is not None else None,
+                "p95_segundos": float(row.p95) if row.p95 is not None else None,
+            },
+            "workers_activos": sum(1 for hilo in self._hilos if hilo.is_alive()),
+            "proceso": contadores,
+        }
+
+    def purgar(self, *, dias: int = 7) -> int:
+        """
+        Borrar las tareas completadas hace más de `dias` días
+        """
+        with self.bind.begin() as conn:
+            return conn.execute(text("""
+                DELETE FROM cola_pedidos
+                WHERE estado = 'completada'
+                  AND fecha_fin < CURRENT_TIMESTAMP - make_interval(days => :dias)
+            """), {"dias": dias}).rowcount
+
+
+cola_pedidos = ColaPedidos()
+
+
+@cola_pedidos.manejador(TAREA_CONFIRMACION)
+def enviar_confirmacion(payload: Dict[str, Any]) -> None:
+    """
+    Confirmación del pedido al cliente
+    """
+    email = payload.get("email")
+    asunto = f"Pedido {payload.get('numero_venta', payload['venta_id'])} confirmado"
+    if not email or not SMTP_HOST:
+        print(f"{asunto} (total {payload.get('total')}, cliente {email or 'sin email'})")
+        return
+
+    mensaje = EmailMessage()
+    mensaje["From"] = SMTP_REMITENTE
+    mensaje["To"] = email
+    mensaje["Subject"] = asunto
+    mensaje.set_content(
+        f"Hola {payload.get('nombre') or ''},\n\n"
+        f"Recibimos tu pedido {payload.get('numero_venta', '')} por un total de {payload.get('total')}.\n"
+    )
+    with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30) as smtp:
+        if SMTP_USUARIO:
+            smtp.starttls()
+            smtp.login(SMTP_USUARIO, SMTP_PASSWORD or "")
+        smtp.send_message(mensaje)
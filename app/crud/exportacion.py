@@ -0,0 +1,223 @@
+"""
+Exportaciones masivas de ventas y movimientos de inventario (CSV / NDJSON)
+"""
+
+import csv
+import io
+import json
+import os
+import zlib
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Iterator, Sequence
+from sqlalchemy.engine import Engine
+from sqlmodel import text
+
+from app.core.database import engine
+
+
+# Filas que el cursor del servidor entrega por viaje (y por bloque codificado)
+TAMANO_BLOQUE_EXPORTACION = int(os.getenv("EXPORTACION_BLOQUE", "2000"))
+
+FORMATOS_EXPORTACION = ("csv", "ndjson")
+
+CONSULTA_VENTAS = """
+    SELECT
+        v.id AS venta_id,
+        v.numero_venta,
+        v.fecha_venta,
+        v.estado::text AS estado,
+        v.metodo_pago::text AS metodo_pago,
+        v.usuario_id,
+        v.cliente_id,
+        v.subtotal AS venta_subtotal,
+        v.descuento AS venta_descuento,
+        v.impuestos AS venta_impuestos,
+        v.total AS venta_total,
+        d.id AS detalle_id,
+        d.producto_id,
+        p.codigo_barras,
+        p.nombre AS producto,
+        d.cantidad,
+        d.cantidad_devuelta,
+        d.precio_unitario,
+        d.descuento_unitario,
+        d.subtotal
+    FROM venta v
+    INNER JOIN detalle_venta d ON d.venta_id = v.id AND d.fecha_venta = v.fecha_venta
+    INNER JOIN producto p ON p.id = d.producto_id
+    WHERE v.fecha_venta >= :desde AND v.fecha_venta < :hasta
+      AND d.fecha_venta >= :desde AND d.fecha_venta < :hasta
+    ORDER BY v.fecha_venta, v.id, d.id
+"""
+
+CONSULTA_MOVIMIENTOS = """
+    SELECT
+        m.id,
+        m.fecha_movimiento,
+        m.tipo_movimiento::text AS tipo_movimiento,
+        m.producto_id,
+        p.codigo_barras,
+        p.nombre AS producto,
+        m.cantidad,
+        m.stock_anterior,
+        m.stock_nuevo,
+        m.referencia,
+        m.motivo,
+        m.usuario_id
+    FROM movimiento_inventario m
+    INNER JOIN producto p ON p.id = m.producto_id
+    WHERE m.fecha_movimiento >= :desde AND m.fecha_movimiento < :hasta
+    ORDER BY m.fecha_movimiento, m.id
+"""
+
+
+def _valor_json(valor: Any) -> Any:
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return str(valor)
+
+
+class _CodificadorCSV:
+    """Codifica bloques de filas como CSV reutilizando un solo buffer"""
+
+    def __init__(self, columnas: Sequence[str]):
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+        self._writer.writerow(columnas)
+
+    def bloque(self, filas: Sequence[Sequence[Any]]) -> str:
+        self._writer.writerows(filas)
+        return self._vaciar()
+
+    def _vaciar(self) -> str:
+        datos = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return datos
+
+    def inicio(self) -> str:
+        return self._vaciar()
+
+
+class _CodificadorNDJSON:
+    """Codifica bloques de filas como un objeto JSON por línea"""
+
+    def __init__(self, columnas: Sequence[str]):
+        self._columnas = list(columnas)
+
+    def bloque(self, filas: Sequence[Sequence[Any]]) -> str:
+        return "".join(
+            json.dumps(dict(zip(self._columnas, fila)), default=_valor_json, ensure_ascii=False) + "\n"
+            for fila in filas
+        )
+
+    def inicio(self) -> str:
+        return ""
+
+
+class CRUDExportacion:
+    """
+    Exportaciones en streaming. Cada exportación abre su propia conexión con
+    un cursor del lado del servidor (stream_results): las filas llegan en
+    bloques de TAMANO_BLOQUE_EXPORTACION y se codifican y envían bloque a
+    bloque, así la memoria no depende del tamaño del rango.
+    """
+
+    def __init__(self, bind: Engine = engine, tamano_bloque: int = TAMANO_BLOQUE_EXPORTACION):
+        self.bind = bind
+        self.tamano_bloque = tamano_bloque
+
+    def _exportar(
+        self,
+        consulta: str,
+        params: Dict[str, Any],
+        *,
+        formato: str,
+        comprimir: bool
+    ) -> Iterator[bytes]:
+        # Validar antes de crear el generador para fallar al llamar, no al iterar
+        if formato not in FORMATOS_EXPORTACION:
+            raise ValueError(f"Formato inválido: {formato}")
+        return self._generar(consulta, params, formato=formato, comprimir=comprimir)
+
+    def _generar(
+        self,
+        consulta: str,
+        params: Dict[str, Any],
+        *,
+        formato: str,
+        comprimir: bool
+    ) -> Iterator[bytes]:
+        # gzip incremental (wbits=31 escribe cabecera y cola gzip)
+        compresor = zlib.compressobj(6, zlib.DEFLATED, 31) if comprimir else None
+
+        def salida(datos: str) -> bytes:
+            crudo = datos.encode("utf-8")
+            return compresor.compress(crudo) if compresor else crudo
+
+        with self.bind.connect() as conn:
+            result = conn.execution_options(
+                stream_results=True, yield_per=self.tamano_bloque
+            ).execute(text(consulta), params)
+
+            columnas = list(result.keys())
+            codificador = _CodificadorCSV(columnas) if formato == "csv" else _CodificadorNDJSON(columnas)
+
+            inicio = salida(codificador.inicio())
+            if inicio:
+                yield inicio
+
+            for filas in result.partitions(self.tamano_bloque):
+                datos = salida(codificador.bloque(filas))
+                if datos:
+                    yield datos
+
+        if compresor:
+            yield compresor.flush()
+
+    @staticmethod
+    def _rango(fecha_inicio: date, fecha_fin: date) -> Dict[str, datetime]:
+        return {
+            "desde": datetime.combine(fecha_inicio, time.min),
+            "hasta": datetime.combine(fecha_fin + timedelta(days=1), time.min),
+        }
+
+    def exportar_ventas(
+        self,
+        *,
+        fecha_inicio: date,
+        fecha_fin: date,
+        formato: str = "csv",
+        comprimir: bool = False
+    ) -> Iterator[bytes]:
+        """
+        Ventas con sus líneas (una fila por detalle_venta) en un rango de
+        fechas, ambos extremos incluidos
+        """
+        return self._exportar(
+            CONSULTA_VENTAS,
+            self._rango(fecha_inicio, fecha_fin),
+            formato=formato,
+            comprimir=comprimir
+        )
+
+    def exportar_movimientos(
+        self,
+        *,
+        fecha_inicio: date,
+        fecha_fin: date,
+        formato: str = "csv",
+        comprimir: bool = False
+    ) -> Iterator[bytes]:
+        """
+        Movimientos de inventario en un rango de fechas, ambos extremos incluidos
+        """
+        return self._exportar(
+            CONSULTA_MOVIMIENTOS,
+            self._rango(fecha_inicio, fecha_fin),
+            formato=formato,
+            comprimir=comprimir
+        )
+
+
+exportacion = CRUDExportacion()
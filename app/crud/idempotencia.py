@@ -0,0 +1,192 @@
+"""
+Claves de idempotencia para el checkout
+"""
+
+import hashlib
+import os
+import threading
+import time
+import zlib
+from typing import Callable, Optional, Tuple
+from fastapi.responses import Response
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, text
+
+from app.core.database import engine
+
+
+# Segundos que se guarda la respuesta de cada clave
+IDEMPOTENCIA_TTL_SEGUNDOS = int(os.getenv("IDEMPOTENCIA_TTL_SEGUNDOS", "86400"))
+# Cada cuántos segundos un proceso borra las claves vencidas
+IDEMPOTENCIA_LIMPIEZA_SEGUNDOS = int(os.getenv("IDEMPOTENCIA_LIMPIEZA_SEGUNDOS", "600"))
+
+LONGITUD_MAXIMA_CLAVE = 200
+
+
+class RegistroIdempotencia:
+    """
+    Registro clave -> respuesta en la tabla checkout_idempotencia
+    (ver db_info/create_idempotencia.sql).
+
+    La fila de la clave se inserta en la misma sesión (y transacción) que
+    registra la venta: la venta y su respuesta se confirman juntas con un
+    solo commit y una sola conexión. Un duplicado concurrente se bloquea en
+    ese mismo INSERT y, cuando la primera confirma, devuelve la respuesta
+    guardada.
+
+    Solo se guardan los resultados exitosos (con venta). Si el
+    procesamiento falla (devuelve venta_id None o lanza una excepción) se
+    deshace su savepoint y la clave se libera: un reintento con el carrito
+    corregido vuelve a procesarse.
+    """
+
+    def __init__(
+        self,
+        bind: Engine = engine,
+        ttl: int = IDEMPOTENCIA_TTL_SEGUNDOS,
+        intervalo_limpieza: int = IDEMPOTENCIA_LIMPIEZA_SEGUNDOS
+    ):
+        self.bind = bind
+        self.ttl = ttl
+        self.intervalo_limpieza = intervalo_limpieza
+        self._lock = threading.Lock()
+        self._proxima_limpieza = 0.0
+
+    @staticmethod
+    def _huella(alcance: str, clave: str) -> bytes:
+        return hashlib.sha256(f"{alcance}:{clave}".encode("utf-8")).digest()
+
+    def limpiar(self) -> int:
+        """
+        Borrar las claves vencidas. Devuelve cuántas se borraron.
+        """
+        with self.bind.begin() as conn:
+            return conn.execute(
+                text("DELETE FROM checkout_idempotencia WHERE expira < CURRENT_TIMESTAMP")
+            ).rowcount
+
+    def _limpiar_si_corresponde(self) -> None:
+        with self._lock:
+            ahora = time.monotonic()
+            if ahora < self._proxima_limpieza:
+                return
+            self._proxima_limpieza = ahora + self.intervalo_limpieza
+        try:
+            self.limpiar()
+        except Exception as e:
+            print(f"Error limpiando claves de idempotencia: {e}")
+
+    def _guardar(self, db: Session, huella: bytes, respuesta: Response, venta_id: int) -> None:
+        db.execute(text("""
+            UPDATE checkout_idempotencia
+            SET venta_id = :venta_id, codigo_estado = :codigo_estado, cuerpo = :cuerpo
+            WHERE clave = :clave
+        """), {
+            "clave": huella,
+            "venta_id": venta_id,
+            "codigo_estado": respuesta.status_code,
+            "cuerpo": zlib.compress(respuesta.body),
+        })
+
+    @staticmethod
+    def _procesar_en_savepoint(
+        db: Session, procesar: Callable[[Session], Tuple[Response, Optional[int]]]
+    ) -> Tuple[Response, Optional[int]]:
+        """
+        Ejecutar `procesar` dentro de un savepoint y deshacer solo lo suyo si
+        falla; lo registrado antes en la transacción (la clave) se conserva
+        """
+        savepoint = db.begin_nested()
+        try:
+            respuesta, venta_id = procesar(db)
+        except Exception:
+            savepoint.rollback()
+            raise
+        if venta_id is None:
+            savepoint.rollback()
+        else:
+            savepoint.commit()
+        return respuesta, venta_id
+
+    def ejecutar(
+        self,
+        *,
+        alcance: str,
+        clave: Optional[str],
+        procesar: Callable[[Session], Tuple[Response, Optional[int]]]
+    ) -> Tuple[Response, Optional[int]]:
+        """
+        Ejecutar `procesar` una sola vez por (alcance, clave) y devolver
+        siempre su (respuesta, venta_id). `procesar` recibe la sesión con la
+        clave ya reclamada y debe registrar la venta en ella SIN hacer
+        commit ni rollback: el commit lo hace este método junto con la
+        respuesta. Un venta_id None indica un fallo: se deshace lo que hizo
+        `procesar`, no se guarda la respuesta y se libera la clave.
+        Sin clave se procesa igual, sin registro.
+
+        Bloquea mientras otra petición procesa la misma clave: llamarlo
+        desde un hilo (en_threadpool), no desde el event loop.
+        """
+        if not clave or len(clave) > LONGITUD_MAXIMA_CLAVE:
+            with Session(self.bind) as db:
+                try:
+                    respuesta, venta_id = procesar(db)
+                    if venta_id is None:
+                        db.rollback()
+                    else:
+                        db.commit()
+                except Exception:
+                    db.rollback()
+                    raise
+            return respuesta, venta_id
+
+        self._limpiar_si_corresponde()
+        huella = self._huella(alcance, clave)
+
+        with Session(self.bind) as db:
+            try:
+                # Espera aquí si la clave está en proceso en otra transacción;
+                # una fila vencida se reutiliza como nueva
+                nueva = db.execute(text("""
+                    INSERT INTO checkout_idempotencia AS i (clave, expira)
+                    VALUES (:clave, CURRENT_TIMESTAMP + make_interval(secs => :ttl))
+                    ON CONFLICT (clave) DO UPDATE SET
+                        venta_id = NULL,
+                        codigo_estado = 200,
+                        cuerpo = NULL,
+                        expira = EXCLUDED.expira
+                    WHERE i.expira < CURRENT_TIMESTAMP
+                    RETURNING clave
+                """), {"clave": huella, "ttl": self.ttl}).first()
+
+                if nueva is None:
+                    guardada = db.execute(text("""
+                        SELECT venta_id, codigo_estado, cuerpo FROM checkout_idempotencia
+                        WHERE clave = :clave
+                    """), {"clave": huella}).first()
+                    db.commit()
+                    return Response(
+                        content=zlib.decompress(guardada.cuerpo),
+                        status_code=guardada.codigo_estado,
+                        media_type="text/html",
+                        headers={"Idempotent-Replayed": "true"}
+                    ), guardada.venta_id
+
+                respuesta, venta_id = self._procesar_en_savepoint(db, procesar)
+                if venta_id is None:
+                    # Fallo: liberar la clave en lugar de guardar el error
+                    db.execute(
+                        text("DELETE FROM checkout_idempotencia WHERE clave = :clave"),
+                        {"clave": huella}
+                    )
+                else:
+                    self._guardar(db, huella, respuesta, venta_id)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+
+        return respuesta, venta_id
+
+
+idempotencia = RegistroIdempotencia()
@@ -0,0 +1,383 @@
+"""
+Importación masiva de catálogo y conteos de stock desde CSV
+
+El archivo se lee en streaming y se valida por lotes contra ProductoCreate.
+Las filas válidas se cargan con COPY en una tabla temporal (staging) y se
+fusionan en producto con un único INSERT ... ON CONFLICT por codigo_barras.
+"""
+
+import csv
+import io
+import time
+from typing import Any, Dict, IO, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlmodel import Session, text
+
+from app.models import ProductoCreate
+
+
+# Columnas de producto que se pueden cargar desde el CSV (orden del staging)
+COLUMNAS_PRODUCTO = [
+    "codigo_barras",
+    "nombre",
+    "descripcion",
+    "categoria_id",
+    "proveedor_id",
+    "precio_compra",
+    "precio_venta",
+    "stock_actual",
+    "stock_minimo",
+    "stock_maximo",
+    "unidad_medida",
+    "imagen_url",
+    "fecha_vencimiento",
+    "activo",
+]
+
+# Columnas que no se sobrescriben al actualizar un producto existente:
+# el stock solo se modifica con movimientos o conteos
+COLUMNAS_SIN_ACTUALIZAR = {"codigo_barras", "stock_actual"}
+
+TAMANO_LOTE = 1000
+MAX_ERRORES = 1000
+
+
+class ResolutorNombres:
+    """
+    Cache de nombre -> id para una tabla pequeña (categoria, proveedor).
+    Se carga completa con una sola consulta la primera vez que se usa.
+    """
+
+    def __init__(self, db: Session, tabla: str):
+        self.db = db
+        self.tabla = tabla
+        self._por_nombre: Optional[Dict[str, int]] = None
+        self._ids: set = set()
+
+    def _cargar(self) -> None:
+        result = self.db.execute(text(f"SELECT id, nombre FROM {self.tabla}")).fetchall()
+        self._por_nombre = {row.nombre.strip().lower(): row.id for row in result}
+        self._ids = {row.id for row in result}
+
+    def resolver(self, valor: str) -> int:
+        """
+        Resolver un nombre (o un id numérico) a su id.
+        Lanza ValueError si no existe.
+        """
+        if self._por_nombre is None:
+            self._cargar()
+
+        if valor.isdigit() and int(valor) in self._ids:
+            return int(valor)
+
+        id_encontrado = self._por_nombre.get(valor.strip().lower())
+        if id_encontrado is None:
+            raise ValueError(f"{self.tabla} '{valor}' no existe")
+        return id_encontrado
+
+
+class ResultadoImportacion:
+    """Acumulador de métricas y errores de una importación"""
+
+    def __init__(self, max_errores: int = MAX_ERRORES):
+        self.inicio = time.perf_counter()
+        self.filas_leidas = 0
+        self.filas_validas = 0
+        self.insertados = 0
+        self.actualizados = 0
+        self.total_errores = 0
+        self.errores: List[Dict[str, Any]] = []
+        self.max_errores = max_errores
+
+    def agregar_error(self, linea: int, error: str) -> None:
+        self.total_errores += 1
+        if len(self.errores) < self.max_errores:
+            self.errores.append({"linea": linea, "error": error})
+
+    def to_dict(self) -> Dict[str, Any]:
+        duracion = time.perf_counter() - self.inicio
+        return {
+            "filas_leidas": self.filas_leidas,
+            "filas_validas": self.filas_validas,
+            "insertados": self.insertados,
+            "actualizados": self.actualizados,
+            "total_errores": self.total_errores,
+            "errores": self.errores,
+            "duracion_segundos": round(duracion, 3),
+            "filas_por_segundo": round(self.filas_leidas / duracion, 1) if duracion > 0 else 0.0,
+        }
+
+
+def _leer_lotes(
+    archivo: IO[bytes], tamano_lote: int
+) -> Iterator[Tuple[List[str], List[Tuple[int, Dict[str, str]]]]]:
+    """
+    Leer el CSV en streaming y devolver lotes de (linea, fila)
+    junto con las columnas del encabezado
+    """
+    lector = csv.DictReader(io.TextIOWrapper(archivo, encoding="utf-8-sig", newline=""))
+    columnas = [c.strip() for c in (lector.fieldnames or [])]
+    lote: List[Tuple[int, Dict[str, str]]] = []
+
+    for fila in lector:
+        # line_num apunta a la última línea física leída (soporta campos multilínea)
+        lote.append((lector.line_num, {k.strip(): v for k, v in fila.items() if k}))
+        if len(lote) >= tamano_lote:
+            yield columnas, lote
+            lote = []
+
+    if lote:
+        yield columnas, lote
+
+
+def _copy_buffer(db: Session, sql_copy: str, buffer: io.StringIO) -> None:
+    """
+    Ejecutar COPY ... FROM STDIN en la misma transacción de la sesión
+    """
+    buffer.seek(0)
+    conexion = db.connection().connection
+    with conexion.cursor() as cursor:
+        cursor.copy_expert(sql_copy, buffer)
+
+
+class ImportadorCatalogo:
+
+    def importar_productos(
+        self,
+        db: Session,
+        *,
+        archivo: IO[bytes],
+        tamano_lote: int = TAMANO_LOTE
+    ) -> Dict[str, Any]:
+        """
+        Importar (insertar o actualizar) productos desde un CSV.
+
+        Las columnas `categoria` y `proveedor` aceptan nombres; se resuelven a
+        id con una cache cargada una sola vez. Al actualizar un producto
+        existente solo se modifican las columnas presentes en el archivo.
+        """
+        resultado = ResultadoImportacion()
+        categorias = ResolutorNombres(db, "categoria")
+        proveedores = ResolutorNombres(db, "proveedor")
+        columnas_archivo: set = set()
+
+        db.execute(text("""
+            CREATE TEMP TABLE producto_importacion (
+                linea INTEGER,
+                codigo_barras VARCHAR(50),
+                nombre VARCHAR(200),
+                descripcion TEXT,
+                categoria_id INTEGER,
+                proveedor_id INTEGER,
+                precio_compra DECIMAL(10,2),
+                precio_venta DECIMAL(10,2),
+                stock_actual INTEGER,
+                stock_minimo INTEGER,
+                stock_maximo INTEGER,
+                unidad_medida TEXT,
+                imagen_url VARCHAR(255),
+                fecha_vencimiento DATE,
+                activo BOOLEAN
+            ) ON COMMIT DROP
+        """))
+
+        try:
+            for columnas, lote in _leer_lotes(archivo, tamano_lote):
+                columnas_archivo.update(columnas)
+                buffer = io.StringIO()
+                escritor = csv.writer(buffer)
+
+                for linea, fila in lote:
+                    resultado.filas_leidas += 1
+                    datos = {k: v.strip() for k, v in fila.items() if v is not None and v.strip() != ""}
+
+                    try:
+                        if not datos.get("codigo_barras"):
+                            raise ValueError("codigo_barras es requerido")
+                        if "categoria" in datos:
+                            datos["categoria_id"] = categorias.resolver(datos.pop("categoria"))
+                        elif "categoria_id" in datos:
+                            datos["categoria_id"] = categorias.resolver(datos["categoria_id"])
+                        if "proveedor" in datos:
+                            datos["proveedor_id"] = proveedores.resolver(datos.pop("proveedor"))
+                        elif "proveedor_id" in datos:
+                            datos["proveedor_id"] = proveedores.resolver(datos["proveedor_id"])
+
+                        producto = ProductoCreate.model_validate(datos)
+                    except ValidationError as e:
+                        detalle = "; ".join(
+                            f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()
+                        )
+                        resultado.agregar_error(linea, detalle)
+                        continue
+                    except ValueError as e:
+                        resultado.agregar_error(linea, str(e))
+                        continue
+
+                    valores = producto.model_dump(include=set(COLUMNAS_PRODUCTO))
+                    valores["unidad_medida"] = producto.unidad_medida.value
+                    escritor.writerow([linea] + [valores[c] for c in COLUMNAS_PRODUCTO])
+                    resultado.filas_validas += 1
+
+                _copy_buffer(
+                    db,
+                    f"COPY producto_importacion (linea, {', '.join(COLUMNAS_PRODUCTO)}) FROM STDIN WITH (FORMAT csv)",
+                    buffer
+                )
+
+            if resultado.filas_validas:
+                # Columnas presentes en el archivo que se actualizan en productos existentes
+                presentes = set(columnas_archivo)
+                if "categoria" in presentes:
+                    presentes.add("categoria_id")
+                if "proveedor" in presentes:
+                    presentes.add("proveedor_id")
+                columnas_update = [
+                    c for c in COLUMNAS_PRODUCTO
+                    if c in presentes and c not in COLUMNAS_SIN_ACTUALIZAR
+                ]
+                set_update = ", ".join(f"{c} = EXCLUDED.{c}" for c in columnas_update)
+                on_conflict = f"DO UPDATE SET {set_update}" if set_update else "DO NOTHING"
+
+                columnas_select = [
+                    "unidad_medida::unidad_medida_enum" if c == "unidad_medida" else c
+                    for c in COLUMNAS_PRODUCTO
+                ]
+
+                # Si un código aparece varias veces en el archivo gana la última línea
+                fila = db.execute(text(f"""
+                    WITH upsert AS (
+                        INSERT INTO producto ({', '.join(COLUMNAS_PRODUCTO)})
+                        SELECT DISTINCT ON (codigo_barras) {', '.join(columnas_select)}
+                        FROM producto_importacion
+                        ORDER BY codigo_barras, linea DESC
+                        ON CONFLICT (codigo_barras) {on_conflict}
+                        RETURNING (xmax = 0) AS insertado
+                    )
+                    SELECT
+                        count(*) FILTER (WHERE insertado) AS insertados,
+                        count(*) FILTER (WHERE NOT insertado) AS actualizados
+                    FROM upsert
+                """)).first()
+                resultado.insertados = fila.insertados
+                resultado.actualizados = fila.actualizados
+
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        return resultado.to_dict()
+
+    def importar_conteo_stock(
+        self,
+        db: Session,
+        *,
+        archivo: IO[bytes],
+        usuario_id: int,
+        referencia: str = "CONTEO-FISICO",
+        tamano_lote: int = TAMANO_LOTE
+    ) -> Dict[str, Any]:
+        """
+        Importar un conteo físico de stock desde un CSV con columnas
+        `codigo_barras` y `stock`.
+
+        Ajusta stock_actual en un solo UPDATE y registra los movimientos
+        de tipo AJUSTE en el mismo statement.
+        """
+        resultado = ResultadoImportacion()
+
+        db.execute(text("""
+            CREATE TEMP TABLE conteo_importacion (
+                linea INTEGER,
+                codigo_barras VARCHAR(50),
+                stock_contado INTEGER
+            ) ON COMMIT DROP
+        """))
+
+        try:
+            for _, lote in _leer_lotes(archivo, tamano_lote):
+                buffer = io.StringIO()
+                escritor = csv.writer(buffer)
+
+                for linea, fila in lote:
+                    resultado.filas_leidas += 1
+                    codigo = (fila.get("codigo_barras") or "").strip()
+                    stock = (fila.get("stock") or "").strip()
+
+                    if not codigo:
+                        resultado.agregar_error(linea, "codigo_barras es requerido")
+                        continue
+                    if not stock.isdigit():
+                        resultado.agregar_error(linea, f"stock inválido: '{stock}'")
+                        continue
+
+                    escritor.writerow([linea, codigo, int(stock)])
+                    resultado.filas_validas += 1
+
+                _copy_buffer(
+                    db,
+                    "COPY conteo_importacion (linea, codigo_barras, stock_contado) FROM STDIN WITH (FORMAT csv)",
+                    buffer
+                )
+
+            # Códigos que no existen en el catálogo
+            desconocidos = db.execute(text("""
+                SELECT ci.linea, ci.codigo_barras
+                FROM conteo_importacion ci
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM producto p WHERE p.codigo_barras = ci.codigo_barras
+                )
+                ORDER BY ci.linea
+            """)).fetchall()
+            for row in desconocidos:
+                resultado.agregar_error(row.linea, f"codigo_barras '{row.codigo_barras}' no existe")
+            resultado.filas_validas -= len(desconocidos)
+
+            fila = db.execute(text("""
+                WITH conteo AS (
+                    SELECT DISTINCT ON (codigo_barras) codigo_barras, stock_contado
+                    FROM conteo_importacion
+                    ORDER BY codigo_barras, linea DESC
+                ),
+                anterior AS (
+                    SELECT p.id, p.stock_actual AS stock_anterior, c.stock_contado
+                    FROM producto p
+                    INNER JOIN conteo c ON c.codigo_barras = p.codigo_barras
+                    WHERE p.stock_actual IS DISTINCT FROM c.stock_contado
+                    FOR UPDATE OF p
+                ),
+                ajuste AS (
+                    UPDATE producto p
+                    SET stock_actual = a.stock_contado
+                    FROM anterior a
+                    WHERE p.id = a.id
+                    RETURNING p.id, a.stock_anterior, a.stock_contado
+                ),
+                movimiento AS (
+                    INSERT INTO movimiento_inventario (
+                        producto_id, tipo_movimiento, cantidad, stock_anterior,
+                        stock_nuevo, referencia, motivo, usuario_id
+                    )
+                    SELECT
+                        id, 'ajuste', abs(stock_contado - COALESCE(stock_anterior, 0)),
+                        COALESCE(stock_anterior, 0), stock_contado, :referencia,
+                        'Conteo físico importado', :usuario_id
+                    FROM ajuste
+                    RETURNING 1
+                )
+                SELECT (SELECT count(*) FROM ajuste) AS actualizados
+            """), {"referencia": referencia, "usuario_id": usuario_id}).first()
+            resultado.actualizados = fila.actualizados
+
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        return resultado.to_dict()
+
+
+# Instancia para usar en los endpoints
+importacion = ImportadorCatalogo()
@@ -0,0 +1,167 @@
+"""
+Mantenimiento de particiones mensuales de venta, detalle_venta y
+movimiento_inventario
+"""
+
+from datetime import date
+from typing import Any, Dict, List
+from sqlmodel import Session, text
+
+
+# Orden de archivado: detalle_venta referencia a venta, se separa primero
+TABLAS_PARTICIONADAS = ("detalle_venta", "venta", "movimiento_inventario")
+
+ESQUEMA_ARCHIVO = "archivo"
+
+
+class GestorParticiones:
+    """
+    Creación, listado y archivado de particiones mensuales
+    (ver db_info/create_particiones.sql). Las particiones se llaman
+    <tabla>_YYYY_MM y cubren [primer día del mes, primer día del mes siguiente).
+    """
+
+    def particionado(self, db: Session) -> bool:
+        """
+        Indica si la migración de particiones ya se aplicó en la base
+        """
+        return db.execute(
+            text("SELECT to_regproc('asegurar_particiones') IS NOT NULL")
+        ).scalar()
+
+    def asegurar(self, db: Session, *, meses_adelante: int = 3) -> int:
+        """
+        Crear las particiones que falten hasta `meses_adelante` meses después
+        del actual. Devuelve cuántas se crearon (0 si la base no está particionada)
+        """
+        if not self.particionado(db):
+            return 0
+
+        creadas = db.execute(
+            text("SELECT asegurar_particiones(:meses)"),
+            {"meses": meses_adelante}
+        ).scalar()
+        db.commit()
+        return creadas
+
+    def verificar(self, db: Session) -> List[str]:
+        """
+        Problemas de esquema que impiden registrar ventas correctamente:
+        la columna detalle_venta.fecha_venta y, si la base está particionada,
+        el registro de números de venta y las particiones DEFAULT
+        (db_info/create_detalle_venta_fecha.sql y
+        db_info/create_particiones_integridad.sql)
+        """
+        problemas = []
+        tiene_fecha = db.execute(text("""
+            SELECT EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_name = 'detalle_venta' AND column_name = 'fecha_venta'
+            )
+        """)).scalar()
+        if not tiene_fecha:
+            problemas.append("falta detalle_venta.fecha_venta (db_info/create_detalle_venta_fecha.sql)")
+
+        if not self.particionado(db):
+            return problemas
+
+        integridad = db.execute(text("""
+            SELECT
+                EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'trigger_venta_numero_registro'),
+                to_regclass('venta_default') IS NOT NULL
+                    AND to_regclass('detalle_venta_default') IS NOT NULL
+                    AND to_regclass('movimiento_inventario_default') IS NOT NULL
+        """)).one()
+        if not all(integridad):
+            problemas.append(
+                "base particionada sin registro de números de venta o sin particiones DEFAULT "
+                "(db_info/create_particiones_integridad.sql)"
+            )
+        return problemas
+
+    def filas_en_default(self, db: Session) -> Dict[str, int]:
+        """
+        Filas que cayeron en cada partición DEFAULT (meses sin partición propia)
+        """
+        resultado = {}
+        for tabla in TABLAS_PARTICIONADAS:
+            defecto = f"{tabla}_default"
+            if db.execute(text("SELECT to_regclass(:t) IS NOT NULL"), {"t": defecto}).scalar():
+                filas = db.execute(text(f"SELECT COUNT(*) FROM {defecto}")).scalar()
+                if filas:
+                    resultado[defecto] = filas
+        return resultado
+
+    def listar(self, db: Session) -> List[Dict[str, Any]]:
+        """
+        Particiones adjuntas de las tablas particionadas, con su mes (None
+        en las DEFAULT) y tamaño
+        """
+        result = db.execute(text("""
+            SELECT
+                padre.relname AS tabla,
+                hija.relname AS particion,
+                -- NULL para las particiones DEFAULT
+                CASE WHEN hija.relname ~ '_[0-9]{4}_[0-9]{2}$'
+                     THEN to_date(right(hija.relname, 7), 'YYYY_MM') END AS mes,
+                pg_total_relation_size(hija.oid) AS bytes
+            FROM pg_inherits i
+            INNER JOIN pg_class padre ON padre.oid = i.inhparent
+            INNER JOIN pg_class hija ON hija.oid = i.inhrelid
+            WHERE padre.relname = ANY(:tablas)
+              AND padre.relnamespace = 'public'::regnamespace
+            ORDER BY padre.relname, hija.relname
+        """), {"tablas": list(TABLAS_PARTICIONADAS)}).fetchall()
+
+        return [
+            {"tabla": row.tabla, "particion": row.particion, "mes": row.mes, "bytes": row.bytes}
+            for row in result
+        ]
+
+    def archivar(self, db: Session, *, antes_de: date, eliminar: bool = False) -> List[str]:
+        """
+        Separar las particiones de meses anteriores a `antes_de` y moverlas al
+        esquema `archivo` (o borrarlas con eliminar=True). Todo en una
+        transacción; devuelve los nombres de las particiones procesadas.
+        """
+        limite = antes_de.replace(day=1)
+        particiones = [
+            p for p in self.listar(db)
+            if p["mes"] is not None and p["mes"] < limite
+        ]
+        # listar() ordena por tabla; separar en el orden de dependencias
+        particiones.sort(key=lambda p: (TABLAS_PARTICIONADAS.index(p["tabla"]), p["mes"]))
+
+        try:
+            if particiones and not eliminar:
+                db.execute(text(f"CREATE SCHEMA IF NOT EXISTS {ESQUEMA_ARCHIVO}"))
+
+            for p in particiones:
+                db.execute(text(f'ALTER TABLE {p["tabla"]} DETACH PARTITION {p["particion"]}'))
+
+                if p["tabla"] == "detalle_venta":
+                    # La FK separada seguiría apuntando a venta e impediría
+                    # separar luego la partición de venta del mismo mes
+                    claves = db.execute(text("""
+                        SELECT conname FROM pg_constraint
+                        WHERE conrelid = CAST(:particion AS regclass)
+                          AND confrelid = 'venta'::regclass
+                          AND contype = 'f'
+                    """), {"particion": p["particion"]}).scalars().all()
+                    for clave in claves:
+                        db.execute(text(f'ALTER TABLE {p["particion"]} DROP CONSTRAINT "{clave}"'))
+
+                if eliminar:
+                    db.execute(text(f'DROP TABLE {p["particion"]}'))
+                else:
+                    db.execute(text(f'ALTER TABLE {p["particion"]} SET SCHEMA {ESQUEMA_ARCHIVO}'))
+
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        return [p["particion"] for p in particiones]
+
+
+particion = GestorParticiones()
@@ -0,0 +1,274 @@
+"""
+Motor de precios por tipo de cliente (listas precalculadas con NumPy)
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlmodel import Session, text
+
+from app.models import TipoClienteEnum
+
+
+# Segundos entre consultas de cambios de precio (0 consulta en cada uso)
+PRECIOS_REFRESCO_SEGUNDOS = float(os.getenv("PRECIOS_REFRESCO_SEGUNDOS", "5"))
+# Margen hacia atrás en cada consulta de cambios: cubre transacciones que
+# confirmaron después de la consulta anterior con un fecha_actualizacion previo
+PRECIOS_MARGEN = timedelta(seconds=60)
+
+# Claves de configuracion con el descuento (%) de cada tipo de cliente
+PREFIJO_DESCUENTO = "descuento_cliente_"
+
+# Los precios se guardan en centavos (int64) y los descuentos en puntos
+# básicos (1% = 100) para que el redondeo sea exacto
+ESCALA_DESCUENTO = 10000
+
+
+def _centavos(valor: Decimal) -> int:
+    return int((Decimal(valor) * 100).to_integral_value())
+
+
+def _decimal(centavos: int) -> Decimal:
+    return Decimal(int(centavos)).scaleb(-2)
+
+
+def _puntos(porcentaje: Any) -> int:
+    return max(0, min(ESCALA_DESCUENTO, int((Decimal(str(porcentaje)) * 100).to_integral_value())))
+
+
+def _posiciones(ids: np.ndarray, buscados: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (posición en ids, encontrado) de cada id buscado; ids debe estar ordenado
+    """
+    if not len(ids):
+        return np.zeros(len(buscados), dtype=np.int64), np.zeros(len(buscados), dtype=bool)
+    posiciones = np.minimum(np.searchsorted(ids, buscados), len(ids) - 1)
+    return posiciones, ids[posiciones] == buscados
+
+
+class MotorPrecios:
+    """
+    Listas de precios efectivos por tipo de cliente, como arreglos NumPy
+    paralelos a un arreglo ordenado de ids de producto:
+
+        ids      [id1, id2, ...]            int64, ordenado
+        base     [precio_venta en centavos]  int64
+        tipos    {tipo_cliente: [precio con el descuento del tipo]}
+
+    Un carrito se cotiza en una sola pasada vectorizada (searchsorted +
+    aritmética entera). Los cambios de precio_venta se leen por
+    fecha_actualizacion y solo se recalculan las posiciones afectadas.
+    """
+
+    def __init__(self, intervalo: float = PRECIOS_REFRESCO_SEGUNDOS):
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._ids = np.empty(0, dtype=np.int64)
+        self._base = np.empty(0, dtype=np.int64)
+        self._tipos: Dict[str, np.ndarray] = {}
+        self._descuentos: Dict[str, int] = {}
+        self._desde: Optional[datetime] = None
+        self._proxima_consulta = 0.0
+
+    @staticmethod
+    def _aplicar_descuento(base: np.ndarray, puntos: int) -> np.ndarray:
+        # Redondeo a centavos, mitad hacia arriba
+        return (base * (ESCALA_DESCUENTO - puntos) + ESCALA_DESCUENTO // 2) // ESCALA_DESCUENTO
+
+    def _leer_descuentos(self, db: Session) -> Dict[str, int]:
+        valores = {
+            row.clave[len(PREFIJO_DESCUENTO):]: row.valor
+            for row in db.execute(text("""
+                SELECT clave, valor FROM configuracion WHERE clave LIKE :prefijo
+            """), {"prefijo": PREFIJO_DESCUENTO + "%"})
+        }
+        descuentos = {}
+        for tipo in TipoClienteEnum:
+            try:
+                descuentos[tipo.value] = _puntos(valores.get(tipo.value, "0"))
+            except ArithmeticError:
+                print(f"Descuento inválido para clientes {tipo.value}: {valores.get(tipo.value)}")
+                descuentos[tipo.value] = 0
+        return descuentos
+
+    def cargar(self, db: Session) -> None:
+        """
+        Construir todas las listas desde cero
+        """
+        row = db.execute(text("""
+            SELECT COALESCE(array_agg(id ORDER BY id), '{}') AS ids,
+                   COALESCE(array_agg((precio_venta * 100)::bigint ORDER BY id), '{}') AS base,
+                   CURRENT_TIMESTAMP AS ahora
+            FROM producto
+        """)).first()
+        descuentos = self._leer_descuentos(db)
+
+        ids = np.asarray(row.ids, dtype=np.int64)
+        base = np.asarray(row.base, dtype=np.int64)
+        tipos = {tipo: self._aplicar_descuento(base, puntos) for tipo, puntos in descuentos.items()}
+
+        with self._lock:
+            self._ids, self._base, self._tipos = ids, base, tipos
+            self._descuentos = descuentos
+            self._desde = row.ahora
+            self._proxima_consulta = time.monotonic() + self.intervalo
+
+    def _actualizar(self, cambios_ids: np.ndarray, cambios_base: np.ndarray) -> None:
+        """
+        Aplicar precios nuevos: en su lugar si el producto ya está, y con una
+        inserción ordenada si es nuevo. Se construyen arreglos nuevos y se
+        reemplazan de una vez, así los lectores nunca ven un estado mezclado.
+        """
+        with self._lock:
+            ids, base = self._ids, self._base.copy()
+            posiciones, existe = _posiciones(ids, cambios_ids)
+
+            base[posiciones[existe]] = cambios_base[existe]
+            tipos = {tipo: lista.copy() for tipo, lista in self._tipos.items()}
+            for tipo, puntos in self._descuentos.items():
+                tipos[tipo][posiciones[existe]] = self._aplicar_descuento(cambios_base[existe], puntos)
+
+            if not existe.all():
+                nuevos_ids = cambios_ids[~existe]
+                nuevos_base = cambios_base[~existe]
+                donde = np.searchsorted(ids, nuevos_ids)
+                ids = np.insert(ids, donde, nuevos_ids)
+                base = np.insert(base, donde, nuevos_base)
+                for tipo, puntos in self._descuentos.items():
+                    tipos[tipo] = np.insert(tipos[tipo], donde, self._aplicar_descuento(nuevos_base, puntos))
+
+            self._ids, self._base, self._tipos = ids, base, tipos
+
+    def refrescar(self, db: Session, *, forzar: bool = False) -> None:
+        """
+        Aplicar los cambios de precio_venta y de descuentos por tipo
+        ocurridos desde la última consulta (como mucho una vez cada
+        `intervalo` segundos salvo con forzar)
+        """
+        with self._lock:
+            desde = self._desde
+            if desde is not None and not forzar and time.monotonic() < self._proxima_consulta:
+                return
+            self._proxima_consulta = time.monotonic() + self.intervalo
+
+        if desde is None:
+            self.cargar(db)
+            return
+
+        row = db.execute(text("""
+            SELECT COALESCE(array_agg(id ORDER BY id), '{}') AS ids,
+                   COALESCE(array_agg((precio_venta * 100)::bigint ORDER BY id), '{}') AS base,
+                   (SELECT COUNT(*) FROM configuracion
+                    WHERE clave LIKE :prefijo AND fecha_actualizacion >= :desde) AS descuentos,
+                   CURRENT_TIMESTAMP AS ahora
+            FROM producto
+            WHERE fecha_actualizacion >= :desde
+        """), {
+            "desde": desde - PRECIOS_MARGEN,
+            "prefijo": PREFIJO_DESCUENTO + "%",
+        }).first()
+
+        if row.descuentos and self._leer_descuentos(db) != self._descuentos:
+            # Cambió el descuento de un tipo: se recalculan todas las listas
+            self.cargar(db)
+            return
+
+        if row.ids:
+            self._actualizar(np.asarray(row.ids, dtype=np.int64), np.asarray(row.base, dtype=np.int64))
+        with self._lock:
+            self._desde = row.ahora
+
+    def descuento_cliente(self, cliente: Optional[Dict[str, Any]]) -> Tuple[Optional[str], int]:
+        """
+        (tipo con lista precalculada, puntos básicos) del cliente. El tipo es
+        None cuando el descuento propio del cliente supera al de su tipo.
+        """
+        tipo = (cliente or {}).get("tipo_cliente") or TipoClienteEnum.REGULAR.value
+        tipo = getattr(tipo, "value", tipo)
+        puntos_tipo = self._descuentos.get(tipo, 0)
+        propio = _puntos((cliente or {}).get("descuento_aplicable") or 0)
+        if propio > puntos_tipo:
+            return None, propio
+        return tipo, puntos_tipo
+
+    def cotizar(
+        self,
+        db: Session,
+        items: List[Tuple[int, int]],
+        *,
+        cliente: Optional[Dict[str, Any]] = None,
+        precios_lista: Optional[Dict[int, Decimal]] = None
+    ) -> Dict[str, Any]:
+        """
+        Precio de lista, precio efectivo, descuento unitario y subtotal de
+        cada línea [(producto_id, cantidad), ...] y los totales del carrito.
+
+        `precios_lista` permite pasar precio_venta recién leído (por ejemplo
+        bloqueado con FOR UPDATE en el checkout): se usa en lugar de la lista
+        en memoria y de paso la actualiza.
+        """
+        self.refrescar(db)
+        if precios_lista:
+            cambios_ids = np.fromiter(precios_lista.keys(), dtype=np.int64, count=len(precios_lista))
+            cambios_base = np.fromiter(
+                (_centavos(precio) for precio in precios_lista.values()), dtype=np.int64, count=len(precios_lista)
+            )
+            orden = np.argsort(cambios_ids)
+            cambios_ids, cambios_base = cambios_ids[orden], cambios_base[orden]
+            # Solo se reescriben las listas si algún precio realmente cambió
+            with self._lock:
+                ids, base = self._ids, self._base
+            posiciones, existe = _posiciones(ids, cambios_ids)
+            distinto = ~existe | (base[posiciones] != cambios_base) if len(ids) else ~existe
+            if distinto.any():
+                self._actualizar(cambios_ids[distinto], cambios_base[distinto])
+
+        with self._lock:
+            ids, base, tipos = self._ids, self._base, self._tipos
+        tipo, puntos = self.descuento_cliente(cliente)
+
+        producto_ids = np.fromiter((producto_id for producto_id, _ in items), dtype=np.int64, count=len(items))
+        cantidades = np.fromiter((cantidad for _, cantidad in items), dtype=np.int64, count=len(items))
+
+        posiciones, encontrado = _posiciones(ids, producto_ids)
+        if not len(ids):
+            # Catálogo vacío: ninguna línea tiene precio
+            base = np.zeros(1, dtype=np.int64)
+            tipos = {tipo: base}
+
+        lista = np.where(encontrado, base[posiciones], 0)
+        if tipo is not None:
+            efectivo = np.where(encontrado, tipos[tipo][posiciones], 0)
+        else:
+            efectivo = self._aplicar_descuento(lista, puntos)
+        subtotales = efectivo * cantidades
+
+        lineas = {
+            int(producto_id): {
+                "precio_lista": _decimal(precio_lista),
+                "precio": _decimal(precio),
+                "descuento_unitario": _decimal(precio_lista - precio),
+                "subtotal": _decimal(subtotal),
+            }
+            for producto_id, precio_lista, precio, subtotal, ok in zip(
+                producto_ids.tolist(), lista.tolist(), efectivo.tolist(), subtotales.tolist(), encontrado.tolist()
+            )
+            if ok
+        }
+        subtotal_lista = int((lista * cantidades).sum())
+        total = int(subtotales.sum())
+        return {
+            "lineas": lineas,
+            "subtotal": _decimal(subtotal_lista),
+            "descuento": _decimal(subtotal_lista - total),
+            "total": _decimal(total),
+            "descuento_porcentaje": _decimal(puntos),
+        }
+
+
+precios = MotorPrecios()
@@ -2,13 +2,15 @@
 CRUD operations para Productos
 """
 
-from typing import List, Optional, Sequence
+from typing import Any, Dict, List, Optional, Sequence
 from decimal import Decimal
 from sqlmodel import Session, select, and_, or_, column, func, text
 
 
 
+from app.core.vuelo_unico import coalescido
 from app.crud.base import CRUDBase
+from app.crud.ranking import ranking
 from app.models import Producto, ProductoCreate, ProductoUpdate
 
 
@@ -124,6 +126,7 @@ class CRUDProducto(CRUDBase[Producto, ProductoCreate, ProductoUpdate]):
             return producto
         return None  # No hay suficiente stock
 
+    @coalescido
     def buscar_por_termino(
         self, 
         db: Session, 
@@ -144,15 +147,20 @@ class CRUDProducto(CRUDBase[Producto, ProductoCreate, ProductoUpdate]):
         return list({"id": product.id, "nombre": product.nombre, "precio": product.precio_venta, "imagen_url": product.imagen_url} for product in result)
 
 
-    def get_mas_vendidos(self, db: Session, *, limit: int = 10) -> List[Producto]:
+    def get_mas_vendidos(
+        self,
+        db: Session,
+        *,
+        limit: int = 10,
+        ventana: str = "7d",
+        categoria_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
         """
-        Obtener productos más vendidos
+        Obtener productos más vendidos en una ventana (hoy, 7d, 30d),
+        globales o del subárbol de una categoría. Se sirven desde el
+        ranking precalculado en memoria.
         """
-        # Esta consulta requeriría JOIN con DetalleVenta
-        # Por ahora retornamos productos activos
-        statement = select(Producto).where(Producto.activo == True).limit(limit)
-        result = db.exec(statement).all()
-        return list(result)
+        return ranking.top_productos(db, ventana=ventana, categoria_id=categoria_id, limite=limit)
 
     def verificar_disponibilidad(
         self, 
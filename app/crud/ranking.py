@@ -0,0 +1,114 @@
+"""
+Ranking de productos más vendidos con caché en memoria
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, text
+
+from app.core.database import engine
+
+
+VENTANAS_RANKING = ("hoy", "7d", "30d")
+
+# Segundos que el ranking vive en memoria (y edad máxima de producto_ranking)
+RANKING_TTL_SEGUNDOS = int(os.getenv("RANKING_TTL_SEGUNDOS", "60"))
+# Productos que se guardan por ventana y categoría
+RANKING_TOP = int(os.getenv("RANKING_TOP", "20"))
+
+
+class RankingProductos:
+    """
+    Caché por proceso de la tabla producto_ranking
+    (ver db_info/create_ranking_productos.sql).
+
+    La lectura es una búsqueda en un diccionario {(ventana, categoria_id): [...]}.
+    Al expirar el TTL, un solo hilo refresca la tabla (si está vieja) y la
+    recarga completa; el resto sigue leyendo la copia anterior mientras tanto.
+    El refresco usa su propia conexión y transacción, nunca la sesión de la
+    petición que lo dispara.
+    """
+
+    def __init__(self, bind: Engine = engine, ttl: int = RANKING_TTL_SEGUNDOS, top: int = RANKING_TOP):
+        self.bind = bind
+        self.ttl = ttl
+        self.top = top
+        self._lock = threading.Lock()
+        self._datos: Dict[Tuple[str, int], List[Dict[str, Any]]] = {}
+        self._expira = 0.0
+
+    def _cargar(self) -> Dict[Tuple[str, int], List[Dict[str, Any]]]:
+        with self.bind.begin() as conn:
+            conn.execute(
+                text("SELECT refrescar_ranking_productos(:top, :max_edad)"),
+                {"top": self.top, "max_edad": self.ttl}
+            )
+
+        with self.bind.connect() as conn:
+            result = conn.execute(text("""
+                SELECT r.ventana, r.categoria_id, r.cantidad,
+                       p.id, p.nombre, p.precio_venta, p.imagen_url
+                FROM producto_ranking r
+                INNER JOIN producto p ON p.id = r.producto_id
+                ORDER BY r.ventana, r.categoria_id, r.posicion
+            """)).fetchall()
+
+        datos: Dict[Tuple[str, int], List[Dict[str, Any]]] = {}
+        for row in result:
+            datos.setdefault((row.ventana, row.categoria_id), []).append({
+                "id": row.id,
+                "nombre": row.nombre,
+                "precio": row.precio_venta,
+                "imagen_url": row.imagen_url,
+                "cantidad_vendida": row.cantidad,
+            })
+        return datos
+
+    def _refrescar(self) -> None:
+        # Solo un hilo recarga; los demás devuelven la copia vigente
+        if not self._lock.acquire(blocking=not self._datos):
+            return
+        try:
+            if time.monotonic() < self._expira:
+                return
+            try:
+                self._datos = self._cargar()
+            except Exception as e:
+                print(f"Error al refrescar ranking de productos: {e}")
+            # También tras un error, para no reintentar en cada petición
+            self._expira = time.monotonic() + self.ttl
+        finally:
+            self._lock.release()
+
+    def top_productos(
+        self,
+        db: Session,
+        *,
+        ventana: str = "7d",
+        categoria_id: Optional[int] = None,
+        limite: int = 10
+    ) -> List[Dict[str, Any]]:
+        """
+        Productos más vendidos de una ventana (hoy, 7d, 30d), globales o del
+        subárbol de una categoría. `db` no se usa: el refresco abre su propia
+        conexión para no hacer commit sobre la sesión del llamador.
+        """
+        if ventana not in VENTANAS_RANKING:
+            raise ValueError(f"Ventana inválida: {ventana}")
+
+        if time.monotonic() >= self._expira:
+            self._refrescar()
+
+        return self._datos.get((ventana, categoria_id or 0), [])[:limite]
+
+    def invalidar(self) -> None:
+        """
+        Forzar la recarga en la próxima lectura
+        """
+        self._expira = 0.0
+
+
+ranking = RankingProductos()
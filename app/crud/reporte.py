@@ -0,0 +1,204 @@
+"""
+CRUD operations para reportes sobre los rollups de ventas
+"""
+
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from sqlmodel import Session, text
+
+
+TABLAS_ROLLUP = (
+    "venta_rollup_hora_producto",
+    "venta_rollup_dia_producto",
+    "venta_rollup_dia_metodo_pago",
+)
+
+
+class CRUDReporte:
+    """
+    Lecturas sobre las tablas venta_rollup_* (db_info/create_rollups_ventas.sql).
+    Los rollups solo contienen ventas completadas y se mantienen por triggers;
+    reconstruir_rollups los recalcula desde venta/detalle_venta.
+    """
+
+    def resumen_metodo_pago(
+        self,
+        db: Session,
+        *,
+        fecha_inicio: date,
+        fecha_fin: date
+    ) -> List[Any]:
+        """
+        Filas (metodo_pago, es_total, num_ventas, total, descuento, impuestos,
+        devuelto) de ventas completadas en el rango, leídas del rollup diario.
+        `total` ya descuenta lo devuelto parcialmente.
+        """
+        return db.execute(text("""
+            SELECT
+                metodo_pago::text AS metodo_pago,
+                GROUPING(metodo_pago) AS es_total,
+                COALESCE(SUM(num_ventas), 0) AS num_ventas,
+                COALESCE(SUM(total - devuelto), 0) AS total,
+                COALESCE(SUM(descuento), 0) AS descuento,
+                COALESCE(SUM(impuestos), 0) AS impuestos,
+                COALESCE(SUM(devuelto), 0) AS devuelto
+            FROM venta_rollup_dia_metodo_pago
+            WHERE dia BETWEEN :desde AND :hasta
+            GROUP BY ROLLUP (metodo_pago)
+        """), {"desde": fecha_inicio, "hasta": fecha_fin}).fetchall()
+
+    def ventas_por_producto(
+        self,
+        db: Session,
+        *,
+        fecha_inicio: date,
+        fecha_fin: date,
+        limite: int = 50
+    ) -> List[Dict[str, Any]]:
+        """
+        Productos más vendidos (por cantidad) en un rango de fechas
+        """
+        result = db.execute(text("""
+            SELECT r.producto_id, p.nombre, p.codigo_barras,
+                   r.cantidad, r.importe, r.num_lineas
+            FROM (
+                SELECT producto_id,
+                       SUM(cantidad) AS cantidad,
+                       SUM(importe) AS importe,
+                       SUM(num_lineas) AS num_lineas
+                FROM venta_rollup_dia_producto
+                WHERE dia BETWEEN :desde AND :hasta
+                GROUP BY producto_id
+                HAVING SUM(cantidad) <> 0
+                ORDER BY SUM(cantidad) DESC, producto_id
+                LIMIT :limite
+            ) r
+            INNER JOIN producto p ON p.id = r.producto_id
+            ORDER BY r.cantidad DESC, r.producto_id
+        """), {"desde": fecha_inicio, "hasta": fecha_fin, "limite": limite})
+
+        return [dict(row._mapping) for row in result]
+
+    def ventas_por_hora(
+        self,
+        db: Session,
+        *,
+        fecha: date,
+        producto_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Cantidad e importe vendidos por hora en un día (opcionalmente de un producto)
+        """
+        filtro_producto = "AND producto_id = :producto_id" if producto_id is not None else ""
+        result = db.execute(text(f"""
+            SELECT EXTRACT(HOUR FROM hora)::int AS hora,
+                   SUM(cantidad) AS cantidad,
+                   SUM(importe) AS importe,
+                   SUM(num_lineas) AS num_lineas
+            FROM venta_rollup_hora_producto
+            WHERE hora >= :desde AND hora < :hasta
+              {filtro_producto}
+            GROUP BY 1
+            ORDER BY 1
+        """), {
+            "desde": datetime.combine(fecha, time.min),
+            "hasta": datetime.combine(fecha + timedelta(days=1), time.min),
+            "producto_id": producto_id,
+        })
+
+        return [dict(row._mapping) for row in result]
+
+    def reconstruir_rollups(
+        self,
+        db: Session,
+        *,
+        fecha_inicio: date,
+        fecha_fin: date
+    ) -> Dict[str, int]:
+        """
+        Recalcular los rollups de un rango de días desde las tablas de ventas.
+
+        Idempotente: borra e inserta el rango en una sola transacción. El
+        bloqueo SHARE ROW EXCLUSIVE espera a las ventas en curso y frena los
+        triggers de ventas nuevas hasta el commit, así nada se cuenta dos veces.
+        """
+        desde = datetime.combine(fecha_inicio, time.min)
+        hasta = datetime.combine(fecha_fin + timedelta(days=1), time.min)
+        params = {"desde": desde, "hasta": hasta, "dia_desde": fecha_inicio, "dia_hasta": fecha_fin}
+
+        try:
+            db.execute(text(f"LOCK TABLE {', '.join(TABLAS_ROLLUP)} IN SHARE ROW EXCLUSIVE MODE"))
+
+            db.execute(text(
+                "DELETE FROM venta_rollup_hora_producto WHERE hora >= :desde AND hora < :hasta"
+            ), params)
+            db.execute(text(
+                "DELETE FROM venta_rollup_dia_producto WHERE dia BETWEEN :dia_desde AND :dia_hasta"
+            ), params)
+            db.execute(text(
+                "DELETE FROM venta_rollup_dia_metodo_pago WHERE dia BETWEEN :dia_desde AND :dia_hasta"
+            ), params)
+
+            filas_hora = db.execute(text("""
+                INSERT INTO venta_rollup_hora_producto (hora, producto_id, cantidad, importe, num_lineas)
+                SELECT date_trunc('hour', v.fecha_venta), d.producto_id,
+                       SUM(d.cantidad - d.cantidad_devuelta),
+                       SUM(importe_neto_detalle(d.subtotal, d.cantidad, d.cantidad_devuelta)),
+                       COUNT(*)
+                FROM venta v
+                INNER JOIN detalle_venta d ON d.venta_id = v.id AND d.fecha_venta = v.fecha_venta
+                WHERE v.fecha_venta >= :desde AND v.fecha_venta < :hasta
+                  AND d.fecha_venta >= :desde AND d.fecha_venta < :hasta
+                  AND v.estado = 'completada'
+                GROUP BY 1, 2
+            """), params).rowcount
+
+            filas_dia = db.execute(text("""
+                INSERT INTO venta_rollup_dia_producto (dia, producto_id, cantidad, importe, num_lineas)
+                SELECT hora::date, producto_id, SUM(cantidad), SUM(importe), SUM(num_lineas)
+                FROM venta_rollup_hora_producto
+                WHERE hora >= :desde AND hora < :hasta
+                GROUP BY 1, 2
+            """), params).rowcount
+
+            filas_metodo = db.execute(text("""
+                INSERT INTO venta_rollup_dia_metodo_pago
+                    (dia, metodo_pago, num_ventas, total, descuento, impuestos, devuelto)
+                SELECT v.fecha_venta::date, v.metodo_pago, COUNT(*), SUM(v.total),
+                       SUM(COALESCE(v.descuento, 0)), SUM(COALESCE(v.impuestos, 0)),
+                       COALESCE(SUM(dv.importe), 0)
+                FROM venta v
+                LEFT JOIN LATERAL (
+                    SELECT SUM(d.subtotal - importe_neto_detalle(d.subtotal, d.cantidad, d.cantidad_devuelta)) AS importe
+                    FROM detalle_venta d
+                    WHERE d.venta_id = v.id AND d.fecha_venta = v.fecha_venta AND d.cantidad_devuelta > 0
+                ) dv ON true
+                WHERE v.fecha_venta >= :desde AND v.fecha_venta < :hasta
+                  AND v.estado = 'completada'
+                GROUP BY 1, 2
+            """), params).rowcount
+
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        return {
+            "hora_producto": filas_hora,
+            "dia_producto": filas_dia,
+            "dia_metodo_pago": filas_metodo,
+        }
+
+    def rango_ventas(self, db: Session) -> Optional[Tuple[date, date]]:
+        """
+        Primer y último día con ventas registradas (None si no hay ventas)
+        """
+        row = db.execute(text(
+            "SELECT MIN(fecha_venta)::date AS desde, MAX(fecha_venta)::date AS hasta FROM venta"
+        )).first()
+        if row is None or row.desde is None:
+            return None
+        return row.desde, row.hasta
+
+
+reporte = CRUDReporte()
@@ -2,12 +2,17 @@
 CRUD operations para Ventas
 """
 
-from typing import List, Optional
-from datetime import datetime, date
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime, date, time, timedelta
 from decimal import Decimal
-from sqlmodel import Session, select
+from sqlmodel import Session, select, text
 
 from app.crud.base import CRUDBase
+from app.crud.cola_pedidos import cola_pedidos
+from app.crud.precios import precios
+from app.crud.reporte import reporte
 from app.models import (
     Venta, VentaCreate, VentaUpdate,
     DetalleVenta, DetalleVentaCreate,
@@ -15,6 +20,114 @@ from app.models import (
 )
 
 
+# Cantidad de números que cada proceso reserva por viaje a la base de datos.
+# Cada worker consume su bloque desde memoria: nunca hay duplicados, pero la
+# numeración del día deja huecos (los números que un proceso no llegó a usar
+# al reiniciarse o al cambiar el día) y no sigue el orden de las ventas
+# entre procesos. Con 1 es consecutiva, a costa de un viaje y una conexión
+# extra por venta.
+TAMANO_BLOQUE_NUMEROS = int(os.getenv("VENTA_BLOQUE_NUMEROS", "50"))
+
+# Usuario (cajero) al que se asignan las ventas del checkout web
+CHECKOUT_USUARIO_ID = int(os.getenv("CHECKOUT_USUARIO_ID", "1"))
+
+# Opciones de pago del formulario de checkout -> método de pago de la venta
+METODOS_PAGO_CHECKOUT = {
+    "contra_entrega": MetodoPagoEnum.EFECTIVO,
+    "consignacion": MetodoPagoEnum.TRANSFERENCIA,
+    **{metodo.value: metodo for metodo in MetodoPagoEnum},
+}
+
+
+class AsignadorNumerosVenta:
+    """
+    Asignador de números de venta respaldado por el contador diario
+    `venta_contador` (ver db_info/create_contador_ventas.sql).
+
+    Cada reserva es un único INSERT ... ON CONFLICT DO UPDATE ... RETURNING
+    ejecutado en su propia transacción corta, así el bloqueo de la fila del
+    día no se mantiene durante toda la venta. Con bloques de
+    `tamano_bloque` números esa conexión extra se usa una vez por bloque, y
+    el lock del asignador nunca se retiene durante el viaje a la base: si
+    dos hilos se quedan sin números a la vez ambos reservan, y el bloque
+    sobrante se descarta (deja un hueco).
+
+    El día del número es el de `fecha_venta` (UTC, ver VentaBase), no el
+    reloj local del servidor.
+    """
+
+    def __init__(self, tamano_bloque: int = TAMANO_BLOQUE_NUMEROS):
+        self.tamano_bloque = max(1, tamano_bloque)
+        self._lock = threading.Lock()
+        self._fecha: Optional[date] = None
+        # Bloque en memoria: [_siguiente, _ultimo] (vacío si _siguiente > _ultimo)
+        self._siguiente = 1
+        self._ultimo = 0
+
+    def _reservar_bloque(self, db: Session, fecha: date, cantidad: int) -> int:
+        """
+        Reservar `cantidad` números en el contador; devuelve el último del bloque
+        """
+        with db.get_bind().begin() as conexion:
+            return conexion.execute(
+                text("""
+                    INSERT INTO venta_contador (fecha, ultimo)
+                    VALUES (:fecha, :cantidad)
+                    ON CONFLICT (fecha) DO UPDATE
+                        SET ultimo = venta_contador.ultimo + EXCLUDED.ultimo
+                    RETURNING ultimo
+                """),
+                {"fecha": fecha, "cantidad": cantidad}
+            ).scalar_one()
+
+    def _tomar(self, fecha: date, cantidad: int) -> List[int]:
+        """
+        Tomar hasta `cantidad` números del bloque en memoria (con el lock tomado)
+        """
+        if self._fecha != fecha:
+            return []
+        disponibles = max(0, min(cantidad, self._ultimo - self._siguiente + 1))
+        numeros = list(range(self._siguiente, self._siguiente + disponibles))
+        self._siguiente += disponibles
+        return numeros
+
+    def reservar(self, db: Session, cantidad: int, fecha: Optional[date] = None) -> List[str]:
+        """
+        Obtener `cantidad` números de venta del día `fecha` (por defecto,
+        el día UTC actual)
+        """
+        if fecha is None:
+            fecha = datetime.utcnow().date()
+
+        with self._lock:
+            numeros = self._tomar(fecha, cantidad)
+            # Solo el día más reciente usa bloque; ventas de otros días
+            # (cargas atrasadas) reservan lo justo
+            reciente = self._fecha is None or fecha >= self._fecha
+
+        faltantes = cantidad - len(numeros)
+        if faltantes > 0:
+            tamano = max(faltantes, self.tamano_bloque) if reciente else faltantes
+            ultimo = self._reservar_bloque(db, fecha, tamano)
+            inicio = ultimo - tamano + 1
+            numeros.extend(range(inicio, inicio + faltantes))
+
+            if tamano > faltantes:
+                with self._lock:
+                    # El bloque nuevo reemplaza al que quede (otro hilo pudo
+                    # haber recargado mientras tanto: sus números se pierden)
+                    if self._fecha is None or fecha >= self._fecha:
+                        self._fecha = fecha
+                        self._siguiente = inicio + faltantes
+                        self._ultimo = ultimo
+
+        prefijo = f"V-{fecha.strftime('%Y%m%d')}"
+        return [f"{prefijo}-{numero:04d}" for numero in numeros]
+
+
+asignador_numeros = AsignadorNumerosVenta()
+
+
 class CRUDVenta(CRUDBase[Venta, VentaCreate, VentaUpdate]):
     
     def get_by_numero_venta(self, db: Session, *, numero_venta: str) -> Optional[Venta]:
@@ -32,8 +145,8 @@ class CRUDVenta(CRUDBase[Venta, VentaCreate, VentaUpdate]):
             fecha = date.today()
         
         statement = select(Venta).where(
-            Venta.fecha_venta >= datetime.combine(fecha, datetime.min.time()),
-            Venta.fecha_venta < datetime.combine(fecha, datetime.max.time())
+            Venta.fecha_venta >= datetime.combine(fecha, time.min),
+            Venta.fecha_venta < datetime.combine(fecha + timedelta(days=1), time.min)
         )
         return db.exec(statement).all()
 
@@ -66,11 +179,11 @@ class CRUDVenta(CRUDBase[Venta, VentaCreate, VentaUpdate]):
         
         if fecha_inicio:
             statement = statement.where(
-                Venta.fecha_venta >= datetime.combine(fecha_inicio, datetime.min.time())
+                Venta.fecha_venta >= datetime.combine(fecha_inicio, time.min)
             )
         if fecha_fin:
             statement = statement.where(
-                Venta.fecha_venta <= datetime.combine(fecha_fin, datetime.max.time())
+                Venta.fecha_venta < datetime.combine(fecha_fin + timedelta(days=1), time.min)
             )
             
         return db.exec(statement).all()
@@ -82,13 +195,110 @@ class CRUDVenta(CRUDBase[Venta, VentaCreate, VentaUpdate]):
         statement = select(Venta).where(Venta.estado == estado)
         return db.exec(statement).all()
 
+    def resumen_ventas(
+        self,
+        db: Session,
+        *,
+        fecha_inicio: date,
+        fecha_fin: date,
+        estados: Optional[List[EstadoVentaEnum]] = None
+    ) -> Dict[str, Any]:
+        """
+        Totales, conteos y desglose por método de pago en un rango de fechas
+        (ambos extremos incluidos) calculados en la base de datos con un solo
+        GROUP BY ROLLUP. Por defecto solo considera ventas completadas.
+
+        Para ventas completadas lee el rollup diario por método de pago; otros
+        estados se agregan sobre la tabla venta. Los totales de ventas
+        completadas son netos de devoluciones parciales (`devuelto`).
+        """
+        if estados is None:
+            estados = [EstadoVentaEnum.COMPLETADA]
+
+        if set(estados) == {EstadoVentaEnum.COMPLETADA}:
+            result = reporte.resumen_metodo_pago(db, fecha_inicio=fecha_inicio, fecha_fin=fecha_fin)
+        else:
+            result = self._resumen_ventas_detalle(
+                db, fecha_inicio=fecha_inicio, fecha_fin=fecha_fin, estados=estados
+            )
+
+        resumen: Dict[str, Any] = {
+            "fecha_inicio": fecha_inicio,
+            "fecha_fin": fecha_fin,
+            "estados": [estado.value for estado in estados],
+            "num_ventas": 0,
+            "total": Decimal("0.00"),
+            "descuento": Decimal("0.00"),
+            "impuestos": Decimal("0.00"),
+            "devuelto": Decimal("0.00"),
+            "por_metodo_pago": {
+                metodo.value: {"num_ventas": 0, "total": Decimal("0.00")}
+                for metodo in MetodoPagoEnum
+            },
+        }
+
+        for row in result:
+            if row.es_total:
+                resumen["num_ventas"] = row.num_ventas
+                resumen["total"] = row.total
+                resumen["descuento"] = row.descuento
+                resumen["impuestos"] = row.impuestos
+                resumen["devuelto"] = row.devuelto
+            else:
+                resumen["por_metodo_pago"][row.metodo_pago] = {
+                    "num_ventas": row.num_ventas,
+                    "total": row.total,
+                }
+
+        return resumen
+
+    def _resumen_ventas_detalle(
+        self,
+        db: Session,
+        *,
+        fecha_inicio: date,
+        fecha_fin: date,
+        estados: List[EstadoVentaEnum]
+    ) -> List[Any]:
+        """
+        GROUP BY ROLLUP sobre venta para estados que no tienen rollup. Como
+        en el rollup, a las ventas completadas se les descuenta lo devuelto
+        parcialmente.
+        """
+        # Rango semiabierto sobre la columna para aprovechar idx_venta_fecha_estado
+        return db.execute(text("""
+            SELECT
+                v.metodo_pago::text AS metodo_pago,
+                GROUPING(v.metodo_pago) AS es_total,
+                COUNT(*) AS num_ventas,
+                COALESCE(SUM(v.total - COALESCE(dv.importe, 0)), 0) AS total,
+                COALESCE(SUM(v.descuento), 0) AS descuento,
+                COALESCE(SUM(v.impuestos), 0) AS impuestos,
+                COALESCE(SUM(dv.importe), 0) AS devuelto
+            FROM venta v
+            LEFT JOIN LATERAL (
+                SELECT SUM(d.subtotal - importe_neto_detalle(d.subtotal, d.cantidad, d.cantidad_devuelta)) AS importe
+                FROM detalle_venta d
+                WHERE d.venta_id = v.id AND d.fecha_venta = v.fecha_venta AND d.cantidad_devuelta > 0
+            ) dv ON v.estado = 'completada'
+            WHERE v.fecha_venta >= :desde
+              AND v.fecha_venta < :hasta
+              AND v.estado = ANY(CAST(:estados AS estado_venta_enum[]))
+            GROUP BY ROLLUP (v.metodo_pago)
+        """), {
+            "desde": datetime.combine(fecha_inicio, time.min),
+            "hasta": datetime.combine(fecha_fin + timedelta(days=1), time.min),
+            "estados": [estado.value for estado in estados],
+        }).fetchall()
+
     def calcular_total_ventas_dia(self, db: Session, *, fecha: date = None) -> Decimal:
         """
         Calcular total de ventas del día
         """
-        ventas = self.get_ventas_del_dia(db, fecha=fecha)
-        total = sum(venta.total for venta in ventas if venta.estado == EstadoVentaEnum.COMPLETADA)
-        return Decimal(str(total))
+        if fecha is None:
+            fecha = date.today()
+        resumen = self.resumen_ventas(db, fecha_inicio=fecha, fecha_fin=fecha)
+        return Decimal(str(resumen["total"]))
 
     def calcular_total_por_metodo_pago(
         self, 
@@ -99,43 +309,134 @@ class CRUDVenta(CRUDBase[Venta, VentaCreate, VentaUpdate]):
         """
         Calcular totales por método de pago del día
         """
-        ventas = self.get_ventas_del_dia(db, fecha=fecha)
-        totales = {
-            MetodoPagoEnum.EFECTIVO: Decimal('0.00'),
-            MetodoPagoEnum.TARJETA: Decimal('0.00'),
-            MetodoPagoEnum.TRANSFERENCIA: Decimal('0.00'),
-            MetodoPagoEnum.CREDITO: Decimal('0.00')
+        if fecha is None:
+            fecha = date.today()
+        resumen = self.resumen_ventas(db, fecha_inicio=fecha, fecha_fin=fecha)
+        return {
+            metodo: Decimal(str(resumen["por_metodo_pago"][metodo.value]["total"]))
+            for metodo in MetodoPagoEnum
         }
-        
-        for venta in ventas:
-            if venta.estado == EstadoVentaEnum.COMPLETADA:
-                totales[venta.metodo_pago] += venta.total
-                
-        return totales
 
-    def generar_numero_venta(self, db: Session) -> str:
+    def generar_numero_venta(self, db: Session, *, fecha: Optional[date] = None) -> str:
         """
-        Generar número de venta automático
+        Generar número de venta automático para el día `fecha` (UTC)
         Formato: V-YYYYMMDD-NNNN
         """
-        hoy = date.today()
-        prefijo = f"V-{hoy.strftime('%Y%m%d')}"
-        
-        # Buscar el último número del día
-        statement = select(Venta).where(
-            Venta.numero_venta.startswith(prefijo)
-        ).order_by(Venta.numero_venta.desc())
-        
-        ultima_venta = db.exec(statement).first()
-        
-        if ultima_venta:
-            # Extraer el número secuencial
-            ultimo_numero = int(ultima_venta.numero_venta.split('-')[-1])
-            nuevo_numero = ultimo_numero + 1
-        else:
-            nuevo_numero = 1
-            
-        return f"{prefijo}-{nuevo_numero:04d}"
+        return asignador_numeros.reservar(db, 1, fecha)[0]
+
+    def reservar_numeros_venta(self, db: Session, *, cantidad: int, fecha: Optional[date] = None) -> List[str]:
+        """
+        Reservar varios números de venta del día `fecha` de una vez (ventas en lote)
+        """
+        return asignador_numeros.reservar(db, cantidad, fecha)
+
+    def insertar_ventas(
+        self,
+        db: Session,
+        *,
+        ventas: List[Tuple[VentaCreate, List[DetalleVentaCreate]]]
+    ) -> List[Venta]:
+        """
+        Insertar encabezados y detalles de varias ventas SIN hacer commit.
+
+        Usa dos statements sin importar el número de ventas: un INSERT
+        multi-fila de encabezados con RETURNING id y otro con todos los
+        detalles. El llamador decide cuándo confirmar la transacción.
+        """
+        if not ventas:
+            return []
+
+        encabezados = [venta_data.model_dump() for venta_data, _ in ventas]
+
+        # Reservar de una vez los números que falten, con el día de cada
+        # fecha_venta para que número y fecha coincidan
+        sin_numero: Dict[date, List[Dict[str, Any]]] = {}
+        for datos in encabezados:
+            if not datos["numero_venta"]:
+                sin_numero.setdefault(datos["fecha_venta"].date(), []).append(datos)
+        for fecha, pendientes in sin_numero.items():
+            numeros = self.reservar_numeros_venta(db, cantidad=len(pendientes), fecha=fecha)
+            for datos, numero in zip(pendientes, numeros):
+                datos["numero_venta"] = numero
+
+        columnas = {
+            columna: [datos[columna] for datos in encabezados]
+            for columna in (
+                "numero_venta", "cliente_id", "usuario_id", "fecha_venta", "subtotal",
+                "descuento", "impuestos", "total", "observaciones", "caja_id"
+            )
+        }
+        columnas["metodo_pago"] = [datos["metodo_pago"].value for datos in encabezados]
+        columnas["estado"] = [datos["estado"].value for datos in encabezados]
+
+        result = db.execute(text("""
+            INSERT INTO venta (
+                numero_venta, cliente_id, usuario_id, fecha_venta, subtotal,
+                descuento, impuestos, total, metodo_pago, estado, observaciones, caja_id
+            )
+            SELECT
+                v.numero_venta, v.cliente_id, v.usuario_id, v.fecha_venta, v.subtotal,
+                v.descuento, v.impuestos, v.total, v.metodo_pago::metodo_pago_enum,
+                v.estado::estado_venta_enum, v.observaciones, v.caja_id
+            FROM unnest(
+                CAST(:numero_venta AS VARCHAR[]),
+                CAST(:cliente_id AS INTEGER[]),
+                CAST(:usuario_id AS INTEGER[]),
+                CAST(:fecha_venta AS TIMESTAMP[]),
+                CAST(:subtotal AS DECIMAL[]),
+                CAST(:descuento AS DECIMAL[]),
+                CAST(:impuestos AS DECIMAL[]),
+                CAST(:total AS DECIMAL[]),
+                CAST(:metodo_pago AS TEXT[]),
+                CAST(:estado AS TEXT[]),
+                CAST(:observaciones AS TEXT[]),
+                CAST(:caja_id AS INTEGER[])
+            ) AS v(
+                numero_venta, cliente_id, usuario_id, fecha_venta, subtotal,
+                descuento, impuestos, total, metodo_pago, estado, observaciones, caja_id
+            )
+            RETURNING id, numero_venta, fecha_venta
+        """), columnas).all()
+        ids = {row.numero_venta: row.id for row in result}
+        fechas = {row.numero_venta: row.fecha_venta for row in result}
+
+        # Todos los detalles de todas las ventas en un solo INSERT; llevan la
+        # fecha de su venta porque es la clave de partición de detalle_venta
+        detalles_columnas = {
+            "venta_id": [], "fecha_venta": [], "producto_id": [], "cantidad": [],
+            "precio_unitario": [], "descuento_unitario": [], "subtotal": []
+        }
+        for datos, (_, detalles) in zip(encabezados, ventas):
+            venta_id = ids[datos["numero_venta"]]
+            fecha_venta = fechas[datos["numero_venta"]]
+            for detalle in detalles:
+                detalles_columnas["venta_id"].append(venta_id)
+                detalles_columnas["fecha_venta"].append(fecha_venta)
+                detalles_columnas["producto_id"].append(detalle.producto_id)
+                detalles_columnas["cantidad"].append(detalle.cantidad)
+                detalles_columnas["precio_unitario"].append(detalle.precio_unitario)
+                detalles_columnas["descuento_unitario"].append(detalle.descuento_unitario)
+                detalles_columnas["subtotal"].append(detalle.subtotal)
+
+        if detalles_columnas["venta_id"]:
+            db.execute(text("""
+                INSERT INTO detalle_venta (
+                    venta_id, fecha_venta, producto_id, cantidad,
+                    precio_unitario, descuento_unitario, subtotal
+                )
+                SELECT * FROM unnest(
+                    CAST(:venta_id AS INTEGER[]),
+                    CAST(:fecha_venta AS TIMESTAMP[]),
+                    CAST(:producto_id AS INTEGER[]),
+                    CAST(:cantidad AS DECIMAL[]),
+                    CAST(:precio_unitario AS DECIMAL[]),
+                    CAST(:descuento_unitario AS DECIMAL[]),
+                    CAST(:subtotal AS DECIMAL[])
+                )
+            """), detalles_columnas)
+
+        # Objetos en memoria: no hace falta otro SELECT para devolverlos
+        return [Venta(id=ids[datos["numero_venta"]], **datos) for datos in encabezados]
 
     def crear_venta_completa(
         self,
@@ -145,41 +446,409 @@ class CRUDVenta(CRUDBase[Venta, VentaCreate, VentaUpdate]):
         detalles: List[DetalleVentaCreate]
     ) -> Venta:
         """
-        Crear una venta completa con sus detalles
+        Crear una venta completa con sus detalles en una sola transacción
         """
-        # Generar número de venta si no existe
-        if not venta_data.numero_venta:
-            venta_data.numero_venta = self.generar_numero_venta(db)
-        
-        # Crear la venta
-        venta = self.create(db, obj_in=venta_data)
-        
-        # Crear los detalles
-        for detalle_data in detalles:
-            detalle_data.venta_id = venta.id
-            detalle = DetalleVenta.model_validate(detalle_data)
-            db.add(detalle)
-        
-        db.commit()
-        db.refresh(venta)
+        try:
+            venta = self.insertar_ventas(db, ventas=[(venta_data, detalles)])[0]
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
         return venta
 
-    def cancelar_venta(self, db: Session, *, venta_id: int) -> Optional[Venta]:
+    def crear_ventas_lote(
+        self,
+        db: Session,
+        *,
+        ventas: List[Tuple[VentaCreate, List[DetalleVentaCreate]]]
+    ) -> List[Venta]:
         """
-        Cancelar una venta (cambiar estado y restaurar stock)
+        Registrar muchas ventas a la vez (por ejemplo, las que una caja
+        acumuló sin conexión) en una sola transacción
         """
-        venta = self.get(db, venta_id)
-        if venta and venta.estado == EstadoVentaEnum.COMPLETADA:
-            venta.estado = EstadoVentaEnum.CANCELADA
-            
-            # TODO: Restaurar stock de los productos
-            # Esto requeriría acceso al CRUD de productos
-            
-            db.add(venta)
+        try:
+            creadas = self.insertar_ventas(db, ventas=ventas)
             db.commit()
-            db.refresh(venta)
-            
-        return venta
+        except Exception:
+            db.rollback()
+            raise
+        return creadas
+
+    def metodo_pago_checkout(self, opcion: Optional[str]) -> MetodoPagoEnum:
+        """
+        Método de pago de la venta para una opción del formulario de checkout
+        """
+        return METODOS_PAGO_CHECKOUT.get(opcion or "", MetodoPagoEnum.EFECTIVO)
+
+    def checkout(
+        self,
+        db: Session,
+        *,
+        items: List[Tuple[int, int]],
+        metodo_pago: MetodoPagoEnum = MetodoPagoEnum.EFECTIVO,
+        usuario_id: int = CHECKOUT_USUARIO_ID,
+        observaciones: Optional[str] = None,
+        tareas: Optional[List[Tuple[str, Dict[str, Any]]]] = None,
+        cliente: Optional[Dict[str, Any]] = None,
+        confirmar: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Validar un carrito [(producto_id, cantidad), ...] y registrar la venta
+        en una sola transacción con un número fijo de viajes a la base:
+        un SELECT ... FOR UPDATE de todos los productos (que reserva su stock
+        hasta el commit), la conciliación de precios y stock en memoria y
+        los INSERT de insertar_ventas.
+
+        Se usan los precios actuales con el descuento del tipo de `cliente`
+        (ver precios.cotizar), que debe ser un cliente autenticado: nunca uno
+        deducido de datos del formulario. Los productos inactivos o sin stock se
+        descartan y las cantidades mayores al stock se recortan (ver `ajustes`).
+        Lanza ValueError si no queda ningún producto válido.
+
+        `tareas` [(tipo, payload), ...] se encolan en cola_pedidos dentro de
+        la misma transacción (con numero_venta y total agregados al payload)
+        para que los workers hagan el resto fuera de la petición.
+
+        Con `confirmar=False` no hace commit ni rollback: la transacción es
+        del llamador, que registró otra cosa en ella y decide qué deshacer
+        ante un error (ver idempotencia.ejecutar, que usa un savepoint).
+        """
+        # Agrupar líneas repetidas del mismo producto
+        cantidades: Dict[int, int] = {}
+        for producto_id, cantidad in items:
+            if cantidad > 0:
+                cantidades[producto_id] = cantidades.get(producto_id, 0) + cantidad
+        if not cantidades:
+            raise ValueError("No hay productos en el carrito")
+
+        try:
+            productos = {
+                row.id: row
+                for row in db.execute(text("""
+                    SELECT id, nombre, precio_venta, COALESCE(stock_actual, 0) AS stock_actual
+                    FROM producto
+                    WHERE id = ANY(:ids) AND activo = true
+                    ORDER BY id
+                    FOR UPDATE
+                """), {"ids": list(cantidades)})
+            }
+
+            lineas = []
+            ajustes = []
+            for producto_id, solicitada in cantidades.items():
+                producto = productos.get(producto_id)
+                if producto is None:
+                    ajustes.append({"producto_id": producto_id, "solicitada": solicitada, "cantidad": 0,
+                                    "motivo": "no encontrado o inactivo"})
+                    continue
+
+                cantidad = min(solicitada, max(0, int(producto.stock_actual)))
+                if cantidad < solicitada:
+                    ajustes.append({"producto_id": producto_id, "solicitada": solicitada, "cantidad": cantidad,
+                                    "motivo": "stock insuficiente"})
+                if cantidad == 0:
+                    continue
+
+                lineas.append({"id": producto.id, "name": producto.nombre, "quantity": cantidad})
+
+            if not lineas:
+                raise ValueError("No hay productos válidos en el carrito")
+
+            # Todo el carrito en una pasada, con los precios recién bloqueados
+            cotizacion = precios.cotizar(
+                db,
+                [(linea["id"], linea["quantity"]) for linea in lineas],
+                cliente=cliente,
+                precios_lista={linea["id"]: productos[linea["id"]].precio_venta for linea in lineas}
+            )
+            for linea in lineas:
+                precio = cotizacion["lineas"][linea["id"]]
+                linea.update({
+                    "price": precio["precio"],
+                    "list_price": precio["precio_lista"],
+                    "discount": precio["descuento_unitario"],
+                    "item_total": precio["subtotal"],
+                })
+
+            total = cotizacion["total"]
+            venta_data = VentaCreate(
+                numero_venta="",
+                cliente_id=cliente["id"] if cliente else None,
+                usuario_id=usuario_id,
+                subtotal=cotizacion["subtotal"],
+                descuento=cotizacion["descuento"],
+                total=total,
+                metodo_pago=metodo_pago,
+                observaciones=observaciones
+            )
+            detalles = [
+                DetalleVentaCreate(
+                    venta_id=0,
+                    producto_id=linea["id"],
+                    cantidad=Decimal(linea["quantity"]),
+                    precio_unitario=linea["list_price"],
+                    descuento_unitario=linea["discount"],
+                    subtotal=linea["item_total"]
+                )
+                for linea in lineas
+            ]
+            venta = self.insertar_ventas(db, ventas=[(venta_data, detalles)])[0]
+            for tipo, payload in tareas or []:
+                cola_pedidos.encolar(
+                    db,
+                    tipo=tipo,
+                    venta_id=venta.id,
+                    payload={**payload, "numero_venta": venta.numero_venta, "total": total}
+                )
+            if confirmar:
+                db.commit()
+        except Exception:
+            if confirmar:
+                db.rollback()
+            raise
+
+        return {"venta": venta, "items": lineas, "total": total, "ajustes": ajustes}
+
+    def _bloquear_venta_completada(self, db: Session, venta_id: int) -> Any:
+        """
+        Bloquear la venta (FOR UPDATE) y verificar que esté completada
+        """
+        row = db.execute(text("""
+            SELECT id, usuario_id, fecha_venta, estado::text AS estado
+            FROM venta
+            WHERE id = :venta_id
+            FOR UPDATE
+        """), {"venta_id": venta_id}).first()
+
+        if row is None:
+            raise ValueError(f"Venta {venta_id} no encontrada")
+        if row.estado != EstadoVentaEnum.COMPLETADA.value:
+            raise ValueError(f"La venta {venta_id} está {row.estado}, solo se pueden anular ventas completadas")
+        return row
+
+    def _restaurar_stock(
+        self,
+        db: Session,
+        *,
+        productos: List[int],
+        cantidades: List[Decimal],
+        usuario_id: int,
+        referencia: str,
+        motivo: Optional[str]
+    ) -> int:
+        """
+        Devolver al stock las cantidades indicadas con un solo UPDATE agregado
+        por producto y registrar los movimientos ENTRADA en el mismo statement.
+        Devuelve el número de productos afectados.
+        """
+        if not productos:
+            return 0
+
+        return db.execute(text("""
+            WITH devolucion AS (
+                SELECT producto_id, SUM(cantidad) AS cantidad
+                FROM unnest(CAST(:productos AS INTEGER[]), CAST(:cantidades AS DECIMAL[]))
+                    AS l(producto_id, cantidad)
+                GROUP BY producto_id
+                HAVING SUM(cantidad) > 0
+            ),
+            anterior AS (
+                SELECT p.id, p.stock_actual AS stock_anterior, d.cantidad
+                FROM producto p
+                INNER JOIN devolucion d ON d.producto_id = p.id
+                FOR UPDATE OF p
+            ),
+            restaurado AS (
+                UPDATE producto p
+                SET stock_actual = a.stock_anterior + a.cantidad::INTEGER
+                FROM anterior a
+                WHERE p.id = a.id
+                RETURNING p.id, a.stock_anterior, p.stock_actual AS stock_nuevo, a.cantidad
+            )
+            INSERT INTO movimiento_inventario (
+                producto_id, tipo_movimiento, cantidad, stock_anterior,
+                stock_nuevo, referencia, motivo, usuario_id
+            )
+            SELECT id, 'entrada', cantidad, stock_anterior,
+                   stock_nuevo, :referencia, :motivo, :usuario_id
+            FROM restaurado
+        """), {
+            "productos": productos,
+            "cantidades": cantidades,
+            "referencia": referencia,
+            "motivo": motivo,
+            "usuario_id": usuario_id,
+        }).rowcount
+
+    def _anular_venta(
+        self,
+        db: Session,
+        *,
+        venta_id: int,
+        estado: EstadoVentaEnum,
+        prefijo_referencia: str,
+        usuario_id: Optional[int],
+        motivo: Optional[str]
+    ) -> Dict[str, Any]:
+        """
+        Restaurar el stock pendiente de todas las líneas y cambiar el estado
+        de la venta, en una sola transacción
+        """
+        try:
+            venta_row = self._bloquear_venta_completada(db, venta_id)
+
+            # Lo ya devuelto parcialmente volvió al stock en su momento
+            lineas = db.execute(text("""
+                SELECT producto_id, SUM(cantidad - cantidad_devuelta) AS cantidad
+                FROM detalle_venta
+                WHERE venta_id = :venta_id AND fecha_venta = :fecha_venta
+                GROUP BY producto_id
+            """), {"venta_id": venta_id, "fecha_venta": venta_row.fecha_venta}).fetchall()
+
+            productos_restaurados = self._restaurar_stock(
+                db,
+                productos=[row.producto_id for row in lineas],
+                cantidades=[row.cantidad for row in lineas],
+                usuario_id=usuario_id or venta_row.usuario_id,
+                referencia=f"{prefijo_referencia}-{venta_id}",
+                motivo=motivo
+            )
+
+            db.execute(text("""
+                UPDATE venta SET estado = CAST(:estado AS estado_venta_enum)
+                WHERE id = :venta_id AND fecha_venta = :fecha_venta
+            """), {"estado": estado.value, "venta_id": venta_id, "fecha_venta": venta_row.fecha_venta})
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        return {
+            "venta_id": venta_id,
+            "estado": estado.value,
+            "productos_restaurados": productos_restaurados,
+        }
+
+    def cancelar_venta(
+        self,
+        db: Session,
+        *,
+        venta_id: int,
+        usuario_id: Optional[int] = None,
+        motivo: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Cancelar una venta completada: restaura el stock de todas sus líneas
+        y la marca como CANCELADA en una sola transacción.
+        Lanza ValueError si la venta no existe o no está completada.
+        """
+        return self._anular_venta(
+            db,
+            venta_id=venta_id,
+            estado=EstadoVentaEnum.CANCELADA,
+            prefijo_referencia="CANCELACION",
+            usuario_id=usuario_id,
+            motivo=motivo
+        )
+
+    def devolver_venta(
+        self,
+        db: Session,
+        *,
+        venta_id: int,
+        lineas: Optional[Dict[int, Decimal]] = None,
+        usuario_id: Optional[int] = None,
+        motivo: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Registrar la devolución de una venta completada.
+
+        Sin `lineas` se devuelve todo lo pendiente y la venta pasa a DEVUELTA.
+        Con `lineas` ({detalle_venta_id: cantidad}) la devolución es parcial:
+        se acumula en detalle_venta.cantidad_devuelta (los triggers de rollup
+        lo restan de los reportes por producto y lo suman a `devuelto` del
+        rollup por método de pago) y la venta pasa a DEVUELTA solo cuando ya
+        no queda nada por devolver.
+        Lanza ValueError si alguna cantidad excede lo pendiente de su línea.
+        """
+        if not lineas:
+            return self._anular_venta(
+                db,
+                venta_id=venta_id,
+                estado=EstadoVentaEnum.DEVUELTA,
+                prefijo_referencia="DEVOLUCION",
+                usuario_id=usuario_id,
+                motivo=motivo
+            )
+
+        detalle_ids = list(lineas.keys())
+        cantidades = [Decimal(str(cantidad)) for cantidad in lineas.values()]
+        if any(cantidad <= 0 for cantidad in cantidades):
+            raise ValueError("Las cantidades a devolver deben ser positivas")
+
+        try:
+            venta_row = self._bloquear_venta_completada(db, venta_id)
+
+            devueltas = db.execute(text("""
+                UPDATE detalle_venta d
+                SET cantidad_devuelta = d.cantidad_devuelta + s.cantidad
+                FROM unnest(CAST(:detalle_ids AS INTEGER[]), CAST(:cantidades AS DECIMAL[]))
+                    AS s(id, cantidad)
+                WHERE d.id = s.id
+                  AND d.venta_id = :venta_id
+                  AND d.fecha_venta = :fecha_venta
+                  AND d.cantidad_devuelta + s.cantidad <= d.cantidad
+                RETURNING d.id, d.producto_id, s.cantidad,
+                          ROUND(d.subtotal * s.cantidad / d.cantidad, 2) AS importe
+            """), {
+                "detalle_ids": detalle_ids,
+                "cantidades": cantidades,
+                "venta_id": venta_id,
+                "fecha_venta": venta_row.fecha_venta,
+            }).fetchall()
+
+            if len(devueltas) != len(detalle_ids):
+                aceptadas = {row.id for row in devueltas}
+                rechazadas = [detalle_id for detalle_id in detalle_ids if detalle_id not in aceptadas]
+                raise ValueError(
+                    f"Líneas inválidas o con cantidad mayor a la pendiente: {rechazadas}"
+                )
+
+            productos_restaurados = self._restaurar_stock(
+                db,
+                productos=[row.producto_id for row in devueltas],
+                cantidades=[row.cantidad for row in devueltas],
+                usuario_id=usuario_id or venta_row.usuario_id,
+                referencia=f"DEVOLUCION-{venta_id}",
+                motivo=motivo
+            )
+
+            # Pasa a DEVUELTA si ya no queda nada pendiente
+            estado = db.execute(text("""
+                UPDATE venta
+                SET estado = 'devuelta'
+                WHERE id = :venta_id
+                  AND fecha_venta = :fecha_venta
+                  AND NOT EXISTS (
+                      SELECT 1 FROM detalle_venta
+                      WHERE venta_id = :venta_id
+                        AND fecha_venta = :fecha_venta
+                        AND cantidad_devuelta < cantidad
+                  )
+                RETURNING estado::text
+            """), {"venta_id": venta_id, "fecha_venta": venta_row.fecha_venta}).scalar()
+
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        return {
+            "venta_id": venta_id,
+            "estado": estado or EstadoVentaEnum.COMPLETADA.value,
+            "productos_restaurados": productos_restaurados,
+            "importe_devuelto": sum((row.importe for row in devueltas), Decimal("0.00")),
+        }
 
 
 # Instancia del CRUD para usar en los endpoints
@@ -7,7 +7,7 @@ from datetime import datetime, date
 from decimal import Decimal
 from enum import Enum
 from typing import Optional, List
-from sqlmodel import SQLModel, Field, Relationship
+from sqlmodel import SQLModel, Field, Relationship, Index
 
 
 # =============================================================================
@@ -347,9 +347,16 @@ class VentaBase(SQLModel):
     metodo_pago: MetodoPagoEnum
     estado: EstadoVentaEnum = Field(default=EstadoVentaEnum.COMPLETADA)
     observaciones: Optional[str] = None
+    # Caja abierta que cobró la venta (ver db_info/create_caja_totales.sql)
+    caja_id: Optional[int] = Field(default=None, foreign_key="caja.id")
 
 
 class Venta(VentaBase, table=True):
+    __table_args__ = (
+        # Reportes por rango de fechas filtrados por estado
+        Index("idx_venta_fecha_estado", "fecha_venta", "estado"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     
     # Relaciones
@@ -389,6 +396,9 @@ class DetalleVentaBase(SQLModel):
 
 class DetalleVenta(DetalleVentaBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
+    cantidad_devuelta: Decimal = Field(default=Decimal("0.00"), decimal_places=2)
+    # Copia de venta.fecha_venta: clave de partición (db_info/create_particiones.sql)
+    fecha_venta: Optional[datetime] = None
     
     # Relaciones
     venta: Venta = Relationship(back_populates="detalles")
@@ -401,6 +411,7 @@ class DetalleVentaCreate(DetalleVentaBase):
 
 class DetalleVentaRead(DetalleVentaBase):
     id: int
+    cantidad_devuelta: Decimal = Decimal("0.00")
     producto: ProductoRead
 
 
@@ -3,3 +3,7 @@ Esquemas de respuesta personalizados
 """
 
 from .categoria_schemas import *
+from .importacion_schemas import *
+from .reporte_schemas import *
+from .venta_schemas import *
+from .caja_schemas import *
@@ -0,0 +1,77 @@
+"""
+Esquemas para apertura, cierre y verificación de cajas
+"""
+
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Optional
+from pydantic import BaseModel, Field
+
+from app.models import CategoriaGastoEnum
+
+
+class AperturaCajaRequest(BaseModel):
+    """Datos para abrir una caja"""
+    usuario_id: int
+    monto_inicial: Decimal = Field(ge=0)
+    observaciones: Optional[str] = None
+
+
+class CierreCajaRequest(BaseModel):
+    """Efectivo contado al cerrar la caja"""
+    monto_final: Decimal = Field(ge=0)
+    observaciones: Optional[str] = None
+
+
+class GastoCajaRequest(BaseModel):
+    """Gasto pagado con el efectivo de la caja"""
+    concepto: str = Field(max_length=200)
+    monto: Decimal = Field(gt=0)
+    categoria: CategoriaGastoEnum
+    usuario_id: int
+    fecha_gasto: Optional[date] = None
+    observaciones: Optional[str] = None
+
+
+class CajaResponse(BaseModel):
+    """Estado de una caja con sus totales acumulados"""
+    id: int
+    usuario_id: int
+    fecha_apertura: datetime
+    fecha_cierre: Optional[datetime] = None
+    monto_inicial: Decimal
+    monto_final: Optional[Decimal] = None
+    total_ventas_efectivo: Decimal
+    total_gastos: Decimal
+    diferencia: Decimal
+    estado: str
+    observaciones: Optional[str] = None
+
+
+class GastoCajaResponse(BaseModel):
+    """Gasto registrado"""
+    id: int
+    concepto: str
+    monto: Decimal
+    categoria: str
+    fecha_gasto: date
+    usuario_id: int
+    caja_id: Optional[int] = None
+    observaciones: Optional[str] = None
+
+
+class DiscrepanciaCajaSchema(BaseModel):
+    """Total acumulado frente al recalculado desde las tablas de origen"""
+    acumulado: Decimal
+    recalculado: Decimal
+
+
+class VerificacionCajaResponse(BaseModel):
+    """Resultado de recalcular los totales de una caja"""
+    caja_id: int
+    estado: str
+    total_ventas_efectivo: Decimal
+    total_gastos: Decimal
+    consistente: bool
+    discrepancias: Dict[str, DiscrepanciaCajaSchema] = {}
+    corregida: bool = False
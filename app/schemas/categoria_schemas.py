@@ -2,8 +2,10 @@
 Esquemas de respuesta para categorías y productos
 """
 
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from decimal import Decimal
+
+import msgspec
 from pydantic import BaseModel
 
 
@@ -15,6 +17,7 @@ class ProductoDescendienteSchema(BaseModel):
     stock: int
     activo: bool
     categoria: str
+    imagen_url: Optional[str] = None
     
     class Config:
         from_attributes = True
@@ -32,9 +35,36 @@ class CategoriaHijaSchema(BaseModel):
 class ProductosDescendientesResponse(BaseModel):
     """Respuesta para obtener productos de una categoría y sus descendientes"""
     categoria_padre_id: int
-    productos: List[Dict[str, Any]]
+    productos: List[ProductoDescendienteSchema]
     total_productos: int
     categorias_hijas: List[CategoriaHijaSchema]
     
     class Config:
         from_attributes = True
+
+
+# Estructuras msgspec de los listados de la API v1: mismo contenido que los
+# esquemas Pydantic de arriba (que siguen documentando la respuesta en
+# OpenAPI), pero se construyen sin validar a partir de filas de la base y se
+# codifican directo a JSON o MessagePack (ver app/core/serializacion.py).
+
+class ProductoListado(msgspec.Struct):
+    id: int
+    nombre: str
+    precio: float
+    stock: int
+    activo: bool
+    categoria: str
+    imagen_url: Optional[str] = None
+
+
+class CategoriaListado(msgspec.Struct):
+    id: int
+    nombre: str
+
+
+class ProductosDescendientesListado(msgspec.Struct):
+    categoria_padre_id: int
+    productos: List[ProductoListado]
+    total_productos: int
+    categorias_hijas: List[CategoriaListado]
@@ -0,0 +1,24 @@
+"""
+Esquemas de respuesta para importaciones masivas (catálogo y conteos de stock)
+"""
+
+from typing import List
+from pydantic import BaseModel
+
+
+class ErrorFilaSchema(BaseModel):
+    """Error de validación asociado a una fila del CSV"""
+    linea: int
+    error: str
+
+
+class ResultadoImportacionResponse(BaseModel):
+    """Resumen de una importación masiva"""
+    filas_leidas: int
+    filas_validas: int
+    insertados: int
+    actualizados: int
+    total_errores: int
+    errores: List[ErrorFilaSchema]
+    duracion_segundos: float
+    filas_por_segundo: float
@@ -0,0 +1,106 @@
+"""
+Esquemas de respuesta para reportes de ventas
+"""
+
+from datetime import date
+from decimal import Decimal
+from typing import Dict, List, Optional
+from pydantic import BaseModel
+
+
+class TotalMetodoPagoSchema(BaseModel):
+    """Total y número de ventas de un método de pago"""
+    num_ventas: int
+    total: Decimal
+
+
+class ResumenVentasResponse(BaseModel):
+    """Resumen agregado de ventas en un rango de fechas"""
+    fecha_inicio: date
+    fecha_fin: date
+    estados: List[str]
+    num_ventas: int
+    total: Decimal
+    descuento: Decimal
+    impuestos: Decimal
+    por_metodo_pago: Dict[str, TotalMetodoPagoSchema]
+
+
+class VentaProductoSchema(BaseModel):
+    """Cantidad e importe vendidos de un producto en un rango de fechas"""
+    producto_id: int
+    nombre: str
+    codigo_barras: Optional[str] = None
+    cantidad: Decimal
+    importe: Decimal
+    num_lineas: int
+
+
+class VentaHoraSchema(BaseModel):
+    """Cantidad e importe vendidos en una hora del día"""
+    hora: int
+    cantidad: Decimal
+    importe: Decimal
+    num_lineas: int
+
+
+class TotalesAnaliticaSchema(BaseModel):
+    """Totales de ingresos, costo y margen del rango"""
+    ingresos: float
+    costo: float
+    margen: float
+    margen_pct: float
+    unidades: float
+    productos_vendidos: int
+
+
+class MargenProductoSchema(BaseModel):
+    """Margen de un producto y su clase ABC"""
+    producto_id: int
+    nombre: str
+    cantidad: float
+    ingresos: float
+    costo: float
+    margen: float
+    margen_pct: float
+    clase_abc: str
+
+
+class MargenCategoriaSchema(BaseModel):
+    """Margen agregado de una categoría"""
+    categoria_id: int
+    nombre: str
+    cantidad: float
+    ingresos: float
+    costo: float
+    margen: float
+    margen_pct: float
+
+
+class ClaseABCSchema(BaseModel):
+    """Productos e ingresos de una clase ABC"""
+    productos: int
+    ingresos: float
+    participacion: float
+
+
+class CanastaSchema(BaseModel):
+    """Estadísticas de canasta (por venta)"""
+    num_ventas: int
+    ticket_promedio: float
+    ticket_mediana: float
+    ticket_p90: float
+    unidades_promedio: float
+    lineas_promedio: float
+    ventas_por_lineas: Dict[str, int]
+
+
+class AnaliticaVentasResponse(BaseModel):
+    """Márgenes, clasificación ABC y canasta en un rango de fechas"""
+    fecha_inicio: date
+    fecha_fin: date
+    totales: TotalesAnaliticaSchema
+    productos: List[MargenProductoSchema]
+    categorias: List[MargenCategoriaSchema]
+    abc: Dict[str, ClaseABCSchema]
+    canasta: CanastaSchema
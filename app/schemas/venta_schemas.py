@@ -0,0 +1,32 @@
+"""
+Esquemas para cancelaciones y devoluciones de ventas
+"""
+
+from decimal import Decimal
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+
+class LineaDevolucionSchema(BaseModel):
+    """Cantidad a devolver de una línea de la venta"""
+    detalle_id: int
+    cantidad: Decimal = Field(gt=0)
+
+
+class AnulacionVentaRequest(BaseModel):
+    """Datos para cancelar o devolver una venta"""
+    usuario_id: Optional[int] = None
+    motivo: Optional[str] = None
+
+
+class DevolucionVentaRequest(AnulacionVentaRequest):
+    """Devolución total (sin líneas) o parcial de una venta"""
+    lineas: List[LineaDevolucionSchema] = []
+
+
+class AnulacionVentaResponse(BaseModel):
+    """Resultado de una cancelación o devolución"""
+    venta_id: int
+    estado: str
+    productos_restaurados: int
+    importe_devuelto: Optional[Decimal] = None
@@ -46,40 +46,117 @@ function updateCartCount() {
     }
 }
 
+// Ruta base de las operaciones del carrito en el servidor
+const CARRITO_API = '/api/v2/categorias/carrito';
+
+// Leer una línea renderizada por el servidor (_carrito_linea.html)
+function lineaDesdeElemento(element) {
+    return {
+        id: parseInt(element.dataset.productId),
+        name: element.dataset.name,
+        price: parseFloat(element.dataset.price),
+        quantity: parseInt(element.dataset.quantity),
+        imageUrl: element.dataset.imageUrl || null
+    };
+}
+
+// Enviar una operación de una sola línea (add, increase, decrease, update,
+// remove) y aplicar la respuesta: solo la línea afectada y los totales
+async function enviarDeltaCarrito(accion, productId, cantidad = null) {
+    const options = { method: 'POST', credentials: 'same-origin' };
+    if (cantidad !== null) {
+        options.body = new URLSearchParams({ cantidad: String(cantidad) });
+    }
+
+    try {
+        const response = await fetch(`${CARRITO_API}/${accion}/${productId}`, options);
+        if (!response.ok) {
+            throw new Error(`Error en la respuesta: ${response.status}`);
+        }
+        const template = document.createElement('template');
+        template.innerHTML = (await response.text()).trim();
+        const delta = template.content.querySelector('.carrito-delta');
+        if (delta) {
+            aplicarDeltaCarrito(delta);
+        }
+        return delta;
+    } catch (error) {
+        console.error(`Error actualizando el carrito (${accion}):`, error);
+        return null;
+    }
+}
+
+// Reflejar la respuesta del servidor en el estado local y en la vista
+function aplicarDeltaCarrito(delta) {
+    const productId = parseInt(delta.dataset.productId);
+    const lineaElement = delta.querySelector('.cart-item');
+
+    // Estado local (espejo del servidor, usado por las vistas de productos)
+    const index = cart.findIndex(item => item.id === productId);
+    if (lineaElement) {
+        const linea = lineaDesdeElemento(lineaElement);
+        if (index >= 0) {
+            cart[index] = linea;
+        } else {
+            cart.push(linea);
+        }
+    } else if (index >= 0) {
+        cart.splice(index, 1);
+    }
+    saveCart();
+    updateCartCount();
+
+    // Controles de la vista de productos
+    if (lineaElement) {
+        showQuantitySelector(productId);
+        updateQuantityDisplay(productId);
+    } else {
+        hideQuantitySelector(productId);
+    }
+
+    // Vista del carrito: reemplazar solo la línea afectada y el total
+    const cartItems = document.getElementById('cart-items');
+    if (!cartItems) return;
+
+    const actual = cartItems.querySelector(`.cart-item[data-product-id="${productId}"]`);
+    if (lineaElement && actual) {
+        actual.replaceWith(lineaElement);
+    } else if (lineaElement) {
+        const vacio = cartItems.querySelector('.empty-cart');
+        if (vacio) vacio.remove();
+        cartItems.appendChild(lineaElement);
+    } else if (actual) {
+        actual.remove();
+    }
+
+    if (parseInt(delta.dataset.count) === 0) {
+        cartItems.innerHTML = '<div class="empty-cart">Tu carrito está vacío</div>';
+    }
+
+    const cartTotal = document.getElementById('cart-total');
+    if (cartTotal) {
+        cartTotal.textContent = delta.dataset.total;
+    }
+    generateCheckoutForm();
+}
+
 // Función para añadir al carrito
 function addToCart(id, name, price, imageUrl = null) {
     const existingItem = cart.find(item => item.id === id);
     const isFirstItem = cart.length === 0; // Verificar si el carrito está vacío antes de agregar
 
     if (existingItem) {
-        existingItem.quantity += 1;
-        // Mostrar notificación normal para incremento de cantidad
         showNotification(`${name} cantidad actualizada`);
-    } else {
-        cart.push({
-            id,
-            name,
-            price,
-            quantity: 1,
-            imageUrl: imageUrl && imageUrl.trim() !== '' ? imageUrl : null
-        });
-        
+    } else if (isFirstItem) {
         // Mostrar notificación especial si es el primer producto
-        if (isFirstItem) {
-            showNotification('Primer producto añadido al carrito');
-        } else {
-            showNotification(`${name} añadido al carrito`);
-        }
+        showNotification('Primer producto añadido al carrito');
+    } else {
+        showNotification(`${name} añadido al carrito`);
     }
 
-    saveCart();
-    updateCartCount();
-
-    // Mostrar el selector de cantidad
+    // Mostrar el selector de cantidad mientras responde el servidor
     showQuantitySelector(id);
-
-    // Sincronizar la cantidad mostrada con la del carrito
-    updateQuantityDisplay(id);
+    enviarDeltaCarrito('add', id);
 }
 
 // Mostrar el selector de cantidad para un producto específico
@@ -108,36 +185,12 @@ function hideQuantitySelector(productId) {
 
 // Incrementar cantidad para un producto específico
 function increaseQuantity(productId) {
-    const cartItem = cart.find(item => item.id === productId);
-    if (cartItem) {
-        cartItem.quantity++;
-        saveCart();
-        updateCartCount();
-        updateQuantityDisplay(productId);
-        
-        // Si estamos en la vista del carrito, actualizar también el HTML
-        updateCartDisplay();
-    }
+    enviarDeltaCarrito('increase', productId);
 }
 
-// Decrementar cantidad para un producto específico
+// Decrementar cantidad para un producto específico (en 0 el servidor elimina la línea)
 function decreaseQuantity(productId) {
-    const cartItem = cart.find(item => item.id === productId);
-    if (cartItem) {
-        if (cartItem.quantity > 1) {
-            cartItem.quantity--;
-            saveCart();
-            updateCartCount();
-            updateQuantityDisplay(productId);
-            
-            // Si estamos en la vista del carrito, actualizar también el HTML
-            updateCartDisplay();
-        } else {
-            // Si la cantidad es 1, remover del carrito
-            removeFromCart(productId);
-            hideQuantitySelector(productId);
-        }
-    }
+    enviarDeltaCarrito('decrease', productId);
 }
 
 // Actualizar la visualización de cantidad para un producto específico
@@ -152,73 +205,21 @@ function updateQuantityDisplay(productId) {
 }
 
 // Eliminar producto del carrito
-function removeFromCart(id) {
-    cart = cart.filter(item => item.id !== id);
-    saveCart();
-    updateCartDisplay();
-    updateCartCount();
-
-    // Actualizar la interfaz del producto en la página
-    const productExists = document.getElementById(`addButton_${id}`);
-    if (productExists) {
-        hideQuantitySelector(id);
+async function removeFromCart(id) {
+    const delta = await enviarDeltaCarrito('remove', id);
+    if (delta) {
+        showNotification('Producto eliminado del carrito');
     }
-
-    showNotification('Producto eliminado del carrito');
 }
 
-// Actualizar la visualización del carrito
+// Actualizar la visualización del carrito. Las líneas y el total los
+// renderiza el servidor; aquí solo el contador y el botón de checkout.
 function updateCartDisplay() {
-    const cartItems = document.getElementById('cart-items');
-    const cartTotal = document.getElementById('cart-total');
-
     updateCartCount();
 
-    if (!cartItems || !cartTotal) return;
-
-    if (cart.length === 0) {
-        cartItems.innerHTML = '<div class="empty-cart">Tu carrito está vacío</div>';
-        cartTotal.textContent = '0.00';
-        return;
+    if (document.getElementById('cart-items')) {
+        generateCheckoutForm();
     }
-
-    let itemsHTML = '';
-    let total = 0;
-
-    cart.forEach(item => {
-        const itemTotal = item.price * item.quantity;
-        total += itemTotal;
-
-        itemsHTML += `
-            <div class="cart-item">
-                <div class="cart-item-image">
-                    ${item.imageUrl && item.imageUrl.trim() !== '' ?
-                `<img src="${item.imageUrl}" alt="${item.name}" onerror="this.style.display='none'; this.nextElementSibling.style.display='flex';">
-                         <div class="default-image" style="display: none;">📦</div>` :
-                `<div class="default-image">📦</div>`
-            }
-                </div>
-                <div class="cart-item-info">
-                    <div class="cart-item-name">${item.name}</div>
-                    <div class="cart-item-details">$${item.price.toFixed(2)} c/u</div>
-                </div>
-                <div class="cart-item-controls">
-                    <div class="quantity-controls">
-                        <button class="quantity-btn decrease-btn" data-product-id="${item.id}">-</button>
-                        <span class="quantity-display" id="quantityDisplay_${item.id}">${item.quantity}</span>
-                        <button class="quantity-btn increase-btn" data-product-id="${item.id}">+</button>
-                    </div>
-                    <button class="remove-btn" data-product-id="${item.id}">Eliminar</button>
-                </div>
-            </div>
-        `;
-    });
-
-    cartItems.innerHTML = itemsHTML;
-    cartTotal.textContent = total.toFixed(2);
-    
-    // Actualizar también el form del checkout
-    generateCheckoutForm();
 }
 
 // Función específica para limpiar el carrito
@@ -299,51 +300,51 @@ document.addEventListener('DOMContentLoaded', () => {
     updateCartDisplay();
 });
 
-// Función para mostrar la vista completa del carrito desde JavaScript
-function mostrarCarrito() {
+// Tomar como estado local las líneas renderizadas por el servidor
+function sincronizarCarritoDesdeDOM() {
+    const cartItems = document.getElementById('cart-items');
+    if (!cartItems) return;
+
+    cart = Array.from(cartItems.querySelectorAll('.cart-item')).map(lineaDesdeElemento);
+    saveCart();
+    updateCartDisplay();
+}
+
+// Mostrar la vista completa del carrito renderizada por el servidor
+async function mostrarCarrito() {
     // Si ya estamos en la vista del carrito, no hacer nada
     if (document.querySelector('.carrito-container')) {
         return;
     }
-    
-    // Crear HTML completo del carrito
-    const html = `     
-        <div class="carrito-container">
-            <h2>Mi Carrito de Compras</h2>
-            
-            <div id="cart-items" class="cart-items">
-                <!-- Los items se generarán aquí -->
-            </div>
-            
-            <div class="cart-total-section">
-                <div class="cart-total">
-                    <strong>Total: $</strong><span id="cart-total">0.00</span>
-                </div>
-                <div id="checkout-container">
-                    <!-- El botón se generará aquí dinámicamente -->
-                </div>
-            </div>
-            
-            <div id="notification" class="notification"></div>
-            <div id="resultado"></div>
-        </div>
-    `;
-    
-    // Reemplazar solo el contenido del div "reemplazar" en lugar de todo el body
+
     const reemplazarDiv = document.getElementById('reemplazar');
-    if (reemplazarDiv) {
-        reemplazarDiv.innerHTML = html;
-    } else {
+    if (!reemplazarDiv) {
         console.error('No se encontró el div con id "reemplazar"');
         return;
     }
-    
-    // Cargar el carrito desde localStorage
-    loadCart();
-    
-    // Generar la vista del carrito
-    updateCartDisplay();
-    
+
+    try {
+        let response = await fetch(CARRITO_API, { credentials: 'same-origin' });
+        let html = await response.text();
+
+        // Carrito guardado en el navegador antes de existir el del servidor:
+        // se envían solo ids y cantidades una única vez
+        if (!html.includes('class="cart-item"') && cart.length > 0) {
+            response = await fetch(CARRITO_API, {
+                method: 'POST',
+                credentials: 'same-origin',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ items: cart.map(item => ({ id: item.id, quantity: item.quantity })) })
+            });
+            html = await response.text();
+        }
+
+        reemplazarDiv.innerHTML = html;
+        sincronizarCarritoDesdeDOM();
+    } catch (error) {
+        console.error('Error cargando el carrito:', error);
+    }
+
     // Configurar event listeners para los botones dinámicos
     setupCartEventListeners();
 }
@@ -494,7 +495,9 @@ function initializeProductQuantities() {
 document.addEventListener('htmx:afterSwap', function (event) {
     if (event.target.id === 'reemplazar') {
         setTimeout(function () {
-            if (typeof updateCartDisplay === 'function') {
+            if (document.querySelector('#cart-items[data-server-rendered]')) {
+                sincronizarCarritoDesdeDOM();
+            } else if (typeof updateCartDisplay === 'function') {
                 updateCartDisplay();
             }
         }, 100);
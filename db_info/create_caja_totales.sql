@@ -0,0 +1,251 @@
+-- =============================================================================
+-- TOTALES INCREMENTALES DE CAJA
+-- =============================================================================
+-- caja.total_ventas_efectivo y caja.total_gastos se mantienen con triggers a
+-- nivel de statement al registrar ventas en efectivo (venta.caja_id) y gastos
+-- (gasto.caja_id). Cerrar una caja solo lee su fila:
+--     diferencia = monto_final - (monto_inicial + total_ventas_efectivo - total_gastos)
+--
+-- Una venta aporta a su caja mientras está COMPLETADA y su método de pago es
+-- efectivo: total menos lo devuelto parcialmente (mismo redondeo por línea
+-- que los rollups, ver importe_neto_detalle en create_rollups_ventas.sql).
+-- Cancelarla o devolverla completa retira su aporte.
+--
+-- Solo se pueden registrar ventas y gastos nuevos en cajas abiertas. Los
+-- ajustes posteriores (cancelaciones, devoluciones, edición o borrado de
+-- gastos) sobre una caja cerrada actualizan sus totales y su diferencia.
+--
+-- Script idempotente. Requiere create_rollups_ventas.sql. Si después se
+-- ejecuta create_particiones.sql, volver a ejecutar este script.
+-- Para comprobar los totales contra las tablas de origen:
+--     GET /api/v1/cajas/{id}/verificar
+-- y para sobrescribirlos con los recalculados si no coinciden:
+--     POST /api/v1/cajas/{id}/verificar
+-- =============================================================================
+
+ALTER TABLE venta ADD COLUMN IF NOT EXISTS caja_id INTEGER;
+
+DO $$
+BEGIN
+    ALTER TABLE venta ADD CONSTRAINT fk_venta_caja FOREIGN KEY (caja_id) REFERENCES caja(id);
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+CREATE INDEX IF NOT EXISTS idx_venta_caja ON venta(caja_id);
+CREATE INDEX IF NOT EXISTS idx_gasto_caja ON gasto(caja_id);
+
+-- Una sola caja abierta por usuario
+CREATE UNIQUE INDEX IF NOT EXISTS idx_caja_abierta_usuario ON caja(usuario_id) WHERE estado = 'abierta';
+
+-- -----------------------------------------------------------------------------
+-- Aplicar deltas a las cajas (diferencia se recalcula si ya estaba cerrada)
+-- -----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION aplicar_deltas_caja(p_caja_ids INTEGER[], p_ventas DECIMAL[], p_gastos DECIMAL[])
+RETURNS VOID AS $$
+    WITH deltas AS (
+        SELECT caja_id, SUM(ventas) AS ventas, SUM(gastos) AS gastos
+        FROM unnest(p_caja_ids, p_ventas, p_gastos) AS d(caja_id, ventas, gastos)
+        WHERE caja_id IS NOT NULL
+        GROUP BY caja_id
+        HAVING SUM(ventas) <> 0 OR SUM(gastos) <> 0
+    )
+    UPDATE caja c
+    SET total_ventas_efectivo = COALESCE(c.total_ventas_efectivo, 0) + d.ventas,
+        total_gastos = COALESCE(c.total_gastos, 0) + d.gastos,
+        diferencia = CASE
+            WHEN c.estado = 'cerrada' THEN
+                c.monto_final - (c.monto_inicial
+                                 + COALESCE(c.total_ventas_efectivo, 0) + d.ventas
+                                 - COALESCE(c.total_gastos, 0) - d.gastos)
+            ELSE c.diferencia
+        END
+    FROM deltas d
+    WHERE c.id = d.caja_id;
+$$ LANGUAGE sql;
+
+-- Rechazar registros nuevos en cajas cerradas o inexistentes
+CREATE OR REPLACE FUNCTION verificar_cajas_abiertas(p_caja_ids INTEGER[])
+RETURNS VOID AS $$
+DECLARE
+    cerradas INTEGER[];
+BEGIN
+    SELECT array_agg(DISTINCT i.caja_id) INTO cerradas
+    FROM unnest(p_caja_ids) AS i(caja_id)
+    LEFT JOIN caja c ON c.id = i.caja_id
+    WHERE i.caja_id IS NOT NULL
+      AND (c.id IS NULL OR c.estado <> 'abierta');
+
+    IF cerradas IS NOT NULL THEN
+        RAISE EXCEPTION 'Caja cerrada o inexistente: %', cerradas
+            USING ERRCODE = 'check_violation';
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- -----------------------------------------------------------------------------
+-- Ventas
+-- -----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION caja_venta_insert()
+RETURNS TRIGGER AS $$
+DECLARE
+    caja_ids INTEGER[];
+    importes DECIMAL[];
+BEGIN
+    SELECT array_agg(caja_id), array_agg(total)
+    INTO caja_ids, importes
+    FROM nuevas
+    WHERE caja_id IS NOT NULL
+      AND metodo_pago = 'efectivo'
+      AND estado = 'completada';
+
+    IF caja_ids IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    PERFORM verificar_cajas_abiertas(caja_ids);
+    PERFORM aplicar_deltas_caja(caja_ids, importes, array_fill(0::DECIMAL, ARRAY[cardinality(caja_ids)]));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Cambios de estado, método de pago, total o caja: restar el aporte viejo y
+-- sumar el nuevo
+CREATE OR REPLACE FUNCTION caja_venta_update()
+RETURNS TRIGGER AS $$
+DECLARE
+    caja_ids INTEGER[];
+    importes DECIMAL[];
+BEGIN
+    WITH cambios AS (
+        SELECT o.caja_id AS caja_vieja, n.caja_id AS caja_nueva, n.id, n.fecha_venta,
+               CASE WHEN o.estado = 'completada' AND o.metodo_pago = 'efectivo' THEN o.total ELSE 0 END AS aporte_viejo,
+               CASE WHEN n.estado = 'completada' AND n.metodo_pago = 'efectivo' THEN n.total ELSE 0 END AS aporte_nuevo
+        FROM nuevas n
+        INNER JOIN viejas o ON o.id = n.id AND o.fecha_venta = n.fecha_venta
+        WHERE (o.caja_id IS NOT NULL OR n.caja_id IS NOT NULL)
+          AND (o.caja_id, o.estado, o.metodo_pago, o.total)
+              IS DISTINCT FROM (n.caja_id, n.estado, n.metodo_pago, n.total)
+    ),
+    devuelto AS (
+        SELECT c.id, COALESCE(SUM(d.subtotal - importe_neto_detalle(d.subtotal, d.cantidad, d.cantidad_devuelta)), 0) AS importe
+        FROM cambios c
+        LEFT JOIN detalle_venta d ON d.venta_id = c.id AND d.fecha_venta = c.fecha_venta
+        GROUP BY c.id
+    ),
+    deltas AS (
+        SELECT c.caja_vieja AS caja_id,
+               -(c.aporte_viejo - CASE WHEN c.aporte_viejo <> 0 THEN r.importe ELSE 0 END) AS importe
+        FROM cambios c INNER JOIN devuelto r ON r.id = c.id
+        UNION ALL
+        SELECT c.caja_nueva,
+               c.aporte_nuevo - CASE WHEN c.aporte_nuevo <> 0 THEN r.importe ELSE 0 END
+        FROM cambios c INNER JOIN devuelto r ON r.id = c.id
+    )
+    SELECT array_agg(caja_id), array_agg(importe)
+    INTO caja_ids, importes
+    FROM deltas
+    WHERE caja_id IS NOT NULL AND importe <> 0;
+
+    IF caja_ids IS NOT NULL THEN
+        PERFORM aplicar_deltas_caja(caja_ids, importes, array_fill(0::DECIMAL, ARRAY[cardinality(caja_ids)]));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Devolución parcial de una venta en efectivo completada: sale de su caja
+CREATE OR REPLACE FUNCTION caja_detalle_venta_devolucion()
+RETURNS TRIGGER AS $$
+DECLARE
+    caja_ids INTEGER[];
+    importes DECIMAL[];
+BEGIN
+    SELECT array_agg(v.caja_id),
+           array_agg(importe_neto_detalle(n.subtotal, n.cantidad, n.cantidad_devuelta)
+                     - importe_neto_detalle(o.subtotal, o.cantidad, o.cantidad_devuelta))
+    INTO caja_ids, importes
+    FROM nuevos n
+    INNER JOIN viejos o ON o.id = n.id AND o.fecha_venta = n.fecha_venta
+    INNER JOIN venta v ON v.id = n.venta_id AND v.fecha_venta = n.fecha_venta
+    WHERE v.caja_id IS NOT NULL
+      AND v.estado = 'completada'
+      AND v.metodo_pago = 'efectivo'
+      AND n.cantidad_devuelta <> o.cantidad_devuelta;
+
+    IF caja_ids IS NOT NULL THEN
+        PERFORM aplicar_deltas_caja(caja_ids, importes, array_fill(0::DECIMAL, ARRAY[cardinality(caja_ids)]));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- -----------------------------------------------------------------------------
+-- Gastos
+-- -----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION caja_gasto_cambio()
+RETURNS TRIGGER AS $$
+DECLARE
+    caja_ids INTEGER[];
+    importes DECIMAL[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(caja_id), array_agg(monto) INTO caja_ids, importes
+        FROM nuevos WHERE caja_id IS NOT NULL;
+
+        IF caja_ids IS NOT NULL THEN
+            PERFORM verificar_cajas_abiertas(caja_ids);
+        END IF;
+    ELSIF TG_OP = 'UPDATE' THEN
+        SELECT array_agg(caja_id), array_agg(monto) INTO caja_ids, importes
+        FROM (
+            SELECT caja_id, -monto AS monto FROM viejos WHERE caja_id IS NOT NULL
+            UNION ALL
+            SELECT caja_id, monto FROM nuevos WHERE caja_id IS NOT NULL
+        ) d;
+    ELSE
+        SELECT array_agg(caja_id), array_agg(-monto) INTO caja_ids, importes
+        FROM viejos WHERE caja_id IS NOT NULL;
+    END IF;
+
+    IF caja_ids IS NOT NULL THEN
+        PERFORM aplicar_deltas_caja(caja_ids, array_fill(0::DECIMAL, ARRAY[cardinality(caja_ids)]), importes);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_caja_venta_insert ON venta;
+CREATE TRIGGER trigger_caja_venta_insert
+    AFTER INSERT ON venta
+    REFERENCING NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION caja_venta_insert();
+
+DROP TRIGGER IF EXISTS trigger_caja_venta_update ON venta;
+CREATE TRIGGER trigger_caja_venta_update
+    AFTER UPDATE ON venta
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION caja_venta_update();
+
+DROP TRIGGER IF EXISTS trigger_caja_detalle_venta_devolucion ON detalle_venta;
+CREATE TRIGGER trigger_caja_detalle_venta_devolucion
+    AFTER UPDATE ON detalle_venta
+    REFERENCING OLD TABLE AS viejos NEW TABLE AS nuevos
+    FOR EACH STATEMENT EXECUTE FUNCTION caja_detalle_venta_devolucion();
+
+DROP TRIGGER IF EXISTS trigger_caja_gasto_insert ON gasto;
+CREATE TRIGGER trigger_caja_gasto_insert
+    AFTER INSERT ON gasto
+    REFERENCING NEW TABLE AS nuevos
+    FOR EACH STATEMENT EXECUTE FUNCTION caja_gasto_cambio();
+
+DROP TRIGGER IF EXISTS trigger_caja_gasto_update ON gasto;
+CREATE TRIGGER trigger_caja_gasto_update
+    AFTER UPDATE ON gasto
+    REFERENCING OLD TABLE AS viejos NEW TABLE AS nuevos
+    FOR EACH STATEMENT EXECUTE FUNCTION caja_gasto_cambio();
+
+DROP TRIGGER IF EXISTS trigger_caja_gasto_delete ON gasto;
+CREATE TRIGGER trigger_caja_gasto_delete
+    AFTER DELETE ON gasto
+    REFERENCING OLD TABLE AS viejos
+    FOR EACH STATEMENT EXECUTE FUNCTION caja_gasto_cambio();
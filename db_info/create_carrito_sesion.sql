@@ -0,0 +1,21 @@
+-- =============================================================================
+-- CARRITOS POR SESIÓN (respaldo persistente del carrito del servidor)
+-- =============================================================================
+-- Solo se usa con CARRITO_BACKEND=db. Es la única copia del carrito (sin
+-- caché por proceso), así sobrevive a reinicios y se comparte entre workers.
+-- Cada cambio bloquea la fila de la sesión (SELECT ... FOR UPDATE) para que
+-- dos cambios simultáneos no se pisen.
+--
+-- items: {"<producto_id>": cantidad, ...}
+--
+-- Para purgar carritos abandonados:
+--     DELETE FROM carrito_sesion WHERE fecha_actualizacion < CURRENT_TIMESTAMP - INTERVAL '30 days';
+-- =============================================================================
+
+CREATE TABLE IF NOT EXISTS carrito_sesion (
+    sesion_id VARCHAR(64) PRIMARY KEY,
+    items JSONB NOT NULL DEFAULT '{}'::jsonb,
+    fecha_actualizacion TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_carrito_sesion_actualizacion ON carrito_sesion(fecha_actualizacion);
@@ -0,0 +1,48 @@
+-- =============================================================================
+-- VERSIÓN DEL CATÁLOGO (validadores ETag / Last-Modified de los fragmentos)
+-- =============================================================================
+-- Un contador de una sola fila que sube con cada cambio visible del
+-- catálogo: productos y categorías creados, borrados o con cambios en las
+-- columnas que muestran los fragmentos (_productos.html, _categorias.html,
+-- detalle_producto.html). Los cambios de stock de cada venta no lo tocan.
+--
+-- La aplicación responde 304 Not Modified cuando el ETag del navegador (o de
+-- la CDN) coincide con la versión actual, sin consultar ni renderizar nada.
+-- =============================================================================
+
+CREATE TABLE IF NOT EXISTS catalogo_version (
+    id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    version BIGINT NOT NULL DEFAULT 1,
+    -- En UTC (se envía como Last-Modified)
+    fecha_actualizacion TIMESTAMP NOT NULL DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+);
+
+INSERT INTO catalogo_version (id) VALUES (1) ON CONFLICT (id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION incrementar_catalogo_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE catalogo_version
+    SET version = version + 1,
+        fecha_actualizacion = date_trunc('second', clock_timestamp() AT TIME ZONE 'UTC')
+    WHERE id = 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Una vez por sentencia: una importación masiva sube la versión una sola vez
+DROP TRIGGER IF EXISTS catalogo_version_producto ON producto;
+CREATE TRIGGER catalogo_version_producto
+    AFTER INSERT OR DELETE OR TRUNCATE
+       OR UPDATE OF nombre, descripcion, precio_venta, imagen_url, activo, categoria_id, codigo_barras
+    ON producto
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION incrementar_catalogo_version();
+
+DROP TRIGGER IF EXISTS catalogo_version_categoria ON categoria;
+CREATE TRIGGER catalogo_version_categoria
+    AFTER INSERT OR DELETE OR TRUNCATE
+       OR UPDATE OF nombre, descripcion, padre, imagen_url, activo
+    ON categoria
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION incrementar_catalogo_version();
@@ -0,0 +1,47 @@
+-- =============================================================================
+-- CONTADOR DIARIO PARA NÚMEROS DE VENTA
+-- =============================================================================
+-- Reemplaza la búsqueda de la última venta del día (MAX sobre venta) por un
+-- contador por fecha actualizado con INSERT ... ON CONFLICT ... RETURNING.
+-- La fila del día queda bloqueada solo durante el UPDATE, por lo que dos cajas
+-- nunca obtienen el mismo número.
+--
+-- Script idempotente: se puede ejecutar sobre una base creada con
+-- create_tienda_db.sql para migrarla.
+-- =============================================================================
+
+CREATE TABLE IF NOT EXISTS venta_contador (
+    fecha DATE PRIMARY KEY,
+    ultimo INTEGER NOT NULL DEFAULT 0
+);
+
+-- Inicializar el contador con los números ya emitidos (formato V-YYYYMMDD-NNNN)
+INSERT INTO venta_contador (fecha, ultimo)
+SELECT
+    TO_DATE(SUBSTRING(numero_venta FROM 3 FOR 8), 'YYYYMMDD'),
+    MAX(CAST(SUBSTRING(numero_venta FROM 12) AS INTEGER))
+FROM venta
+WHERE numero_venta ~ '^V-[0-9]{8}-[0-9]+$'
+GROUP BY 1
+ON CONFLICT (fecha) DO UPDATE
+    SET ultimo = GREATEST(venta_contador.ultimo, EXCLUDED.ultimo);
+
+-- Reservar un bloque de números para una fecha; devuelve el último número del bloque
+CREATE OR REPLACE FUNCTION reservar_numeros_venta(p_fecha DATE, p_cantidad INTEGER)
+RETURNS INTEGER AS $$
+    INSERT INTO venta_contador (fecha, ultimo)
+    VALUES (p_fecha, p_cantidad)
+    ON CONFLICT (fecha) DO UPDATE
+        SET ultimo = venta_contador.ultimo + EXCLUDED.ultimo
+    RETURNING ultimo;
+$$ LANGUAGE sql;
+
+-- Función para generar número de venta automático (usa el contador diario)
+CREATE OR REPLACE FUNCTION generar_numero_venta()
+RETURNS VARCHAR(20) AS $$
+BEGIN
+    -- Formato: V-YYYYMMDD-NNNN
+    RETURN 'V-' || TO_CHAR(CURRENT_DATE, 'YYYYMMDD') || '-'
+        || LPAD(reservar_numeros_venta(CURRENT_DATE, 1)::TEXT, 4, '0');
+END;
+$$ LANGUAGE plpgsql;
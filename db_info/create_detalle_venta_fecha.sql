@@ -0,0 +1,22 @@
+-- =============================================================================
+-- detalle_venta.fecha_venta (obligatorio, con o sin particionado)
+-- =============================================================================
+-- Cada línea de venta lleva una copia de la fecha de su venta. Es la clave
+-- de partición de detalle_venta cuando se aplica create_particiones.sql,
+-- pero la aplicación la escribe siempre (CRUDVenta.insertar_ventas), así
+-- que una base sin particionar también necesita la columna. La aplicación
+-- no arranca si falta.
+--
+-- Script idempotente: en una base ya particionada la columna existe y no
+-- cambia nada.
+-- =============================================================================
+
+ALTER TABLE detalle_venta ADD COLUMN IF NOT EXISTS fecha_venta TIMESTAMP;
+
+UPDATE detalle_venta d
+SET fecha_venta = v.fecha_venta
+FROM venta v
+WHERE v.id = d.venta_id
+  AND d.fecha_venta IS NULL;
+
+ALTER TABLE detalle_venta ALTER COLUMN fecha_venta SET NOT NULL;
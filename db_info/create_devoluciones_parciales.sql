@@ -0,0 +1,23 @@
+-- =============================================================================
+-- DEVOLUCIONES PARCIALES (detalle_venta.cantidad_devuelta)
+-- =============================================================================
+-- Cantidad devuelta de cada línea de venta. Una venta con devoluciones
+-- parciales sigue COMPLETADA; pasa a DEVUELTA cuando ya no queda nada por
+-- devolver (ver venta.devolver_venta).
+--
+-- Obligatorio antes de create_rollups_ventas.sql y create_caja_totales.sql,
+-- cuyos triggers y reportes descuentan lo devuelto.
+--
+-- Script idempotente. Sobre una base particionada la columna y el CHECK se
+-- propagan a todas las particiones de detalle_venta.
+-- =============================================================================
+
+ALTER TABLE detalle_venta
+    ADD COLUMN IF NOT EXISTS cantidad_devuelta DECIMAL(10,2) NOT NULL DEFAULT 0.00;
+
+DO $$
+BEGIN
+    ALTER TABLE detalle_venta ADD CONSTRAINT chk_detalle_venta_cantidad_devuelta
+        CHECK (cantidad_devuelta >= 0 AND cantidad_devuelta <= cantidad);
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
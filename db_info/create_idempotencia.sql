@@ -0,0 +1,28 @@
+-- =============================================================================
+-- CLAVES DE IDEMPOTENCIA DEL CHECKOUT
+-- =============================================================================
+-- Cada envío del checkout trae una clave (campo idempotency_key del
+-- formulario o cabecera Idempotency-Key). La primera petición inserta la fila
+-- en la misma transacción que registra la venta (una sola conexión y un solo
+-- commit) y la mantiene bloqueada mientras procesa; los duplicados concurrentes
+-- esperan ese INSERT y, al confirmarse, reciben la respuesta guardada sin
+-- volver a validar ni tocar stock o ventas. Solo se guardan las respuestas
+-- exitosas: si la primera falla (carrito vacío o sin stock, o un error), la
+-- fila se borra y el siguiente intento procesa normalmente.
+--
+-- clave: sha256(alcance || ':' || clave del cliente), 32 bytes
+-- cuerpo: respuesta comprimida con zlib
+--
+-- Limpieza de claves vencidas (la aplicación también la hace periódicamente):
+--     python -m app.cli idempotencia-limpiar
+-- =============================================================================
+
+CREATE TABLE IF NOT EXISTS checkout_idempotencia (
+    clave BYTEA PRIMARY KEY,
+    venta_id INTEGER,
+    codigo_estado SMALLINT NOT NULL DEFAULT 200,
+    cuerpo BYTEA,
+    expira TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_checkout_idempotencia_expira ON checkout_idempotencia(expira);
@@ -0,0 +1,287 @@
+-- =============================================================================
+-- PARTICIONADO MENSUAL DE venta, detalle_venta Y movimiento_inventario
+-- =============================================================================
+-- Convierte las tres tablas de solo-inserción en tablas particionadas por
+-- rango mensual (fecha_venta / fecha_movimiento). Las consultas con rango
+-- de fechas sobre la columna (fecha >= :desde AND fecha < :hasta) solo leen
+-- las particiones del rango, y cada índice crece solo lo que crece su mes.
+--
+-- Cambios de esquema:
+--   * venta:          PK (id, fecha_venta), UNIQUE (numero_venta, fecha_venta).
+--                     Esa UNIQUE no basta para que numero_venta sea único en
+--                     toda la tabla: la unicidad global la da el registro
+--                     venta_numero de create_particiones_integridad.sql.
+--   * detalle_venta:  nueva columna fecha_venta (copia de la de su venta),
+--                     PK (id, fecha_venta), FK (venta_id, fecha_venta)
+--   * movimiento_inventario: PK (id, fecha_movimiento)
+--   Los ids siguen saliendo de las mismas secuencias.
+--
+-- Migración desde create_tienda_db.sql (y los scripts create_* posteriores):
+--   1. Respaldar la base (pg_dump).
+--   2. psql -f db_info/create_particiones.sql
+--      Corre en una sola transacción; si las tablas ya están particionadas
+--      aborta sin cambios. En una base nueva se ejecuta después de
+--      create_tienda_db.sql con las tablas vacías.
+--   3. psql -f db_info/create_particiones_integridad.sql (obligatorio: la
+--      aplicación no arranca sin él). Registra los números de venta para
+--      que sigan siendo únicos y crea las particiones DEFAULT, así una
+--      venta de un mes sin partición no falla.
+--   4. Programar la creación de particiones futuras (la aplicación también
+--      lo hace al arrancar):
+--          python -m app.cli particiones-asegurar --meses 3
+--   5. Archivar meses viejos cuando haga falta:
+--          python -m app.cli particiones-archivar --retencion-meses 24
+-- =============================================================================
+
+BEGIN;
+
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'venta'::regclass) = 'p' THEN
+        RAISE EXCEPTION 'venta ya está particionada; no hay nada que migrar';
+    END IF;
+END $$;
+
+-- -----------------------------------------------------------------------------
+-- Funciones de mantenimiento de particiones
+-- -----------------------------------------------------------------------------
+
+-- Crear (si no existe) la partición mensual de p_tabla que contiene p_mes
+CREATE OR REPLACE FUNCTION crear_particion_mensual(p_tabla TEXT, p_mes DATE)
+RETURNS BOOLEAN AS $$
+DECLARE
+    inicio DATE := date_trunc('month', p_mes)::date;
+    nombre TEXT := p_tabla || '_' || to_char(p_mes, 'YYYY_MM');
+BEGIN
+    IF to_regclass(nombre) IS NOT NULL THEN
+        RETURN FALSE;
+    END IF;
+
+    EXECUTE format(
+        'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+        nombre, p_tabla, inicio, (inicio + INTERVAL '1 month')::date
+    );
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Asegurar particiones desde p_desde hasta p_meses_adelante meses después del
+-- mes actual para las tres tablas. Devuelve cuántas particiones se crearon.
+CREATE OR REPLACE FUNCTION asegurar_particiones(p_meses_adelante INTEGER DEFAULT 3, p_desde DATE DEFAULT CURRENT_DATE)
+RETURNS INTEGER AS $$
+DECLARE
+    tabla TEXT;
+    mes DATE;
+    creadas INTEGER := 0;
+BEGIN
+    FOREACH tabla IN ARRAY ARRAY['venta', 'detalle_venta', 'movimiento_inventario'] LOOP
+        FOR mes IN
+            SELECT generate_series(
+                date_trunc('month', p_desde),
+                date_trunc('month', CURRENT_DATE) + make_interval(months => p_meses_adelante),
+                INTERVAL '1 month'
+            )::date
+        LOOP
+            IF crear_particion_mensual(tabla, mes) THEN
+                creadas := creadas + 1;
+            END IF;
+        END LOOP;
+    END LOOP;
+    RETURN creadas;
+END;
+$$ LANGUAGE plpgsql;
+
+-- -----------------------------------------------------------------------------
+-- Tablas nuevas (mismas columnas, defaults y CHECKs que las actuales)
+-- -----------------------------------------------------------------------------
+
+DROP VIEW IF EXISTS vista_ventas_hoy;
+DROP VIEW IF EXISTS vista_resumen_ventas_diarias;
+
+ALTER TABLE venta RENAME TO venta_anterior;
+ALTER TABLE detalle_venta RENAME TO detalle_venta_anterior;
+ALTER TABLE movimiento_inventario RENAME TO movimiento_inventario_anterior;
+
+-- Las secuencias pasan a las tablas nuevas
+ALTER SEQUENCE venta_id_seq OWNED BY NONE;
+ALTER SEQUENCE detalle_venta_id_seq OWNED BY NONE;
+ALTER SEQUENCE movimiento_inventario_id_seq OWNED BY NONE;
+
+CREATE TABLE venta (LIKE venta_anterior INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+    PARTITION BY RANGE (fecha_venta);
+ALTER TABLE venta ALTER COLUMN fecha_venta SET NOT NULL;
+
+CREATE TABLE detalle_venta (
+    LIKE detalle_venta_anterior INCLUDING DEFAULTS INCLUDING CONSTRAINTS,
+    fecha_venta TIMESTAMP NOT NULL
+) PARTITION BY RANGE (fecha_venta);
+
+CREATE TABLE movimiento_inventario (LIKE movimiento_inventario_anterior INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+    PARTITION BY RANGE (fecha_movimiento);
+ALTER TABLE movimiento_inventario ALTER COLUMN fecha_movimiento SET NOT NULL;
+
+-- Particiones para el histórico y los próximos meses
+SELECT asegurar_particiones(3, LEAST(
+    COALESCE((SELECT MIN(fecha_venta) FROM venta_anterior), CURRENT_TIMESTAMP),
+    COALESCE((SELECT MIN(fecha_movimiento) FROM movimiento_inventario_anterior), CURRENT_TIMESTAMP)
+)::date);
+
+-- -----------------------------------------------------------------------------
+-- Copia de datos (las tablas nuevas aún no tienen triggers)
+-- -----------------------------------------------------------------------------
+
+INSERT INTO venta
+SELECT * FROM venta_anterior;
+
+INSERT INTO detalle_venta
+SELECT d.*, v.fecha_venta
+FROM detalle_venta_anterior d
+INNER JOIN venta_anterior v ON v.id = d.venta_id;
+
+INSERT INTO movimiento_inventario
+SELECT * FROM movimiento_inventario_anterior;
+
+DROP TABLE detalle_venta_anterior;
+DROP TABLE venta_anterior;
+DROP TABLE movimiento_inventario_anterior;
+
+ALTER SEQUENCE venta_id_seq OWNED BY venta.id;
+ALTER SEQUENCE detalle_venta_id_seq OWNED BY detalle_venta.id;
+ALTER SEQUENCE movimiento_inventario_id_seq OWNED BY movimiento_inventario.id;
+
+-- -----------------------------------------------------------------------------
+-- Claves e índices (se propagan a cada partición)
+-- -----------------------------------------------------------------------------
+
+ALTER TABLE venta ADD CONSTRAINT venta_pkey PRIMARY KEY (id, fecha_venta);
+ALTER TABLE venta ADD CONSTRAINT venta_numero_venta_key UNIQUE (numero_venta, fecha_venta);
+ALTER TABLE venta ADD CONSTRAINT venta_cliente_id_fkey
+    FOREIGN KEY (cliente_id) REFERENCES cliente(id) ON DELETE SET NULL;
+ALTER TABLE venta ADD CONSTRAINT venta_usuario_id_fkey
+    FOREIGN KEY (usuario_id) REFERENCES usuario(id);
+
+CREATE INDEX idx_venta_numero_venta ON venta(numero_venta);
+CREATE INDEX idx_venta_fecha_venta ON venta(fecha_venta);
+CREATE INDEX idx_venta_cliente ON venta(cliente_id);
+CREATE INDEX idx_venta_usuario ON venta(usuario_id);
+CREATE INDEX idx_venta_estado ON venta(estado);
+CREATE INDEX idx_venta_fecha_estado ON venta(fecha_venta, estado);
+
+ALTER TABLE detalle_venta ADD CONSTRAINT detalle_venta_pkey PRIMARY KEY (id, fecha_venta);
+ALTER TABLE detalle_venta ADD CONSTRAINT detalle_venta_venta_id_fkey
+    FOREIGN KEY (venta_id, fecha_venta) REFERENCES venta(id, fecha_venta) ON DELETE CASCADE;
+ALTER TABLE detalle_venta ADD CONSTRAINT detalle_venta_producto_id_fkey
+    FOREIGN KEY (producto_id) REFERENCES producto(id);
+
+CREATE INDEX idx_detalle_venta_venta ON detalle_venta(venta_id);
+CREATE INDEX idx_detalle_venta_producto ON detalle_venta(producto_id);
+
+ALTER TABLE movimiento_inventario ADD CONSTRAINT movimiento_inventario_pkey PRIMARY KEY (id, fecha_movimiento);
+ALTER TABLE movimiento_inventario ADD CONSTRAINT movimiento_inventario_producto_id_fkey
+    FOREIGN KEY (producto_id) REFERENCES producto(id);
+ALTER TABLE movimiento_inventario ADD CONSTRAINT movimiento_inventario_usuario_id_fkey
+    FOREIGN KEY (usuario_id) REFERENCES usuario(id);
+
+CREATE INDEX idx_movimiento_producto ON movimiento_inventario(producto_id);
+CREATE INDEX idx_movimiento_tipo ON movimiento_inventario(tipo_movimiento);
+CREATE INDEX idx_movimiento_fecha ON movimiento_inventario(fecha_movimiento);
+CREATE INDEX idx_movimientos_fecha_tipo ON movimiento_inventario(fecha_movimiento, tipo_movimiento);
+
+-- -----------------------------------------------------------------------------
+-- Triggers
+-- -----------------------------------------------------------------------------
+
+-- Stock por línea de venta: busca la venta con su clave de partición
+CREATE OR REPLACE FUNCTION actualizar_stock_venta()
+RETURNS TRIGGER AS $$
+DECLARE
+    stock_anterior INTEGER;
+BEGIN
+    -- Obtener stock actual
+    SELECT stock_actual INTO stock_anterior
+    FROM producto
+    WHERE id = NEW.producto_id;
+
+    -- Actualizar stock del producto
+    UPDATE producto
+    SET stock_actual = stock_actual - NEW.cantidad
+    WHERE id = NEW.producto_id;
+
+    -- Registrar movimiento de inventario
+    INSERT INTO movimiento_inventario (
+        producto_id, tipo_movimiento, cantidad, stock_anterior,
+        stock_nuevo, referencia, usuario_id
+    ) VALUES (
+        NEW.producto_id, 'salida', NEW.cantidad, stock_anterior,
+        stock_anterior - NEW.cantidad::INTEGER, 'VENTA-' || NEW.venta_id,
+        (SELECT usuario_id FROM venta WHERE id = NEW.venta_id AND fecha_venta = NEW.fecha_venta)
+    );
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trigger_detalle_venta_stock
+    AFTER INSERT ON detalle_venta
+    FOR EACH ROW EXECUTE FUNCTION actualizar_stock_venta();
+
+-- Rollups de ventas (create_rollups_ventas.sql), si están instalados
+DO $$
+BEGIN
+    IF to_regproc('rollup_venta_insert') IS NOT NULL THEN
+        CREATE TRIGGER trigger_rollup_venta_insert
+            AFTER INSERT ON venta
+            REFERENCING NEW TABLE AS nuevas
+            FOR EACH STATEMENT EXECUTE FUNCTION rollup_venta_insert();
+
+        CREATE TRIGGER trigger_rollup_venta_estado
+            AFTER UPDATE ON venta
+            REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+            FOR EACH STATEMENT EXECUTE FUNCTION rollup_venta_estado_update();
+
+        CREATE TRIGGER trigger_rollup_detalle_venta_insert
+            AFTER INSERT ON detalle_venta
+            REFERENCING NEW TABLE AS nuevos
+            FOR EACH STATEMENT EXECUTE FUNCTION rollup_detalle_venta_insert();
+
+        CREATE TRIGGER trigger_rollup_detalle_venta_devolucion
+            AFTER UPDATE ON detalle_venta
+            REFERENCING OLD TABLE AS viejos NEW TABLE AS nuevos
+            FOR EACH STATEMENT EXECUTE FUNCTION rollup_detalle_venta_devolucion();
+    END IF;
+END $$;
+
+-- -----------------------------------------------------------------------------
+-- Vistas (predicados sobre la columna para que se poden particiones)
+-- -----------------------------------------------------------------------------
+
+CREATE OR REPLACE VIEW vista_ventas_hoy AS
+SELECT
+    v.id,
+    v.numero_venta,
+    CONCAT(c.nombre, ' ', COALESCE(c.apellidos, '')) AS cliente,
+    u.nombre AS vendedor,
+    v.total,
+    v.metodo_pago,
+    v.fecha_venta
+FROM venta v
+LEFT JOIN cliente c ON v.cliente_id = c.id
+LEFT JOIN usuario u ON v.usuario_id = u.id
+WHERE v.fecha_venta >= CURRENT_DATE
+AND v.fecha_venta < CURRENT_DATE + 1
+AND v.estado = 'completada';
+
+CREATE OR REPLACE VIEW vista_resumen_ventas_diarias AS
+SELECT
+    DATE(fecha_venta) AS fecha,
+    COUNT(*) AS total_ventas,
+    SUM(total) AS total_ingresos,
+    AVG(total) AS promedio_venta,
+    COUNT(CASE WHEN metodo_pago = 'efectivo' THEN 1 END) AS ventas_efectivo,
+    COUNT(CASE WHEN metodo_pago = 'tarjeta' THEN 1 END) AS ventas_tarjeta
+FROM venta
+WHERE estado = 'completada'
+GROUP BY DATE(fecha_venta)
+ORDER BY fecha DESC;
+
+COMMIT;
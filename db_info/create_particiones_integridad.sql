@@ -0,0 +1,121 @@
+-- =============================================================================
+-- INTEGRIDAD DE LAS TABLAS PARTICIONADAS (complemento obligatorio de
+-- create_particiones.sql)
+-- =============================================================================
+-- 1. Unicidad global de numero_venta. En una tabla particionada las claves
+--    únicas deben incluir la clave de partición, por eso venta solo tiene
+--    UNIQUE (numero_venta, fecha_venta): por sí sola permitiría dos ventas
+--    con el mismo número en instantes distintos. La tabla sin particionar
+--    venta_numero registra cada número en la misma transacción que inserta
+--    la venta (trigger por sentencia) y su PRIMARY KEY rechaza duplicados.
+--    Los números no se liberan al archivar o borrar ventas: nunca se reusan.
+--    Cambiar numero_venta de una venta existente no está soportado.
+--
+-- 2. Particiones DEFAULT. Si un mes no tiene partición (no corrió
+--    particiones-asegurar ni arrancó la aplicación), las filas caen en
+--    <tabla>_default en lugar de hacer fallar cada venta.
+--    crear_particion_mensual no crea la partición de un mes que ya tiene
+--    filas en la DEFAULT (moverlas exige separar venta y detalle_venta a la
+--    vez): avisa con un WARNING y el mes sigue en la DEFAULT. La aplicación
+--    informa al arrancar si alguna DEFAULT tiene filas.
+--
+-- La aplicación no arranca sobre una base particionada sin este script.
+-- Script idempotente; sobre una base sin particionar no hace nada.
+-- =============================================================================
+
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'venta'::regclass) <> 'p' THEN
+        RAISE NOTICE 'venta no está particionada; numero_venta ya es UNIQUE, nada que hacer';
+        RETURN;
+    END IF;
+
+    -- -------------------------------------------------------------------------
+    -- Registro de números de venta
+    -- -------------------------------------------------------------------------
+    CREATE TABLE IF NOT EXISTS venta_numero (
+        numero_venta VARCHAR(20) PRIMARY KEY,
+        venta_id INTEGER NOT NULL,
+        fecha_venta TIMESTAMP NOT NULL
+    );
+
+    INSERT INTO venta_numero (numero_venta, venta_id, fecha_venta)
+    SELECT DISTINCT ON (numero_venta) numero_venta, id, fecha_venta
+    FROM venta
+    ORDER BY numero_venta, fecha_venta, id
+    ON CONFLICT (numero_venta) DO NOTHING;
+
+    IF EXISTS (SELECT 1 FROM venta GROUP BY numero_venta HAVING COUNT(*) > 1) THEN
+        RAISE WARNING 'Hay números de venta repetidos en venta; el registro conserva el primero de cada uno';
+    END IF;
+
+    -- -------------------------------------------------------------------------
+    -- Particiones DEFAULT
+    -- -------------------------------------------------------------------------
+    IF to_regclass('venta_default') IS NULL THEN
+        CREATE TABLE venta_default PARTITION OF venta DEFAULT;
+    END IF;
+    IF to_regclass('detalle_venta_default') IS NULL THEN
+        CREATE TABLE detalle_venta_default PARTITION OF detalle_venta DEFAULT;
+    END IF;
+    IF to_regclass('movimiento_inventario_default') IS NULL THEN
+        CREATE TABLE movimiento_inventario_default PARTITION OF movimiento_inventario DEFAULT;
+    END IF;
+END $$;
+
+CREATE OR REPLACE FUNCTION registrar_numero_venta()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- Un número repetido viola la PRIMARY KEY y aborta la venta
+    INSERT INTO venta_numero (numero_venta, venta_id, fecha_venta)
+    SELECT numero_venta, id, fecha_venta FROM nuevas;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'venta'::regclass) = 'p' THEN
+        DROP TRIGGER IF EXISTS trigger_venta_numero_registro ON venta;
+        CREATE TRIGGER trigger_venta_numero_registro
+            AFTER INSERT ON venta
+            REFERENCING NEW TABLE AS nuevas
+            FOR EACH STATEMENT EXECUTE FUNCTION registrar_numero_venta();
+    END IF;
+END $$;
+
+-- Crear (si no existe) la partición mensual de p_tabla que contiene p_mes.
+-- Si la DEFAULT ya tiene filas de ese mes la partición no se crea (crearla
+-- fallaría): el mes queda en la DEFAULT y se avisa.
+CREATE OR REPLACE FUNCTION crear_particion_mensual(p_tabla TEXT, p_mes DATE)
+RETURNS BOOLEAN AS $$
+DECLARE
+    inicio DATE := date_trunc('month', p_mes)::date;
+    fin DATE := (date_trunc('month', p_mes) + INTERVAL '1 month')::date;
+    nombre TEXT := p_tabla || '_' || to_char(p_mes, 'YYYY_MM');
+    defecto TEXT := p_tabla || '_default';
+    columna TEXT := CASE p_tabla WHEN 'movimiento_inventario' THEN 'fecha_movimiento' ELSE 'fecha_venta' END;
+    ocupada BOOLEAN := FALSE;
+BEGIN
+    IF to_regclass(nombre) IS NOT NULL THEN
+        RETURN FALSE;
+    END IF;
+
+    IF to_regclass(defecto) IS NOT NULL THEN
+        EXECUTE format(
+            'SELECT EXISTS (SELECT 1 FROM %I WHERE %I >= %L AND %I < %L)',
+            defecto, columna, inicio, columna, fin
+        ) INTO ocupada;
+    END IF;
+    IF ocupada THEN
+        RAISE WARNING '% tiene filas de %; no se crea %', defecto, to_char(inicio, 'YYYY-MM'), nombre;
+        RETURN FALSE;
+    END IF;
+
+    EXECUTE format(
+        'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+        nombre, p_tabla, inicio, fin
+    );
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
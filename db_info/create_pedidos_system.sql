@@ -0,0 +1,49 @@
+-- =============================================================================
+-- COLA DE PEDIDOS (pasos posteriores al checkout)
+-- =============================================================================
+-- El checkout registra la venta (reserva de stock) y, en la misma
+-- transacción, encola los pasos que no necesitan hacerse antes de responder
+-- (confirmación al cliente, etc.). Workers en segundo plano reclaman tareas
+-- con FOR UPDATE SKIP LOCKED, así varios workers y procesos no se pisan.
+--
+-- Estados: pendiente -> procesando -> completada
+--                                  -> pendiente (reintento con espera exponencial)
+--                                  -> fallida   (agotó max_intentos)
+-- Una tarea 'procesando' cuyo disponible_en ya pasó (worker caído) vuelve a
+-- ser reclamable.
+--
+-- Workers: la aplicación arranca COLA_WORKERS hilos; también se pueden
+-- correr aparte con
+--     python -m app.cli cola-worker --workers 4
+-- Métricas: GET /api/v1/pedidos/cola/metricas
+-- =============================================================================
+
+DO $$
+BEGIN
+    CREATE TYPE estado_tarea_cola_enum AS ENUM ('pendiente', 'procesando', 'completada', 'fallida');
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+CREATE TABLE IF NOT EXISTS cola_pedidos (
+    id BIGSERIAL PRIMARY KEY,
+    tipo VARCHAR(50) NOT NULL,
+    venta_id INTEGER,
+    payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+    estado estado_tarea_cola_enum NOT NULL DEFAULT 'pendiente',
+    intentos INTEGER NOT NULL DEFAULT 0,
+    max_intentos INTEGER NOT NULL DEFAULT 5,
+    -- Cuándo puede reclamarse (reintento o vencimiento del reclamo)
+    disponible_en TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    fecha_creacion TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    fecha_inicio TIMESTAMP,
+    fecha_fin TIMESTAMP,
+    ultimo_error TEXT
+);
+
+-- Solo las tareas vivas entran al índice que usan los workers
+CREATE INDEX IF NOT EXISTS idx_cola_pedidos_disponibles
+    ON cola_pedidos(disponible_en, id)
+    WHERE estado IN ('pendiente', 'procesando');
+
+CREATE INDEX IF NOT EXISTS idx_cola_pedidos_fin ON cola_pedidos(fecha_fin) WHERE estado = 'completada';
+CREATE INDEX IF NOT EXISTS idx_cola_pedidos_venta ON cola_pedidos(venta_id);
@@ -0,0 +1,24 @@
+-- =============================================================================
+-- PRECIOS POR TIPO DE CLIENTE
+-- =============================================================================
+-- Descuento (porcentaje sobre precio_venta) de cada tipo de cliente. El
+-- motor de precios (app/crud/precios.py) precalcula una lista de precios por
+-- tipo y la mantiene en memoria; un cliente con descuento_aplicable mayor
+-- que el de su tipo usa el suyo.
+--
+-- Los cambios de precio_venta (y de estas claves) se detectan por
+-- fecha_actualizacion y se aplican de forma incremental cada
+-- PRECIOS_REFRESCO_SEGUNDOS segundos.
+-- =============================================================================
+
+INSERT INTO configuracion (clave, valor, descripcion, tipo) VALUES
+('descuento_cliente_regular', '0', 'Descuento (%) para clientes regulares', 'number'),
+('descuento_cliente_vip', '5', 'Descuento (%) para clientes VIP', 'number'),
+('descuento_cliente_mayorista', '10', 'Descuento (%) para clientes mayoristas', 'number')
+ON CONFLICT (clave) DO NOTHING;
+
+-- Refresco incremental: productos modificados desde la última consulta
+CREATE INDEX IF NOT EXISTS idx_producto_fecha_actualizacion ON producto(fecha_actualizacion);
+
+-- Búsqueda del cliente por email en el checkout
+CREATE INDEX IF NOT EXISTS idx_cliente_email_lower ON cliente(LOWER(email)) WHERE activo = true;
@@ -0,0 +1,14 @@
+-- =============================================================================
+-- LISTADO DE PRODUCTOS POR CATEGORÍA (scroll infinito)
+-- =============================================================================
+-- Los listados de /api/v2/categorias/{id}/productos se sirven de a páginas
+-- ordenadas por (nombre, id) con paginación keyset: cada página pide las
+-- filas posteriores a la última (nombre, id) enviada, sin OFFSET.
+--
+-- Con este índice cada categoría del árbol aporta sus productos ya en
+-- orden y el LIMIT de la página corta la lectura, en lugar de ordenar
+-- todos los productos del subárbol en cada página.
+-- =============================================================================
+
+CREATE INDEX IF NOT EXISTS idx_producto_categoria_nombre_id
+    ON producto (categoria_id, nombre, id);
@@ -0,0 +1,108 @@
+-- =============================================================================
+-- RANKING DE PRODUCTOS MÁS VENDIDOS
+-- =============================================================================
+-- Top-N precalculado por ventana (hoy, 7d, 30d) y por subárbol de categoría
+-- (categoria_id = 0 es el ranking global). Se recalcula desde el rollup
+-- venta_rollup_dia_producto (create_rollups_ventas.sql), que los triggers
+-- mantienen al día con cada venta; el recálculo lee a lo sumo 30 días x
+-- productos y no toca detalle_venta.
+--
+-- La aplicación llama refrescar_ranking_productos(top, max_edad) cuando su
+-- caché en memoria expira; solo un proceso recalcula a la vez y solo si el
+-- ranking tiene más de max_edad segundos.
+--
+-- Requiere create_rollups_ventas.sql. Script idempotente.
+-- =============================================================================
+
+CREATE TABLE IF NOT EXISTS producto_ranking (
+    ventana VARCHAR(10) NOT NULL,
+    categoria_id INTEGER NOT NULL DEFAULT 0,
+    posicion INTEGER NOT NULL,
+    producto_id INTEGER NOT NULL REFERENCES producto(id) ON DELETE CASCADE,
+    cantidad DECIMAL(14,2) NOT NULL,
+    PRIMARY KEY (ventana, categoria_id, posicion)
+);
+
+CREATE TABLE IF NOT EXISTS producto_ranking_estado (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    generado_en TIMESTAMP
+);
+
+INSERT INTO producto_ranking_estado (id, generado_en) VALUES (TRUE, NULL)
+ON CONFLICT (id) DO NOTHING;
+
+-- Recalcular el ranking si tiene más de p_max_edad segundos.
+-- Devuelve las filas generadas, o -1 si no fue necesario recalcular.
+CREATE OR REPLACE FUNCTION refrescar_ranking_productos(p_top INTEGER DEFAULT 20, p_max_edad INTEGER DEFAULT 0)
+RETURNS INTEGER AS $$
+DECLARE
+    filas INTEGER;
+BEGIN
+    -- Bloquea la fila de estado. Si otro worker la está refrescando, FOR UPDATE
+    -- espera y reevalúa la condición sobre la versión ya actualizada.
+    PERFORM 1 FROM producto_ranking_estado
+    WHERE id
+      AND (generado_en IS NULL OR generado_en < NOW() - make_interval(secs => p_max_edad))
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RETURN -1;
+    END IF;
+
+    DELETE FROM producto_ranking;
+
+    WITH RECURSIVE arbol AS (
+        -- Cada categoría activa es ancestro de sí misma y de sus descendientes activos
+        SELECT id AS ancestro, id AS categoria_id
+        FROM categoria
+        WHERE activo = true
+
+        UNION ALL
+
+        SELECT a.ancestro, c.id
+        FROM arbol a
+        INNER JOIN categoria c ON c.padre = a.categoria_id
+        WHERE c.activo = true
+    ),
+    ventanas (ventana, desde) AS (
+        VALUES ('hoy', CURRENT_DATE), ('7d', CURRENT_DATE - 6), ('30d', CURRENT_DATE - 29)
+    ),
+    vendidos AS (
+        SELECT w.ventana, r.producto_id, p.categoria_id, SUM(r.cantidad) AS cantidad
+        FROM ventanas w
+        INNER JOIN venta_rollup_dia_producto r
+            ON r.dia BETWEEN w.desde AND CURRENT_DATE
+        INNER JOIN producto p ON p.id = r.producto_id AND p.activo = true
+        GROUP BY w.ventana, r.producto_id, p.categoria_id
+        HAVING SUM(r.cantidad) > 0
+    ),
+    por_grupo AS (
+        SELECT ventana, 0 AS categoria_id, producto_id, cantidad
+        FROM vendidos
+
+        UNION ALL
+
+        SELECT v.ventana, a.ancestro, v.producto_id, v.cantidad
+        FROM vendidos v
+        INNER JOIN arbol a ON a.categoria_id = v.categoria_id
+    ),
+    ranking AS (
+        SELECT ventana, categoria_id, producto_id, cantidad,
+               ROW_NUMBER() OVER (
+                   PARTITION BY ventana, categoria_id
+                   ORDER BY cantidad DESC, producto_id
+               ) AS posicion
+        FROM por_grupo
+    )
+    INSERT INTO producto_ranking (ventana, categoria_id, posicion, producto_id, cantidad)
+    SELECT ventana, categoria_id, posicion, producto_id, cantidad
+    FROM ranking
+    WHERE posicion <= p_top;
+
+    GET DIAGNOSTICS filas = ROW_COUNT;
+
+    UPDATE producto_ranking_estado SET generado_en = NOW() WHERE id;
+
+    RETURN filas;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,265 @@
+-- =============================================================================
+-- ROLLUPS INCREMENTALES DE VENTAS
+-- =============================================================================
+-- Tablas de agregados precalculados para reportes:
+--   * venta_rollup_hora_producto   (hora x producto)
+--   * venta_rollup_dia_producto    (día x producto)
+--   * venta_rollup_dia_metodo_pago (día x método de pago)
+--
+-- Solo se acumulan ventas COMPLETADAS. Se mantienen con triggers a nivel de
+-- statement (tablas de transición), así un INSERT multi-fila de detalles hace
+-- un único upsert agregado por tabla de rollup.
+--
+-- Los cambios de estado de una venta (completada <-> cancelada/devuelta/
+-- pendiente) suman o restan la venta completa. Las devoluciones parciales
+-- (detalle_venta.cantidad_devuelta) se descuentan de los rollups por
+-- producto, cuyas cantidades e importes son siempre netos de devoluciones.
+-- En el rollup por método de pago `total` es el bruto de las ventas y
+-- `devuelto` lo devuelto parcialmente de ellas (importe de las líneas): el
+-- neto cobrado es total - devuelto.
+-- Otras ediciones (fecha,
+-- método de pago, borrado de ventas) no se propagan: usar el backfill
+--     python -m app.cli backfill-rollups --desde YYYY-MM-DD --hasta YYYY-MM-DD
+--
+-- Requiere create_devoluciones_parciales.sql.
+-- Script idempotente: se puede ejecutar sobre una base existente y luego
+-- correr el backfill para cargar el histórico.
+-- =============================================================================
+
+-- Importe de una línea descontando lo devuelto (redondeo por línea, igual
+-- en triggers y backfill para que ambos den el mismo resultado)
+CREATE OR REPLACE FUNCTION importe_neto_detalle(p_subtotal DECIMAL, p_cantidad DECIMAL, p_devuelta DECIMAL)
+RETURNS DECIMAL AS $$
+    SELECT p_subtotal - COALESCE(ROUND(p_subtotal * p_devuelta / NULLIF(p_cantidad, 0), 2), 0);
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE TABLE IF NOT EXISTS venta_rollup_hora_producto (
+    hora TIMESTAMP NOT NULL,
+    producto_id INTEGER NOT NULL REFERENCES producto(id),
+    cantidad DECIMAL(14,2) NOT NULL DEFAULT 0,
+    importe DECIMAL(14,2) NOT NULL DEFAULT 0,
+    num_lineas INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (hora, producto_id)
+);
+
+CREATE TABLE IF NOT EXISTS venta_rollup_dia_producto (
+    dia DATE NOT NULL,
+    producto_id INTEGER NOT NULL REFERENCES producto(id),
+    cantidad DECIMAL(14,2) NOT NULL DEFAULT 0,
+    importe DECIMAL(14,2) NOT NULL DEFAULT 0,
+    num_lineas INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (dia, producto_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_rollup_dia_producto_producto
+    ON venta_rollup_dia_producto(producto_id, dia);
+
+CREATE TABLE IF NOT EXISTS venta_rollup_dia_metodo_pago (
+    dia DATE NOT NULL,
+    metodo_pago metodo_pago_enum NOT NULL,
+    num_ventas INTEGER NOT NULL DEFAULT 0,
+    total DECIMAL(14,2) NOT NULL DEFAULT 0,
+    descuento DECIMAL(14,2) NOT NULL DEFAULT 0,
+    impuestos DECIMAL(14,2) NOT NULL DEFAULT 0,
+    devuelto DECIMAL(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (dia, metodo_pago)
+);
+
+ALTER TABLE venta_rollup_dia_metodo_pago
+    ADD COLUMN IF NOT EXISTS devuelto DECIMAL(14,2) NOT NULL DEFAULT 0;
+
+-- -----------------------------------------------------------------------------
+-- Alta de ventas: suma al rollup por método de pago
+-- -----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION rollup_venta_insert()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO venta_rollup_dia_metodo_pago AS r (dia, metodo_pago, num_ventas, total, descuento, impuestos)
+    SELECT fecha_venta::date, metodo_pago, COUNT(*), SUM(total),
+           SUM(COALESCE(descuento, 0)), SUM(COALESCE(impuestos, 0))
+    FROM nuevas
+    WHERE estado = 'completada'
+    GROUP BY 1, 2
+    ON CONFLICT (dia, metodo_pago) DO UPDATE SET
+        num_ventas = r.num_ventas + EXCLUDED.num_ventas,
+        total = r.total + EXCLUDED.total,
+        descuento = r.descuento + EXCLUDED.descuento,
+        impuestos = r.impuestos + EXCLUDED.impuestos;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- -----------------------------------------------------------------------------
+-- Alta de detalles: suma a los rollups por producto si la venta está completada
+-- -----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION rollup_detalle_venta_insert()
+RETURNS TRIGGER AS $$
+BEGIN
+    WITH lineas AS (
+        SELECT date_trunc('hour', v.fecha_venta) AS hora, n.producto_id,
+               SUM(n.cantidad - n.cantidad_devuelta) AS cantidad,
+               SUM(importe_neto_detalle(n.subtotal, n.cantidad, n.cantidad_devuelta)) AS importe,
+               COUNT(*) AS num_lineas
+        FROM nuevos n
+        INNER JOIN venta v ON v.id = n.venta_id AND v.fecha_venta = n.fecha_venta
+        WHERE v.estado = 'completada'
+        GROUP BY 1, 2
+    ),
+    por_hora AS (
+        INSERT INTO venta_rollup_hora_producto AS r (hora, producto_id, cantidad, importe, num_lineas)
+        SELECT hora, producto_id, cantidad, importe, num_lineas FROM lineas
+        ON CONFLICT (hora, producto_id) DO UPDATE SET
+            cantidad = r.cantidad + EXCLUDED.cantidad,
+            importe = r.importe + EXCLUDED.importe,
+            num_lineas = r.num_lineas + EXCLUDED.num_lineas
+    )
+    INSERT INTO venta_rollup_dia_producto AS r (dia, producto_id, cantidad, importe, num_lineas)
+    SELECT hora::date, producto_id, SUM(cantidad), SUM(importe), SUM(num_lineas)
+    FROM lineas
+    GROUP BY 1, 2
+    ON CONFLICT (dia, producto_id) DO UPDATE SET
+        cantidad = r.cantidad + EXCLUDED.cantidad,
+        importe = r.importe + EXCLUDED.importe,
+        num_lineas = r.num_lineas + EXCLUDED.num_lineas;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- -----------------------------------------------------------------------------
+-- Cambio de estado: suma o resta la venta completa en los tres rollups
+-- (en el de método de pago, junto con lo que ya tenía devuelto)
+-- -----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION rollup_venta_estado_update()
+RETURNS TRIGGER AS $$
+BEGIN
+    WITH cambios AS (
+        SELECT n.id, n.fecha_venta, n.metodo_pago, n.total,
+               COALESCE(n.descuento, 0) AS descuento, COALESCE(n.impuestos, 0) AS impuestos,
+               CASE WHEN n.estado = 'completada' THEN 1 ELSE -1 END AS signo
+        FROM nuevas n
+        INNER JOIN viejas o ON o.id = n.id AND o.fecha_venta = n.fecha_venta
+        WHERE (o.estado = 'completada') IS DISTINCT FROM (n.estado = 'completada')
+    ),
+    devuelto AS (
+        SELECT c.id, COALESCE(SUM(d.subtotal - importe_neto_detalle(d.subtotal, d.cantidad, d.cantidad_devuelta)), 0) AS importe
+        FROM cambios c
+        LEFT JOIN detalle_venta d ON d.venta_id = c.id AND d.fecha_venta = c.fecha_venta AND d.cantidad_devuelta > 0
+        GROUP BY c.id
+    ),
+    por_metodo AS (
+        INSERT INTO venta_rollup_dia_metodo_pago AS r (dia, metodo_pago, num_ventas, total, descuento, impuestos, devuelto)
+        SELECT c.fecha_venta::date, c.metodo_pago, SUM(c.signo), SUM(c.signo * c.total),
+               SUM(c.signo * c.descuento), SUM(c.signo * c.impuestos), SUM(c.signo * dv.importe)
+        FROM cambios c
+        INNER JOIN devuelto dv ON dv.id = c.id
+        GROUP BY 1, 2
+        ON CONFLICT (dia, metodo_pago) DO UPDATE SET
+            num_ventas = r.num_ventas + EXCLUDED.num_ventas,
+            total = r.total + EXCLUDED.total,
+            descuento = r.descuento + EXCLUDED.descuento,
+            impuestos = r.impuestos + EXCLUDED.impuestos,
+            devuelto = r.devuelto + EXCLUDED.devuelto
+    ),
+    lineas AS (
+        SELECT date_trunc('hour', c.fecha_venta) AS hora, d.producto_id,
+               SUM(c.signo * (d.cantidad - d.cantidad_devuelta)) AS cantidad,
+               SUM(c.signo * importe_neto_detalle(d.subtotal, d.cantidad, d.cantidad_devuelta)) AS importe,
+               SUM(c.signo) AS num_lineas
+        FROM cambios c
+        INNER JOIN detalle_venta d ON d.venta_id = c.id AND d.fecha_venta = c.fecha_venta
+        GROUP BY 1, 2
+    ),
+    por_hora AS (
+        INSERT INTO venta_rollup_hora_producto AS r (hora, producto_id, cantidad, importe, num_lineas)
+        SELECT hora, producto_id, cantidad, importe, num_lineas FROM lineas
+        ON CONFLICT (hora, producto_id) DO UPDATE SET
+            cantidad = r.cantidad + EXCLUDED.cantidad,
+            importe = r.importe + EXCLUDED.importe,
+            num_lineas = r.num_lineas + EXCLUDED.num_lineas
+    )
+    INSERT INTO venta_rollup_dia_producto AS r (dia, producto_id, cantidad, importe, num_lineas)
+    SELECT hora::date, producto_id, SUM(cantidad), SUM(importe), SUM(num_lineas)
+    FROM lineas
+    GROUP BY 1, 2
+    ON CONFLICT (dia, producto_id) DO UPDATE SET
+        cantidad = r.cantidad + EXCLUDED.cantidad,
+        importe = r.importe + EXCLUDED.importe,
+        num_lineas = r.num_lineas + EXCLUDED.num_lineas;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- -----------------------------------------------------------------------------
+-- Devolución parcial: resta lo devuelto de los rollups por producto y lo
+-- suma a `devuelto` en el rollup por método de pago
+-- -----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION rollup_detalle_venta_devolucion()
+RETURNS TRIGGER AS $$
+BEGIN
+    WITH lineas AS (
+        SELECT date_trunc('hour', v.fecha_venta) AS hora, n.producto_id, v.metodo_pago,
+               SUM(o.cantidad_devuelta - n.cantidad_devuelta) AS cantidad,
+               SUM(importe_neto_detalle(n.subtotal, n.cantidad, n.cantidad_devuelta)
+                   - importe_neto_detalle(o.subtotal, o.cantidad, o.cantidad_devuelta)) AS importe
+        FROM nuevos n
+        INNER JOIN viejos o ON o.id = n.id AND o.fecha_venta = n.fecha_venta
+        INNER JOIN venta v ON v.id = n.venta_id AND v.fecha_venta = n.fecha_venta
+        WHERE v.estado = 'completada'
+          AND n.cantidad_devuelta <> o.cantidad_devuelta
+        GROUP BY 1, 2, 3
+    ),
+    por_metodo AS (
+        INSERT INTO venta_rollup_dia_metodo_pago AS r (dia, metodo_pago, devuelto)
+        SELECT hora::date, metodo_pago, -SUM(importe)
+        FROM lineas
+        GROUP BY 1, 2
+        ON CONFLICT (dia, metodo_pago) DO UPDATE SET
+            devuelto = r.devuelto + EXCLUDED.devuelto
+    ),
+    por_hora AS (
+        INSERT INTO venta_rollup_hora_producto AS r (hora, producto_id, cantidad, importe, num_lineas)
+        SELECT hora, producto_id, SUM(cantidad), SUM(importe), 0
+        FROM lineas
+        GROUP BY 1, 2
+        ON CONFLICT (hora, producto_id) DO UPDATE SET
+            cantidad = r.cantidad + EXCLUDED.cantidad,
+            importe = r.importe + EXCLUDED.importe
+    )
+    INSERT INTO venta_rollup_dia_producto AS r (dia, producto_id, cantidad, importe, num_lineas)
+    SELECT hora::date, producto_id, SUM(cantidad), SUM(importe), 0
+    FROM lineas
+    GROUP BY 1, 2
+    ON CONFLICT (dia, producto_id) DO UPDATE SET
+        cantidad = r.cantidad + EXCLUDED.cantidad,
+        importe = r.importe + EXCLUDED.importe;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_rollup_venta_insert ON venta;
+CREATE TRIGGER trigger_rollup_venta_insert
+    AFTER INSERT ON venta
+    REFERENCING NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_venta_insert();
+
+DROP TRIGGER IF EXISTS trigger_rollup_venta_estado ON venta;
+CREATE TRIGGER trigger_rollup_venta_estado
+    AFTER UPDATE ON venta
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_venta_estado_update();
+
+DROP TRIGGER IF EXISTS trigger_rollup_detalle_venta_insert ON detalle_venta;
+CREATE TRIGGER trigger_rollup_detalle_venta_insert
+    AFTER INSERT ON detalle_venta
+    REFERENCING NEW TABLE AS nuevos
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_detalle_venta_insert();
+
+DROP TRIGGER IF EXISTS trigger_rollup_detalle_venta_devolucion ON detalle_venta;
+CREATE TRIGGER trigger_rollup_detalle_venta_devolucion
+    AFTER UPDATE ON detalle_venta
+    REFERENCING OLD TABLE AS viejos NEW TABLE AS nuevos
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_detalle_venta_devolucion();
@@ -3,32 +3,96 @@ FastAPI Market System
 Sistema de gestión para market pequeño
 """
 
+import secrets
+from contextlib import asynccontextmanager
+from typing import List, Optional, Tuple
+
 from fastapi import FastAPI, Request, Depends
-from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
 from app.api.v1.endpoints import categorias
+from app.api.v1.endpoints import importacion
+from app.api.v1.endpoints import reportes
+from app.api.v1.endpoints import ventas
+from app.api.v1.endpoints import exportacion
+from app.api.v1.endpoints import cajas
+from app.api.v1.endpoints import pedidos
+from app.api.v1.endpoints import diagnostico
 from app.api.v2.endpoints import categorias as categorias_v2
 from app.api.v2.endpoints import productos as productos_v2
 
 from typing import Annotated, Any
 from app.crud import categoria as categoria_crud
+from app.crud import particion as particion_crud
+from app.crud import venta as venta_crud
+from app.crud import carrito as carrito_crud
+from app.crud.carrito import COOKIE_CARRITO
+from app.crud import idempotencia as idempotencia_crud
+from app.crud import cola_pedidos as cola_pedidos_crud
+from app.crud.cola_pedidos import TAREA_CONFIRMACION
 
-from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response
 from sqlmodel import Session
-from app.core.database import get_session
+from app.core.database import engine, get_session
+from app.core.templates import templates
+from app.core.assets import StaticAssets
+from app.core.compresion import CompresionMiddleware
+from app.core.microcache import MicroCacheMiddleware
+from app.core.concurrencia import DETECTOR_BLOQUEOS, detector_bloqueos, en_threadpool
 
 import json
 from pydantic import BaseModel
 
-# Crear la aplicación FastAPI
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Crear las particiones de los próximos meses si la base está particionada
+    problemas = []
+    try:
+        with Session(engine) as db:
+            particion_crud.asegurar(db, meses_adelante=3)
+            problemas = particion_crud.verificar(db)
+            for defecto, filas in particion_crud.filas_en_default(db).items():
+                print(f"⚠️ {defecto} tiene {filas} filas de meses sin partición propia")
+    except Exception as e:
+        print(f"Error al asegurar particiones: {e}")
+    # Sin estas migraciones cada checkout fallaría (o repetiría números de venta)
+    if problemas:
+        raise RuntimeError("Esquema de ventas incompleto: " + "; ".join(problemas))
+    # Workers de la cola de pedidos (COLA_WORKERS=0 si corren aparte)
+    cola_pedidos_crud.iniciar()
+    # Medir bloqueos del event loop y atribuirlos a rutas
+    if DETECTOR_BLOQUEOS:
+        detector_bloqueos.iniciar(app)
+    yield
+    detector_bloqueos.detener()
+    cola_pedidos_crud.detener()
+
 
-templates = Jinja2Templates(directory="app/templates")
+# Crear la aplicación FastAPI
+app = FastAPI(lifespan=lifespan)
+# Fragmentos del catálogo iguales para todos los visitantes: micro-caché en
+# memoria. Queda por dentro de la compresión, así se guarda el cuerpo sin comprimir.
+app.add_middleware(
+    MicroCacheMiddleware,
+    rutas=(
+        r"/",
+        r"/api/v2/categorias/raiz_activas",
+        r"/api/v2/categorias/\d+/productos",
+        r"/api/v2/categorias/\d+/productos/pagina",
+    )
+)
+# gzip/brotli para las respuestas dinámicas; los estáticos salen precomprimidos
+# y, pedidos por su URL con hash (asset_url), con caché inmutable
+app.add_middleware(CompresionMiddleware)
 
 
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+app.mount("/static", StaticAssets(directory="app/static"), name="static")
 app.include_router(categorias.router, prefix="/api/v1/categorias", tags=["categorias"])
+app.include_router(importacion.router, prefix="/api/v1/importacion", tags=["importacion"])
+app.include_router(reportes.router, prefix="/api/v1/reportes", tags=["reportes"])
+app.include_router(ventas.router, prefix="/api/v1/ventas", tags=["ventas"])
+app.include_router(exportacion.router, prefix="/api/v1/exportacion", tags=["exportacion"])
+app.include_router(cajas.router, prefix="/api/v1/cajas", tags=["cajas"])
+app.include_router(pedidos.router, prefix="/api/v1/pedidos", tags=["pedidos"])
+app.include_router(diagnostico.router, prefix="/api/v1/diagnostico", tags=["diagnostico"])
 app.include_router(categorias_v2.router, prefix="/api/v2/categorias", tags=["categorias_v2"])
 app.include_router(productos_v2.router, prefix="/api/v2/productos", tags=["productos_v2"])
 
@@ -60,7 +124,100 @@ async def checkout_form(request: Request):
     """
     Mostrar formulario de datos del usuario y métodos de pago
     """
-    return templates.TemplateResponse("checkout_form.html", {"request": request})
+    # Clave de idempotencia: los reenvíos de este formulario reciben la misma respuesta
+    return templates.TemplateResponse(
+        "checkout_form.html",
+        {"request": request, "idempotency_key": secrets.token_urlsafe(24)}
+    )
+
+
+def _registrar_checkout(
+    db: Session, request: Request, checkout_data: dict, items: List[Tuple[int, int]]
+) -> Tuple[Response, Optional[int]]:
+    """
+    Registrar la venta del checkout en `db` (sin commit: lo hace
+    idempotencia.ejecutar junto con la respuesta) y renderizar el resultado.
+    Devuelve (respuesta, venta_id); los errores de validación se devuelven
+    como página de error, el resto se propaga.
+    """
+    direccion = checkout_data['direccion']
+    try:
+        # El email del formulario no identifica al cliente (cualquiera
+        # puede escribirlo): la venta es anónima y con precio regular
+        resultado = venta_crud.checkout(
+            db,
+            items=items,
+            metodo_pago=venta_crud.metodo_pago_checkout(checkout_data['metodo_pago']),
+            observaciones=(
+                f"{checkout_data['datos_personales']['nombre']} - "
+                f"{checkout_data['datos_personales']['telefono']} - "
+                f"{direccion['tipo_via']} {direccion['numero_via']} #{direccion['numero_casa']}, "
+                f"{direccion['barrio']}"
+            ),
+            tareas=[(TAREA_CONFIRMACION, {
+                "email": checkout_data['datos_personales']['email'],
+                "nombre": checkout_data['datos_personales']['nombre'],
+            })],
+            confirmar=False
+        )
+    except ValueError as e:
+        print(f"❌ Error en checkout: {e}")
+        response = templates.TemplateResponse(
+            request=request,
+            name="checkout_error.html",
+            context={"error": str(e)}
+        )
+        return response, None
+
+    total = float(resultado['total'])
+    total_items = len(resultado['items'])
+
+    print(f"🛒 Checkout procesado: {resultado['venta'].numero_venta}")
+    print(f"   Cliente: {checkout_data['datos_personales']['nombre']}")
+    print(f"   Email: {checkout_data['datos_personales']['email']}")
+    print(f"   Dirección: {direccion['tipo_via']} {direccion['numero_via']} #{direccion['numero_casa']}, {direccion['barrio']}")
+    print(f"   Pago: {checkout_data['metodo_pago']}")
+    print(f"   Total: ${total:.2f} ({total_items} items)")
+
+    # Retornar página de éxito
+    response = templates.TemplateResponse(
+        request=request,
+        name="checkout_success.html",
+        context={
+            "cliente": checkout_data['datos_personales'],
+            "direccion": direccion,
+            "metodo_pago": checkout_data['metodo_pago'],
+            "items": resultado['items'],
+            "ajustes": resultado['ajustes'],
+            "total_items": total_items,
+            "total": total
+        }
+    )
+    return response, resultado['venta'].id
+
+
+def _procesar_checkout(request: Request, checkout_data: dict, clave: Optional[str]) -> Response:
+    """
+    Leer el carrito, registrar la venta (una vez por clave) y vaciar el
+    carrito. Cada paso usa su conexión y la suelta antes del siguiente: el
+    checkout nunca retiene más de una conexión del pool a la vez.
+    """
+    # El carrito del servidor manda; el del formulario queda como respaldo.
+    # Precios y stock salen de la base, no del navegador.
+    sesion_id = request.cookies.get(COOKIE_CARRITO)
+    items = list(carrito_crud.obtener(sesion_id).items()) if sesion_id else []
+    if not items:
+        items = [(int(item['id']), int(item['quantity'])) for item in checkout_data['carrito']]
+
+    respuesta, venta_id = idempotencia_crud.ejecutar(
+        alcance="procesar-checkout",
+        clave=clave,
+        procesar=lambda db: _registrar_checkout(db, request, checkout_data, items)
+    )
+    if sesion_id and venta_id is not None:
+        carrito_crud.vaciar(sesion_id=sesion_id)
+    return respuesta
+
 
 @app.post("/api/procesar-checkout")
 async def procesar_checkout(request: Request):
@@ -88,31 +245,11 @@ async def procesar_checkout(request: Request):
             "metodo_pago": form_data.get("metodo_pago"),
             "carrito": json.loads(form_data.get("cart_data", "[]"))
         }
-        
-        # Calcular total
-        total = sum(item['price'] * item['quantity'] for item in checkout_data['carrito'])
-        total_items = len(checkout_data['carrito'])
-        
-        print(f"🛒 Checkout procesado:")
-        print(f"   Cliente: {checkout_data['datos_personales']['nombre']}")
-        print(f"   Email: {checkout_data['datos_personales']['email']}")
-        print(f"   Dirección: {checkout_data['direccion']['tipo_via']} {checkout_data['direccion']['numero_via']} #{checkout_data['direccion']['numero_casa']}, {checkout_data['direccion']['barrio']}")
-        print(f"   Pago: {checkout_data['metodo_pago']}")
-        print(f"   Total: ${total:.2f} ({total_items} items)")
-        
-        # Retornar página de éxito
-        return templates.TemplateResponse(
-            request=request,
-            name="checkout_success.html",
-            context={
-                "cliente": checkout_data['datos_personales'],
-                "direccion": checkout_data['direccion'],
-                "metodo_pago": checkout_data['metodo_pago'],
-                "items": checkout_data['carrito'],
-                "total_items": total_items,
-                "total": total
-            }
-        )
+
+        # Un reenvío con la misma clave devuelve la respuesta ya guardada (o
+        # espera a la que está en curso); en un hilo para no bloquear el loop
+        clave = form_data.get("idempotency_key") or request.headers.get("Idempotency-Key")
+        return await en_threadpool("escritura", _procesar_checkout, request, checkout_data, clave)
         
     except Exception as e:
         print(f"❌ Error en checkout: {e}")
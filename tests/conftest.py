@@ -0,0 +1,8 @@
+"""
+Configuración común de las pruebas unitarias (no necesitan base de datos)
+"""
+
+import os
+
+# app.core.database crea el engine al importarse; sin consultas no se conecta
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/market_pruebas")
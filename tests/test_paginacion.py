@@ -0,0 +1,58 @@
+"""
+Pruebas de los cursores keyset y de PaginaKeyset
+"""
+
+from app.core.paginacion import PaginaKeyset, codificar_cursor, decodificar_cursor
+
+
+def test_cursor_ida_y_vuelta():
+    cursor = codificar_cursor(("Café & té", 42))
+    assert "=" not in cursor
+    assert decodificar_cursor(cursor, (str, int)) == ("Café & té", 42)
+
+
+def test_cursor_invalido():
+    cursor = codificar_cursor(("a", 1))
+    assert decodificar_cursor("%%%", (str, int)) is None
+    assert decodificar_cursor("bm8gZXMganNvbg", (str, int)) is None  # "no es json"
+    assert decodificar_cursor(cursor, (str,)) is None
+    assert decodificar_cursor(cursor, (int, int)) is None
+    assert decodificar_cursor(codificar_cursor(("a",)) + "x", (str,)) is None
+
+
+def _filas(n):
+    return ({"id": i, "nombre": f"p{i:02d}"} for i in range(n))
+
+
+def test_pagina_con_mas_filas_da_cursor_siguiente():
+    pagina = PaginaKeyset(_filas(4), limite=3)
+    assert [fila["id"] for fila in pagina] == [0, 1, 2]
+    assert pagina.entregadas == 3
+    assert decodificar_cursor(pagina.siguiente, (str, int)) == ("p02", 2)
+
+
+def test_ultima_pagina_sin_cursor():
+    pagina = PaginaKeyset(_filas(3), limite=3)
+    assert len(list(pagina)) == 3
+    assert pagina.siguiente is None
+
+
+def test_bool_no_consume_la_primera_fila():
+    pagina = PaginaKeyset(_filas(2), limite=5)
+    assert pagina
+    assert [fila["id"] for fila in pagina] == [0, 1]
+    assert not PaginaKeyset(_filas(0), limite=5)
+
+
+def test_cierra_el_iterador_al_terminar():
+    cerrado = []
+
+    def filas():
+        try:
+            yield from _filas(10)
+        finally:
+            cerrado.append(True)
+
+    pagina = PaginaKeyset(filas(), limite=2)
+    list(pagina)
+    assert cerrado == [True]
@@ -0,0 +1,140 @@
+"""
+Pruebas del motor de precios: centavos, puntos básicos e inserción ordenada
+"""
+
+import time
+from datetime import datetime
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from app.crud.precios import MotorPrecios, _centavos, _decimal, _posiciones, _puntos
+
+
+def _motor(productos, descuentos=None):
+    """
+    Motor con el catálogo {id: precio} ya cargado y sin consultas pendientes
+    """
+    descuentos = {"regular": 0, "mayorista": 1000, **(descuentos or {})}
+    motor = MotorPrecios(intervalo=3600)
+    ids = np.array(sorted(productos), dtype=np.int64)
+    base = np.array([_centavos(productos[i]) for i in sorted(productos)], dtype=np.int64)
+    motor._ids, motor._base = ids, base
+    motor._descuentos = descuentos
+    motor._tipos = {tipo: MotorPrecios._aplicar_descuento(base, puntos) for tipo, puntos in descuentos.items()}
+    motor._desde = datetime.now()
+    motor._proxima_consulta = time.monotonic() + 3600
+    return motor
+
+
+def test_conversiones_centavos_y_puntos():
+    assert _centavos(Decimal("12.34")) == 1234
+    assert _decimal(1234) == Decimal("12.34")
+    assert _decimal(5) == Decimal("0.05")
+    assert _puntos("12.5") == 1250
+    assert _puntos(Decimal("0.01")) == 1
+    # Fuera de rango se recorta a [0, 100%]
+    assert _puntos(-5) == 0
+    assert _puntos(150) == 10000
+
+
+@pytest.mark.parametrize("base, puntos, esperado", [
+    (1000, 1250, 875),    # 12.5% exacto
+    (999, 50, 994),       # 994.005 -> 994
+    (1, 5000, 1),         # 0.5 -> 1: mitad hacia arriba
+    (3, 5000, 2),         # 1.5 -> 2
+    (12345, 0, 12345),
+    (12345, 10000, 0),
+])
+def test_aplicar_descuento_redondea_a_centavos(base, puntos, esperado):
+    resultado = MotorPrecios._aplicar_descuento(np.array([base], dtype=np.int64), puntos)
+    assert resultado.tolist() == [esperado]
+
+
+def test_posiciones_catalogo_vacio_y_ids_ausentes():
+    posiciones, encontrado = _posiciones(np.empty(0, dtype=np.int64), np.array([1, 2]))
+    assert posiciones.tolist() == [0, 0]
+    assert encontrado.tolist() == [False, False]
+
+    posiciones, encontrado = _posiciones(np.array([10, 20, 30]), np.array([20, 5, 40]))
+    assert encontrado.tolist() == [True, False, False]
+    assert posiciones[0] == 1
+
+
+def test_cotizar_con_descuento_del_tipo():
+    motor = _motor({1: Decimal("10.00"), 2: Decimal("3.33")})
+    cotizacion = motor.cotizar(None, [(1, 2), (2, 3)], cliente={"tipo_cliente": "mayorista"})
+
+    assert cotizacion["lineas"][1] == {
+        "precio_lista": Decimal("10.00"),
+        "precio": Decimal("9.00"),
+        "descuento_unitario": Decimal("1.00"),
+        "subtotal": Decimal("18.00"),
+    }
+    # 3.33 * 0.9 = 2.997 -> 3.00 por unidad, redondeado antes de multiplicar
+    assert cotizacion["lineas"][2]["precio"] == Decimal("3.00")
+    assert cotizacion["subtotal"] == Decimal("29.99")
+    assert cotizacion["total"] == Decimal("27.00")
+    assert cotizacion["descuento"] == Decimal("2.99")
+    assert cotizacion["descuento_porcentaje"] == Decimal("10.00")
+
+
+def test_cotizar_descuento_propio_mayor_que_el_del_tipo():
+    motor = _motor({1: Decimal("10.00")})
+    cotizacion = motor.cotizar(None, [(1, 1)], cliente={"tipo_cliente": "mayorista", "descuento_aplicable": "15"})
+    assert cotizacion["lineas"][1]["precio"] == Decimal("8.50")
+    assert cotizacion["descuento_porcentaje"] == Decimal("15.00")
+
+
+def test_cotizar_sin_cliente_usa_precio_regular_y_omite_desconocidos():
+    motor = _motor({1: Decimal("10.00")})
+    cotizacion = motor.cotizar(None, [(1, 1), (99, 4)])
+    assert list(cotizacion["lineas"]) == [1]
+    assert cotizacion["total"] == Decimal("10.00")
+    assert cotizacion["descuento"] == Decimal("0.00")
+
+
+def test_cotizar_catalogo_vacio():
+    motor = _motor({})
+    cotizacion = motor.cotizar(None, [(1, 2)], cliente={"tipo_cliente": "mayorista"})
+    assert cotizacion["lineas"] == {}
+    assert cotizacion["total"] == Decimal("0.00")
+
+    # Un precio recién leído se incorpora aunque el catálogo esté vacío
+    cotizacion = motor.cotizar(None, [(1, 2)], cliente={"tipo_cliente": "mayorista"},
+                               precios_lista={1: Decimal("5.00")})
+    assert cotizacion["lineas"][1]["subtotal"] == Decimal("9.00")
+    assert motor._ids.tolist() == [1]
+
+
+def test_actualizar_inserta_ids_nuevos_en_orden():
+    motor = _motor({10: Decimal("1.00"), 30: Decimal("3.00")})
+    motor._actualizar(np.array([5, 20, 30, 40], dtype=np.int64), np.array([50, 200, 333, 400], dtype=np.int64))
+
+    assert motor._ids.tolist() == [5, 10, 20, 30, 40]
+    assert motor._base.tolist() == [50, 100, 200, 333, 400]
+    assert motor._tipos["regular"].tolist() == [50, 100, 200, 333, 400]
+    assert motor._tipos["mayorista"].tolist() == [45, 90, 180, 300, 360]
+
+
+def test_actualizar_no_modifica_los_arreglos_anteriores():
+    motor = _motor({10: Decimal("1.00")})
+    base_anterior, mayorista_anterior = motor._base, motor._tipos["mayorista"]
+    motor._actualizar(np.array([10], dtype=np.int64), np.array([500], dtype=np.int64))
+
+    # Los lectores que ya tomaron los arreglos siguen viendo el estado previo
+    assert base_anterior.tolist() == [100]
+    assert mayorista_anterior.tolist() == [90]
+    assert motor._tipos["mayorista"].tolist() == [450]
+
+
+def test_precios_lista_actualiza_solo_si_cambian():
+    motor = _motor({1: Decimal("10.00")})
+    base = motor._base
+    motor.cotizar(None, [(1, 1)], precios_lista={1: Decimal("10.00")})
+    assert motor._base is base
+
+    cotizacion = motor.cotizar(None, [(1, 1)], precios_lista={1: Decimal("12.00")})
+    assert cotizacion["total"] == Decimal("12.00")
+    assert motor._base.tolist() == [1200]
@@ -0,0 +1,26 @@
+"""
+Pruebas de la negociación JSON / MessagePack
+"""
+
+import pytest
+
+from app.core.serializacion import acepta_msgpack
+
+
+@pytest.mark.parametrize("accept, esperado", [
+    ("application/msgpack", True),
+    ("application/x-msgpack", True),
+    ("application/vnd.msgpack", True),
+    ("application/json", False),
+    ("", False),
+    ("*/*", False),
+    ("application/msgpack, application/json", True),
+    ("application/msgpack;q=0.5, application/json", False),
+    ("application/json;q=0.5, application/msgpack", True),
+    ("application/msgpack;q=0", False),
+    ("application/msgpack;q=abc", False),
+    ("Application/MsgPack", True),
+    ("application/msgpack;q=0.8, */*;q=0.1", True),
+])
+def test_acepta_msgpack(accept, esperado):
+    assert acepta_msgpack(accept) is esperado